@@ -3,20 +3,20 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 import pandas as pd
 import typer
 
 from loguru import logger
 
-import metrics
-
 from metrics import NAMESPACE_COLUMN, POD_BASIC_RESOURCES_TABLE
+from metrics.cache import RangeQueryCache
 from metrics.collector import PrometheusCollector, TimeRange
+from metrics.matrix import TableBuilder
 from metrics.model.tables import SlaTablesHelper
-from prometheus.commands import last_timestamp, prom_save
-from prometheus.prom_rds import PrometheusRDSColumn
+from prometheus.commands import drop_stored, incremental_time_range, last_timestamp, last_timestamps, prom_save
+from prometheus.query_plan import QueryPlanner
 from prometheus.sla_model import SlaTable
 from reports import html
 from reports.html import sla_report
@@ -25,12 +25,27 @@ from sizing.calculator import (
     CPU_RESOURCE,
     MEMORY_RESOURCE,
     NEW_SIZING_REPORT_FOLDER,
+    BaseLimitsRequests,
     LimitsRequests,
-    SizingCalculator,
+    namespace_dfs,
+    resource_columns,
     save_new_sizing,
 )
-from sizing.data import DataLoader
+from sizing.data import DataLoader, TimeSlices
+from sizing.direct import DirectLimitsRequests
+from sizing.parallel import SizingResult, SizingUnit, map_in_processes, size_unit, sizing_result
 from sizing.rules import RatioRule
+from sizing.sketch import (
+    MERGED_SKETCHES_FOLDER,
+    ResourceSketch,
+    load_sketches,
+    merge_sketches,
+    sketch_calculator,
+    sketch_path,
+)
+from sizing.stream import streamed_limits_requests
+from storage.snowflake.engine import SnowflakeSession
+from storage.table_cache import TableCache
 from test_summary.model import TestSummary
 
 
@@ -67,58 +82,300 @@ def sizing_reports(
         help="Test summary file with test start and end time",
         file_okay=True,
     ),
+    direct: bool = typer.Option(
+        False,
+        "--direct",
+        help="Percentiles evaluated by Prometheus (quantile_over_time) instead of loading data from Snowflake",
+    ),
+    stream: bool = typer.Option(
+        False,
+        "--stream",
+        help="Read table in batches (settings.table_batch_rows), memory does not grow with all columns of time range",
+    ),
+    cache: bool = typer.Option(
+        settings.table_cache,
+        "--cache/--no-cache",
+        help=f"Cache table hours in {settings.table_cache_folder} and read only missing hours",
+    ),
+    sketches: bool = typer.Option(
+        False,
+        "--sketches",
+        help="Save quantile sketches next to reports, sizing of test summary from merged sketches (merge-sketches)",
+    ),
+    all_namespaces: bool = typer.Option(
+        False,
+        "--all-namespaces",
+        help="Sizing of each namespace in time range from a single table load, reports in folder of namespace",
+    ),
+    workers: int = typer.Option(
+        settings.sizing_workers,
+        "--workers",
+        "-w",
+        help="Processes sizing tests of test summary or namespaces in parallel, 1 = sequential",
+    ),
 ):
     """
     Create sizing reports for namespace and time range either from test_summary file or from command line args
     When test_summary file is provided then start_time, end_time and delta_hours are ignored
     """
-    all_test_sizing: List[pd.DataFrame] = []
+    if sketches and direct:
+        # sketches need measured samples, direct sizing gets only percentiles from Prometheus
+        raise ValueError("Sketches require loaded samples, not direct")
     sla_tables: SlaTablesHelper = SlaTablesHelper(folder=folder)
     sla_table: SlaTable = sla_tables.get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+    # overlapping tests of test summary read shared hours once
+    table_cache: Optional[TableCache] = TableCache() if cache else None
     data_loader: DataLoader
-    if start_time is not None and end_time is not None:
-        data_loader = DataLoader(delta_hours=delta_hours, start_time=start_time, end_time=end_time)
-        ns_df, namespaces = data_loader.load_df_db(sla_table=sla_table, namespace=namespace)
-        # unique namespaces in df
-        assert len(namespaces) == 1
-        assert namespaces[0] == namespace
-        cpu = LimitsRequests(ns_df=ns_df, resource=CPU_RESOURCE, sla_table=sla_table)
-        memory = LimitsRequests(ns_df=ns_df, resource=MEMORY_RESOURCE, sla_table=sla_table)
+    if all_namespaces:
+        if start_time is None or end_time is None or direct or stream:
+            raise ValueError("Sizing of all namespaces requires start_time and end_time, not direct or stream")
+        data_loader = DataLoader(delta_hours=delta_hours, start_time=start_time, end_time=end_time, cache=table_cache)
+        all_namespaces_sizing(data_loader=data_loader, sla_table=sla_table, sketches=sketches, workers=workers)
+    elif start_time is not None and end_time is not None:
         time_range = TimeRange(start_time=start_time, end_time=end_time, delta_hours=delta_hours)
-        s_c = SizingCalculator(cpu=cpu, memory=memory, time_range=time_range)
+        cpu, memory = time_range_limits_requests(
+            time_range=time_range,
+            sla_table=sla_table,
+            namespace=namespace,
+            direct=direct,
+            stream=stream,
+            cache=table_cache,
+        )
         logger.info(f"Creating sizing reports for {namespace} and {time_range}")
         common_folder = Path(NEW_SIZING_REPORT_FOLDER)
-        report_folder = Path(common_folder)
-        s_c.sizing_calc_all_reports(folder=report_folder, test_summary=None)
-        all_test_sizing.append(s_c.new_sizing())
-        save_new_sizing(all_test_sizing, common_folder, test_summary=None)
+        result = sizing_result(cpu=cpu, memory=memory, folder=common_folder, time_range=time_range, sketches=sketches)
+        save_new_sizing([result.newSizing], common_folder, test_summary=None)
 
     elif test_summary_json is not None:
         test_summary: TestSummary = TestSummary.model_validate_json(json_data=test_summary_json.read_text())
         logger.info(f"Loaded test summary from {test_summary_json}")
-        common_folder = Path(NEW_SIZING_REPORT_FOLDER, test_summary.name.replace(" ", "_"))
-        for test_details in test_summary.tests:
+        test_summary_sizing(
+            test_summary=test_summary,
+            sla_table=sla_table,
+            direct=direct,
+            stream=stream,
+            cache=table_cache,
+            sketches=sketches,
+            workers=workers,
+        )
+    else:
+        raise ValueError("Either start_time and end_time or test_summary_file must be provided")
+
+
+def time_range_limits_requests(
+    time_range: TimeRange,
+    sla_table: SlaTable,
+    namespace: str,
+    direct: bool,
+    stream: bool,
+    cache: Optional[TableCache],
+) -> tuple[BaseLimitsRequests, BaseLimitsRequests]:
+    """CPU and memory limits, requests and percentiles of namespace in time range, evaluated by Prometheus or stored."""
+    if direct:
+        if namespace is None:
+            raise ValueError("Direct sizing requires namespace")
+        return direct_limits_requests(time_range=time_range, sla_table=sla_table, namespace=namespace)
+    data_loader = DataLoader(time_range=time_range, delta_hours=None, start_time=None, end_time=None, cache=cache)
+    return stored_limits_requests(data_loader=data_loader, sla_table=sla_table, namespace=namespace, stream=stream)
+
+
+def summary_slices(
+    test_summary: TestSummary, sla_table: SlaTable, loaded: bool, cache: Optional[TableCache] = None
+) -> Optional[TimeSlices]:
+    """
+    Namespace table of time range covering all tests of summary loaded by single query
+    None when tests are not loaded (direct, stream) or span more than settings.summary_superset_max_hours
+    """
+    time_range = test_summary.time_range()
+    hours = (time_range.to_time - time_range.from_time).total_seconds() / 3600
+    if not loaded or hours > settings.summary_superset_max_hours:
+        logger.info(f"Tests of {test_summary.name} ({hours:.1f} hours) are loaded one by one")
+        return None
+    data_loader = DataLoader(time_range=time_range, delta_hours=None, start_time=None, end_time=None, cache=cache)
+    columns = resource_columns(sla_table, [CPU_RESOURCE, MEMORY_RESOURCE])
+    ns_df, _ = data_loader.load_df_db(sla_table=sla_table, namespace=test_summary.namespace, columns=columns)
+    logger.info(f"Loaded {len(ns_df)} rows of {len(test_summary.tests)} tests in {time_range}")
+    return TimeSlices(ns_df)
+
+
+def stored_limits_requests(
+    data_loader: DataLoader, sla_table: SlaTable, namespace: str, stream: bool
+) -> tuple[BaseLimitsRequests, BaseLimitsRequests]:
+    """CPU and memory limits, requests and percentiles from table store, loaded at once or streamed."""
+    resources = [CPU_RESOURCE, MEMORY_RESOURCE]
+    columns = resource_columns(sla_table, resources)
+    if stream:
+        if not namespace:
+            raise ValueError("Sizing requires namespace")
+        batches = data_loader.read_batches(sla_table=sla_table, namespace=namespace, columns=columns)
+        cpu, memory = streamed_limits_requests(batches=batches, sla_table=sla_table, resources=resources)
+        return cpu, memory
+    ns_df, namespaces = data_loader.load_df_db(sla_table=sla_table, namespace=namespace, columns=columns)
+    # unique namespaces in df
+    assert len(namespaces) == 1
+    assert namespaces[0] == namespace
+    cpu = LimitsRequests(ns_df=ns_df, resource=CPU_RESOURCE, sla_table=sla_table)
+    memory = LimitsRequests(ns_df=ns_df, resource=MEMORY_RESOURCE, sla_table=sla_table)
+    return cpu, memory
+
+
+def all_namespaces_sizing(
+    data_loader: DataLoader, sla_table: SlaTable, sketches: bool, workers: int = settings.sizing_workers
+) -> Dict[str, pd.DataFrame]:
+    """Sizing reports and new sizing of each namespace saved to folder of namespace, table is loaded once."""
+    columns = resource_columns(sla_table, [CPU_RESOURCE, MEMORY_RESOURCE])
+    df, namespaces = data_loader.load_df_db(sla_table=sla_table, namespace="", columns=columns)
+    logger.info(f"Loaded {len(df)} rows of {len(namespaces)} namespaces")
+    units = [
+        SizingUnit(
+            ns_df=ns_df,
+            sla_table=sla_table,
+            folder=Path(NEW_SIZING_REPORT_FOLDER, ns),
+            time_range=data_loader.timeRange,
+            sketches=sketches,
+            namespace=ns,
+        )
+        for ns, ns_df in namespace_dfs(df)
+    ]
+    del df
+    new_sizings: Dict[str, pd.DataFrame] = {}
+    for result in map_in_processes(size_unit, units, workers=workers):
+        new_sizings[result.namespace] = result.newSizing
+        save_new_sizing([result.newSizing], Path(NEW_SIZING_REPORT_FOLDER, result.namespace), test_summary=None)
+    return new_sizings
+
+
+def test_summary_sizing(
+    test_summary: TestSummary,
+    sla_table: SlaTable,
+    direct: bool,
+    stream: bool,
+    cache: Optional[TableCache],
+    sketches: bool,
+    workers: int = settings.sizing_workers,
+):
+    """
+    Sizing reports of each test of test summary and new sizing of all tests
+    Tests loaded by single query are sized in parallel (workers processes), direct and streamed tests one by one
+    """
+    common_folder = Path(NEW_SIZING_REPORT_FOLDER, test_summary.name.replace(" ", "_"))
+    namespace = test_summary.namespace
+    folders = [Path(common_folder, t.description.replace(" ", "_")) for t in test_summary.tests]
+    # single query for all tests
+    slices = summary_slices(test_summary=test_summary, sla_table=sla_table, loaded=not (direct or stream), cache=cache)
+    results: List[SizingResult] = []
+    if slices is not None:
+        units = [
+            SizingUnit(
+                ns_df=test_ns_df(slices, t.testTimeRange.to_time_range(), sla_table, namespace),
+                sla_table=sla_table,
+                folder=folder,
+                test_details=t,
+                test_summary=test_summary,
+                sketches=sketches,
+            )
+            for t, folder in zip(test_summary.tests, folders)
+        ]
+        results = map_in_processes(size_unit, units, workers=workers)
+    else:
+        for test_details, folder in zip(test_summary.tests, folders):
             logger.info(f"Processing {test_details.description}")
-            namespace = test_summary.namespace
-            data_loader = DataLoader(
+            cpu, memory = time_range_limits_requests(
                 time_range=test_details.testTimeRange.to_time_range(),
-                delta_hours=None,
-                start_time=None,
-                end_time=None,
+                sla_table=sla_table,
+                namespace=namespace,
+                direct=direct,
+                stream=stream,
+                cache=cache,
             )
-            ns_df, namespaces = data_loader.load_df_db(sla_table=sla_table, namespace=namespace)
-            # unique namespaces in df
-            assert len(namespaces) == 1
-            assert namespaces[0] == namespace
-            cpu = LimitsRequests(ns_df=ns_df, resource=CPU_RESOURCE, sla_table=sla_table)
-            memory = LimitsRequests(ns_df=ns_df, resource=MEMORY_RESOURCE, sla_table=sla_table)
-            s_c = SizingCalculator.from_test_details(cpu=cpu, memory=memory, test_details=test_details)
-            folder = Path(common_folder, test_details.description.replace(" ", "_"))
-            s_c.sizing_calc_all_reports(folder=folder, test_summary=test_summary)
-            all_test_sizing.append(s_c.new_sizing())
-        save_new_sizing(all_test_sizing, common_folder, test_summary)
-    else:
-        raise ValueError("Either start_time and end_time or test_summary_file must be provided")
+            result = sizing_result(
+                cpu=cpu,
+                memory=memory,
+                folder=folder,
+                test_details=test_details,
+                test_summary=test_summary,
+                sketches=sketches,
+            )
+            results.append(result)
+    save_new_sizing([r.newSizing for r in results], common_folder, test_summary)
+    if sketches:
+        # percentiles of all tests instead of max of percentiles of each test
+        cpu_sketch, memory_sketch = [merge_sketches(list(rs)) for rs in zip(*[r.sketches for r in results])]
+        save_sketch_sizing(cpu_sketch, memory_sketch, Path(common_folder, MERGED_SKETCHES_FOLDER), test_summary)
+
+
+def test_ns_df(slices: TimeSlices, time_range: TimeRange, sla_table: SlaTable, namespace: str) -> pd.DataFrame:
+    """Namespace table of test time range sliced from table of covering time range."""
+    ns_df = slices.slice(time_range)
+    if ns_df.empty:
+        raise ValueError(f"No data for {sla_table.tableName} in {time_range} and namespace {namespace}")
+    return ns_df
+
+
+def save_sketch_sizing(
+    cpu: ResourceSketch, memory: ResourceSketch, folder: Path, test_summary: Optional[TestSummary] = None
+):
+    """Save merged sketches, sizing reports and new sizing of merged sketches to folder."""
+    folder.mkdir(parents=True, exist_ok=True)
+    for sketch in [cpu, memory]:
+        sketch.to_json(sketch_path(folder, sketch.resource))
+    s_c = sketch_calculator(cpu=cpu, memory=memory)
+    s_c.sizing_calc_all_reports(folder=folder, test_summary=test_summary)
+    save_new_sizing([s_c.new_sizing()], folder, test_summary)
+
+
+def direct_limits_requests(
+    time_range: TimeRange, sla_table: SlaTable, namespace: str
+) -> tuple[BaseLimitsRequests, BaseLimitsRequests]:
+    """CPU and memory limits, requests and percentiles evaluated by Prometheus."""
+    prom_collector = PrometheusCollector(settings.prometheus_url, time_range=time_range)
+    try:
+        cpu = DirectLimitsRequests(
+            collector=prom_collector, sla_table=sla_table, resource=CPU_RESOURCE, namespace=namespace
+        )
+        memory = DirectLimitsRequests(
+            collector=prom_collector, sla_table=sla_table, resource=MEMORY_RESOURCE, namespace=namespace
+        )
+    finally:
+        prom_collector.close()
+    return cpu, memory
+
+
+@app.command(name="merge-sketches")
+def merge_sketches_sizing(
+    folders: List[Path] = typer.Argument(..., help="Folders with sketches saved by sizing-reports --sketches"),
+    output: Path = typer.Option(
+        Path(NEW_SIZING_REPORT_FOLDER, MERGED_SKETCHES_FOLDER), "--output", "-o", help="Folder of merged sizing"
+    ),
+):
+    """
+    New sizing from percentiles of all samples of sketches found in folders (any tests, namespaces and days)
+    Merged sketches are saved to output and can be merged again, they are skipped when found in sub folders
+    """
+    cpu, memory = load_sketches(folders)
+    save_sketch_sizing(cpu, memory, output)
+
+
+@app.command()
+def invalidate_cache(
+    start_time: str = typer.Option(None, "--start", "-s", help="Start time in UTC without tz, whole table if not set"),
+    end_time: str = typer.Option(None, "--end", "-e", help="End time in UTC without tz"),
+    table_name: str = typer.Option(None, "--table", "-t", help="Only this table"),
+    folder: Path = typer.Option(
+        settings.sla_tables,
+        "--folder",
+        "-f",
+        dir_okay=True,
+        help="Folder with json files specifying SLA tables",
+    ),
+):
+    """Remove cached hours of tables (e.g. after a table was rewritten by another machine)"""
+    sla_tables: List[SlaTable] = SlaTablesHelper(folder=folder).slaTables
+    table_cache = TableCache()
+    hours = TableCache.hours(TimeRange(start_time=start_time, end_time=end_time)) if start_time else None
+    for sla_table in sla_tables:
+        if table_name is None or sla_table.tableName == table_name:
+            table_cache.invalidate(sla_table=sla_table, hours=hours)
 
 
 @app.command()
@@ -172,6 +429,24 @@ def load_metrics(
         dir_okay=True,
         help="Folder with json files specifying SLA tables",
     ),
+    workers: int = typer.Option(
+        settings.prom_workers,
+        "--workers",
+        "-w",
+        help="Number of queries of one table running concurrently, 1 = sequential",
+    ),
+    cache: bool = typer.Option(
+        settings.prom_cache,
+        "--cache/--no-cache",
+        help=f"Cache responses in {settings.prom_cache_folder} and query only missing time buckets",
+    ),
+    incremental: bool = typer.Option(
+        False,
+        "--incremental",
+        "-i",
+        help="Start each table (and namespace given by -n) one step after its last stored timestamp, "
+        "not before start time (i.e. --delta limits the backfill)",
+    ),
 ):
     """
     Loads prom queries from `metrics_folder`, runs them and stores in Snowflake.
@@ -179,40 +454,55 @@ def load_metrics(
     Explicitly specified namespaces are preferred. Regex based ones can be huge.
     Note that double slash is needed in PromQL e.g. for digit regex `\\d+`
 
-    There is no option for just update. It is difficult to resolve last timestamp for each namespace.
-    Dedup Snowflake table instead
-    https://stackoverflow.com/questions/58259580/how-to-delete-duplicate-records-in-snowflake-database-table/65743216#65743216
+    With `--incremental` last stored timestamp of each table and namespace is resolved (see `last-update`).
+    Queries of a namespace (or of table without namespace) start one step after its last timestamp.
+    Queries of all namespaces start at start time, namespaces not stored yet are included.
+    Only samples newer than the namespace's last timestamp are saved.
+    Overlapping runs write duplicates, readers remove them. With settings.sf_write_mode = merge Snowflake rows
+    are merged on TIMESTAMP and table keys instead, overlapping runs replace stored rows.
     """
     time_range = TimeRange(start_time=start_time, end_time=end_time, delta_hours=delta_hours)
-    prom_collector: PrometheusCollector = PrometheusCollector(settings.prometheus_url, time_range=time_range)
+    prom_collector: PrometheusCollector = PrometheusCollector(
+        settings.prometheus_url, time_range=time_range, cache=RangeQueryCache() if cache else None
+    )
     logger.info(f"Prometheus collector {prom_collector}")
-    for sla_table in SlaTablesHelper(folder=folder).slaTables:
-        logger.info(f"Table: {sla_table.dbSchema}.{sla_table.tableName}")
-        # new table for each Portal table
-        all_dfs: List[pd.DataFrame] = []
-        sla_table.replace_labels(namespace=namespace)
-        # each query is a column in the table
-        for prom_expression in sla_table.queries:
-            logger.info(f"{prom_expression.columnName}")
-            logger.info(f"\tquery: {prom_expression.query}")
-            df: pd.DataFrame = prom_collector.range_query(p_query=prom_expression.query, step_sec=sla_table.stepSec)
-            if df.empty:
-                logger.info(f"Query returns empty data. Continue")
+    try:
+        sla_tables: List[SlaTable] = SlaTablesHelper(folder=folder).slaTables
+        planner = QueryPlanner(sla_tables=sla_tables, namespace=namespace)
+        for sla_table in sla_tables:
+            logger.info(f"Table: {sla_table.dbSchema}.{sla_table.tableName}")
+            table_collector: PrometheusCollector = prom_collector
+            watermarks: Dict[Optional[str], pd.Timestamp] = {}
+            if incremental:
+                watermarks = last_timestamps(sla_table=sla_table, namespace=namespace)
+                table_range = incremental_time_range(
+                    time_range, watermarks=watermarks, step_sec=sla_table.stepSec, namespace=namespace
+                )
+                if table_range is None:
+                    logger.info(f"{sla_table.tableName} is up-to-date. Continue")
+                    planner.skip(sla_table)
+                    continue
+                logger.info(f"Incremental load {table_range}")
+                table_collector = prom_collector.for_time_range(table_range)
+            # each query is a column in the table, columns sharing a metric are fetched by one query
+            table_builder = TableBuilder(group_by=sla_table.groupBy)
+            for column_name, matrix in planner.column_matrices(
+                sla_table, collector=table_collector, workers=workers
+            ).items():
+                table_builder.add(column_name=column_name, matrix=matrix)
+            if table_builder.empty:
+                logger.info(f"No data after all queries. Continue")
                 continue
-            prom_rds_column = PrometheusRDSColumn(
-                df=df, group_by=sla_table.groupBy, column_name=prom_expression.columnName
-            )
-            column_df: pd.DataFrame = prom_rds_column.column_df()
-            all_dfs.append(column_df)
-        if not all_dfs:
-            logger.info(f"No data after all queries. Continue")
-            continue
-        all_data_df: pd.DataFrame = pd.concat(all_dfs, axis=1)
-        # move timestamp and groupBy to columns with corresponding names
-        df_save = all_data_df.reset_index()
-        df_save[metrics.TIMESTAMP_COLUMN] = df_save[metrics.TIMESTAMP_COLUMN].dt.tz_localize(tz="UTC")
-        prom_save(dfs=[df_save], portal_table=sla_table)
-        logger.info(f"Saved {df_save.shape} to {sla_table.dbSchema}.{sla_table.tableName}")
+            # TIMESTAMP in UTC, groupBy and metric columns, rows with all metrics NaN are dropped
+            df_save: pd.DataFrame = table_builder.df()
+            df_save = drop_stored(df_save, watermarks=watermarks)
+            if df_save.empty:
+                logger.info(f"No new data. Continue")
+                continue
+            prom_save(dfs=[df_save], portal_table=sla_table)
+            logger.info(f"Saved {df_save.shape} to {sla_table.dbSchema}.{sla_table.tableName}")
+    finally:
+        prom_collector.close()
 
 
 @app.command()
@@ -244,9 +534,16 @@ def eval_slas(
         help="Resource above percentage of limits. Overrides value in json",
     ),
     namespace: str = typer.Option(None, "--namespace", "-n", help="Only selected namespace"),
+    cache: bool = typer.Option(
+        settings.table_cache,
+        "--cache/--no-cache",
+        help=f"Cache table hours in {settings.table_cache_folder} and read only missing hours",
+    ),
 ):
     """Evaluate SLAs for all tables in metrics_folder"""
-    data_loader: DataLoader = DataLoader(delta_hours=delta_hours, start_time=start_time, end_time=end_time)
+    data_loader: DataLoader = DataLoader(
+        delta_hours=delta_hours, start_time=start_time, end_time=end_time, cache=TableCache() if cache else None
+    )
     time_range = TimeRange(start_time=start_time, end_time=end_time, delta_hours=delta_hours)
     for sla_table in SlaTablesHelper(folder=folder).slaTables:
         if len(sla_table.rules) == 0:
@@ -304,7 +601,7 @@ def load_save_df(
     ),
     namespace: str = typer.Option(None, "--namespace", "-n", help="Only selected namespace"),
 ):
-    """Load df from DB and save it to json"""
+    """Load df from DB and save it to Arrow IPC file (snapshot)"""
     from sizing.data import DataLoader
 
     data_loader: DataLoader = DataLoader(delta_hours=delta_hours, start_time=start_time, end_time=end_time)
@@ -314,5 +611,22 @@ def load_save_df(
     logger.info(f"Loaded {df.shape} from {data_loader.timeRange}")
 
 
+@app.command()
+def convert_snapshots(
+    paths: List[Path] = typer.Argument(..., help="Json files saved by load-save-df or folders with them"),
+):
+    """One time conversion of json df files to Arrow IPC snapshots saved next to them."""
+    from sizing.data import json_to_snapshot
+
+    for path in paths:
+        json_paths = sorted(path.glob("*.json")) if path.is_dir() else [path]
+        for json_path in json_paths:
+            json_to_snapshot(json_path=json_path)
+
+
 if __name__ == "__main__":
-    app()
+    try:
+        app()
+    finally:
+        # single Snowflake login per command
+        SnowflakeSession.close()
@@ -0,0 +1,78 @@
+"""On-disk cache of Prometheus range query responses split to fixed time buckets."""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pytz
+
+from metrics import MIBS
+from metrics.collector import TimeRange
+from settings import settings
+from shared.disk_cache import DiskCache
+
+
+class RangeQueryCache:
+    """
+    Raw responses of range queries keyed by (Prometheus url, query, step, bucket start).
+
+    Buckets are aligned to multiples of bucket_hours since epoch, every bucket is queried as a whole
+    from bucket start to bucket start + bucket - step, so the samples are aligned to step and
+    the same for all time ranges overlapping the bucket.
+    Bucket which is not finished yet (contains "now") or ended less than ingestion lag ago is never stored,
+    late samples (scrape interval, remote write) would be missing in the cached response forever.
+    """
+
+    def __init__(
+        self,
+        folder: Path = settings.prom_cache_folder,
+        bucket_hours: float = settings.prom_cache_bucket_hours,
+        max_mb: float = settings.prom_cache_max_mb,
+        ingestion_lag_sec: float = settings.prom_cache_ingestion_lag_sec,
+    ):
+        self.bucket: pd.Timedelta = pd.Timedelta(hours=bucket_hours)
+        self.ingestionLag: pd.Timedelta = pd.Timedelta(seconds=ingestion_lag_sec)
+        self.diskCache: DiskCache = DiskCache(folder=folder, max_bytes=int(max_mb * MIBS))
+
+    def __format__(self, format_spec=""):
+        return f"cache: {self.diskCache.folder}, bucket: {self.bucket}"
+
+    def buckets(self, time_range: TimeRange, step_sec: float) -> list[TimeRange]:
+        """Buckets covering time range."""
+        step = pd.Timedelta(seconds=step_sec)
+        if self.bucket % step != pd.Timedelta(0):
+            raise ValueError(f"Cache bucket {self.bucket} is not multiple of step {step}")
+        epoch = pd.Timestamp(0, tz=pytz.UTC)
+        bucket_from = epoch + ((time_range.from_time - epoch) // self.bucket) * self.bucket
+        ret: list[TimeRange] = []
+        while bucket_from <= time_range.to_time:
+            ret.append(TimeRange.from_timestamps(from_time=bucket_from, to_time=bucket_from + self.bucket - step))
+            bucket_from = bucket_from + self.bucket
+        return ret
+
+    def is_complete(self, bucket: TimeRange) -> bool:
+        """All samples of the bucket are in the past and ingested (older than ingestion lag)."""
+        return bucket.to_time + self.ingestionLag < pd.Timestamp.now(tz=pytz.UTC).floor("s")
+
+    @staticmethod
+    def name(url: str, p_query: str, step_sec: float, bucket: TimeRange) -> str:
+        """Responses of different Prometheus servers are stored separately."""
+        key = hashlib.sha1(f"{url}|{step_sec}|{p_query}".encode("utf-8")).hexdigest()
+        return f"{key}/{int(bucket.from_time.timestamp())}.json.gz"
+
+    def get(self, url: str, p_query: str, step_sec: float, bucket: TimeRange) -> Optional[bytes]:
+        content = self.diskCache.get_bytes(self.name(url=url, p_query=p_query, step_sec=step_sec, bucket=bucket))
+        return gzip.decompress(content) if content is not None else None
+
+    def put(self, url: str, p_query: str, step_sec: float, bucket: TimeRange, content: bytes) -> bool:
+        """Store response of complete bucket. Return True when stored."""
+        if not self.is_complete(bucket):
+            return False
+        name = self.name(url=url, p_query=p_query, step_sec=step_sec, bucket=bucket)
+        self.diskCache.put_bytes(name=name, content=gzip.compress(content, compresslevel=1))
+        return True
@@ -1,20 +1,36 @@
 from __future__ import annotations
 
+import copy
 import datetime
+import json
+import threading
 
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, ClassVar, Optional, TypeVar
+from urllib.parse import urljoin
 
 import pandas as pd
 import pytz
+import requests
 
 from loguru import logger
 from prometheus_pandas import query
 
 from metrics import GIBS, MIBS, NON_EMPTY_LABEL
+from metrics.labels import label_values, parse_labels
+from metrics.matrix import RangeMatrix, decode_vector
 from metrics.prom_ql.queries import sum_irate
+from metrics.session import PrometheusSession
 from settings import settings
 
 
+if TYPE_CHECKING:
+    from metrics.cache import RangeQueryCache
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
 def mem_gibs(df: pd.DataFrame) -> pd.DataFrame:
     return (df / GIBS).round(2)
 
@@ -50,6 +66,27 @@ class TimeRange:
         """Create TimeRange instance from two timestamps"""
         return cls(start_time=from_time.isoformat(), end_time=to_time.isoformat())
 
+    def chunks(self, step_sec: float, max_points: int) -> list[TimeRange]:
+        """
+        Split time range to consecutive sub-ranges with at most max_points samples
+        Sub-ranges start at from_time + k * step, so the samples are the same as for the whole range
+        and neighbouring sub-ranges do not share boundary samples.
+        :param step_sec: query step in seconds
+        :param max_points: max number of samples in one sub-range
+        :return: list of sub-ranges, single item (self) when no split is needed
+        """
+        step = pd.Timedelta(seconds=step_sec)
+        points = int((self.to_time - self.from_time) / step) + 1
+        if points <= max_points:
+            return [self]
+        ret: list[TimeRange] = []
+        chunk_from = self.from_time
+        while chunk_from <= self.to_time:
+            chunk_to = min(chunk_from + (max_points - 1) * step, self.to_time)
+            ret.append(TimeRange.from_timestamps(from_time=chunk_from, to_time=chunk_to))
+            chunk_from = chunk_to + step
+        return ret
+
     def __format__(self, format_spec=""):
         return f"period: {self.from_time.isoformat()} - {self.to_time.isoformat()}"
 
@@ -60,12 +97,54 @@ class TimeRange:
 
 
 class PrometheusCollector:
+    # in-flight request limit (semaphore, its size) per Prometheus url, shared by all collectors in the process
+    targetLimits: ClassVar[dict[str, tuple[threading.BoundedSemaphore, int]]] = {}
+    targetLimitsLock: ClassVar[threading.Lock] = threading.Lock()
 
-    def __init__(self, url: str | None, time_range: TimeRange):
+    def __init__(
+        self,
+        url: str | None,
+        time_range: TimeRange,
+        max_concurrency: int = settings.prom_max_concurrency,
+        max_points: int = settings.prom_max_points,
+        cache: Optional[RangeQueryCache] = None,
+    ):
         if not url:
             raise ValueError("Prometheus url is not set")
-        self.promQuery = query.Prometheus(url)
+        # pool size corresponds to the per url limit, more connections are never used at the same time
+        self.session: PrometheusSession = PrometheusSession(pool_size=max_concurrency)
+        self.promQuery = query.Prometheus(url, http=self.session)
         self.timeRange: TimeRange = time_range
+        self.maxPoints: int = max_points
+        self.cache: Optional[RangeQueryCache] = cache
+        self.targetLimit: threading.BoundedSemaphore = self.target_limit(url=url, max_concurrency=max_concurrency)
+
+    def for_time_range(self, time_range: TimeRange) -> PrometheusCollector:
+        """Collector for another time range sharing the session and cache."""
+        collector = copy.copy(self)
+        collector.timeRange = time_range
+        return collector
+
+    def close(self):
+        self.session.log_stats()
+        self.session.close()
+
+    @classmethod
+    def target_limit(cls, url: str, max_concurrency: int) -> threading.BoundedSemaphore:
+        """
+        Semaphore limiting concurrent requests to given Prometheus url.
+        The first collector of the url sets the limit for the process, other values are ignored with a warning.
+        """
+        max_concurrency = max(1, max_concurrency)
+        with cls.targetLimitsLock:
+            if url not in cls.targetLimits:
+                cls.targetLimits[url] = threading.BoundedSemaphore(value=max_concurrency), max_concurrency
+            semaphore, limit = cls.targetLimits[url]
+        if limit != max_concurrency:
+            logger.warning(
+                f"{url}: max concurrency {max_concurrency} ignored, limit {limit} of first collector is used"
+            )
+        return semaphore
 
     def __format__(self, format_spec=""):
         return (
@@ -73,22 +152,132 @@ class PrometheusCollector:
             f"period: {self.timeRange.from_time.isoformat()} - {self.timeRange.to_time.isoformat()}"
         )
 
-    def range_query(self, p_query: str, step_sec: float = settings.step_sec) -> pd.DataFrame:
+    def range_query(
+        self, p_query: str, step_sec: float = settings.step_sec, workers: int = settings.prom_workers
+    ) -> pd.DataFrame:
         """
         Time range query
+        Time range with more than self.maxPoints samples is split to chunks which are queried concurrently.
+        With cache only missing cache buckets are queried.
         :param p_query: Prometheus expression
         :param step_sec: step as float if not specified DEFAULT_STEP_SEC
+        :param workers: number of threads for chunks
         :return: DataFrame with values of query
         """
         logger.info(p_query)
-        df: pd.DataFrame = self.promQuery.query_range(
-            query=p_query,
-            start=self.timeRange.from_time,
-            end=self.timeRange.to_time,
-            step=step_sec,
-        )
+        contents: list[bytes] = self.range_contents(p_query=p_query, step_sec=step_sec, workers=workers)
+        df: pd.DataFrame = concat_chunks([to_wide_df(content) for content in contents])
+        if self.cache is not None and not df.empty:
+            # whole buckets are loaded, keep the time range only, index is UTC without tz
+            df = df.loc[self.timeRange.from_time.tz_localize(None) : self.timeRange.to_time.tz_localize(None)]
         return df
 
+    def range_contents(self, p_query: str, step_sec: float, workers: int) -> list[bytes]:
+        """Raw responses for chunks or cache buckets covering self.timeRange."""
+        if self.cache is None:
+            chunks: list[TimeRange] = self.timeRange.chunks(step_sec=step_sec, max_points=self.maxPoints)
+            if len(chunks) > 1:
+                logger.info(f"Split {self.timeRange} to {len(chunks)} chunks")
+            return self.fetch_ranges(p_query=p_query, step_sec=step_sec, time_ranges=chunks, workers=workers)
+        if self.cache.bucket / pd.Timedelta(seconds=step_sec) > self.maxPoints:
+            raise ValueError(f"Cache bucket {self.cache.bucket} has more than {self.maxPoints} samples")
+        buckets: list[TimeRange] = self.cache.buckets(time_range=self.timeRange, step_sec=step_sec)
+        contents: list[Optional[bytes]] = [
+            self.cache.get(url=self.promQuery.api_url, p_query=p_query, step_sec=step_sec, bucket=b) for b in buckets
+        ]
+        missing: list[TimeRange] = [b for b, c in zip(buckets, contents) if c is None]
+        logger.info(f"{self.cache}: {len(buckets) - len(missing)} of {len(buckets)} buckets cached")
+        fetched = iter(self.fetch_ranges(p_query=p_query, step_sec=step_sec, time_ranges=missing, workers=workers))
+        ret: list[bytes] = []
+        for bucket, content in zip(buckets, contents):
+            if content is None:
+                content = next(fetched)
+                self.cache.put(
+                    url=self.promQuery.api_url, p_query=p_query, step_sec=step_sec, bucket=bucket, content=content
+                )
+            ret.append(content)
+        return ret
+
+    def instant_query(self, p_query: str, group_by: list[str], time: pd.Timestamp) -> pd.Series:
+        """
+        Instant query limited by self.targetLimit
+        :param p_query: Prometheus expression
+        :param group_by: labels identifying series, the same as `by` of the expression
+        :param time: evaluation time
+        :return: Series with multi index = groupBy in upper case
+        """
+        logger.info(p_query)
+        params = {"query": p_query, "time": time.timestamp()}
+        with self.targetLimit:
+            response = self.session.get(urljoin(self.promQuery.api_url, "api/v1/query"), params=params)
+        check_response(response)
+        return decode_vector(content=response.content, group_by=group_by)
+
+    def instant_queries(
+        self, p_queries: list[str], group_by: list[str], time: pd.Timestamp, workers: int = settings.prom_workers
+    ) -> list[pd.Series]:
+        """Run instant queries concurrently, results in the same order as p_queries."""
+        return map_concurrently(
+            lambda p_query: self.instant_query(p_query=p_query, group_by=group_by, time=time), p_queries, workers
+        )
+
+    def fetch_ranges(self, p_query: str, step_sec: float, time_ranges: list[TimeRange], workers: int) -> list[bytes]:
+        """Query time ranges concurrently, raw responses in the same order as time_ranges."""
+        return map_concurrently(
+            lambda t: self.fetch_range(p_query=p_query, step_sec=step_sec, time_range=t), time_ranges, workers
+        )
+
+    def fetch_range(self, p_query: str, step_sec: float, time_range: TimeRange) -> bytes:
+        """Single range query limited by self.targetLimit. Returns raw response content."""
+        params = {
+            "query": p_query,
+            "start": time_range.from_time.timestamp(),
+            "end": time_range.to_time.timestamp(),
+            "step": step_sec,
+        }
+        with self.targetLimit:
+            response = self.session.get(urljoin(self.promQuery.api_url, "api/v1/query_range"), params=params)
+        check_response(response)
+        return response.content
+
+    def range_matrix(
+        self,
+        p_query: str,
+        group_by: list[str],
+        step_sec: float = settings.step_sec,
+        workers: int = settings.prom_workers,
+    ) -> RangeMatrix:
+        """
+        Time range query decoded directly to flat arrays (long format) without wide DataFrame
+        :param p_query: Prometheus expression
+        :param group_by: labels identifying series, the same as `by` of the expression
+        :param step_sec: step as float if not specified DEFAULT_STEP_SEC
+        :param workers: number of threads for chunks
+        """
+        logger.info(p_query)
+        matrix = RangeMatrix(group_by=group_by)
+        for content in self.range_contents(p_query=p_query, step_sec=step_sec, workers=workers):
+            # whole cache buckets are loaded, keep the time range only
+            matrix.decode(content=content, from_time=self.timeRange.from_time, to_time=self.timeRange.to_time)
+        return matrix
+
+    def range_matrices(
+        self,
+        p_queries: list[str],
+        group_by: list[str],
+        step_sec: float = settings.step_sec,
+        workers: int = settings.prom_workers,
+    ) -> list[RangeMatrix]:
+        """
+        Run range_matrix for p_queries concurrently, results in the same order as p_queries
+        :param workers: number of threads for queries and for chunks of each query, 1 = sequential
+        """
+        return map_concurrently(
+            lambda p_query: self.range_matrix(p_query=p_query, group_by=group_by, step_sec=step_sec, workers=workers),
+            p_queries,
+            workers,
+        )
+
     def container_cpu_portal(self, namespace: str, grp_keys: list[str], rate_interval: str) -> pd.DataFrame:
         """
         CPU of pods in given namespaces grouped by grp_keys
@@ -108,12 +297,50 @@ class PrometheusCollector:
         return self.range_query(p_query=q)
 
 
+def map_concurrently(fn: Callable[[T], R], items: list[T], workers: int) -> list[R]:
+    """Apply fn to items in thread pool, results keep the order of items."""
+    if workers <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        return list(executor.map(fn, items))
+
+
+def check_response(response: requests.Response):
+    """Raise error with Prometheus error message (JSON body of 400, 422 and 503) or HTTPError."""
+    if response.status_code == 200:
+        return
+    try:
+        body = response.json()
+    except ValueError:
+        response.raise_for_status()
+        raise
+    # proxies in front of Prometheus may return JSON without Prometheus error fields
+    if not isinstance(body, dict):
+        body = {}
+    raise RuntimeError(f"{body.get('errorType', response.status_code)}: {body.get('error', response.reason)}")
+
+
+def to_wide_df(content: bytes) -> pd.DataFrame:
+    """Range query response to DataFrame with timestamp index and column for each series."""
+    return query.to_pandas(json.loads(content)["data"])
+
+
+def concat_chunks(dfs: list[pd.DataFrame]) -> pd.DataFrame:
+    """Stitch results of chunked range query. Series missing in some chunk get NaN there."""
+    non_empty: list[pd.DataFrame] = [df for df in dfs if not df.empty]
+    if not non_empty:
+        return pd.DataFrame()
+    df: pd.DataFrame = pd.concat(non_empty, axis=0)
+    # chunks do not overlap, keep first just in case of server side alignment of start
+    df = df[~df.index.duplicated(keep="first")]
+    return df.sort_index()
+
+
 def col_tuple(column_name: str, grp_keys: list[str]) -> tuple[str, ...]:
     """Convert column names returned by range query with grp keys to tuples
     used as DataFrame keys
     """
-    d: dict = col_dict(column_name, grp_keys=grp_keys)
-    return tuple([v for v in d.values()])
+    return label_values(column_name, tuple(grp_keys), extra_labels=True)
 
 
 def df_tuple_columns(grp_keys: list[str], raw_df):
@@ -124,12 +351,4 @@ def df_tuple_columns(grp_keys: list[str], raw_df):
 
 def col_dict(column_name: str, grp_keys: list[str]) -> dict:
     """Convert columns names returned by range query with grp keys to dict."""
-    column_name = column_name.replace("=", ":")
-    for key in grp_keys:
-        column_name = column_name.replace(key, f'"{key}"')
-    parts = column_name.split(",")
-    filtered_parts = [p for p in parts if any([gk in p for gk in grp_keys])]
-    column_name = ",".join(filtered_parts)
-    # add ending } in case when there is more grp keys
-    column_name = column_name if column_name.endswith("}") else "{" + column_name + "}"
-    return eval(column_name)
+    return {key: value for key, value in parse_labels(column_name) if key in grp_keys}
@@ -0,0 +1,51 @@
+"""Parser of series names of wide DataFrames returned by prometheus_pandas (`name{key="value",...}`)."""
+
+from __future__ import annotations
+
+import json
+import re
+
+from functools import lru_cache
+from typing import Sequence
+
+import pandas as pd
+
+
+# name of metric is a label in JSON responses, not a series label of SLA table
+METRIC_NAME_LABEL = "__name__"
+# label value is JSON string (prometheus_pandas.query.metric_name), may contain escaped quotes, commas, `=`
+LABEL = re.compile(r'([a-zA-Z_]\w*)=("(?:[^"\\]|\\.)*")')
+
+
+@lru_cache(maxsize=65536)
+def parse_labels(column_name: str) -> tuple[tuple[str, str], ...]:
+    """All labels of series name in order of appearance, the same series names repeat across queries."""
+    start = column_name.find("{")
+    if start < 0 or not column_name.endswith("}"):
+        raise ValueError(f"Not a series name: {column_name}")
+    return tuple((key, json.loads(value)) for key, value in LABEL.findall(column_name, start))
+
+
+def group_by_values(labels: dict[str, str], group_by: Sequence[str], extra_labels: bool = False) -> tuple[str, ...]:
+    """
+    Values of (unique) group_by labels of series
+    ValueError if series does not have all of them or, unless extra_labels, has other labels (wrong `by` of query).
+    """
+    try:
+        values = tuple(labels[key] for key in group_by)
+    except KeyError:
+        values = None
+    if values is None or (not extra_labels and len(labels) - (METRIC_NAME_LABEL in labels) != len(group_by)):
+        raise ValueError(f"SLA groupBy {sorted(group_by)} and series labels {sorted(labels)} are not consistent")
+    return values
+
+
+def label_values(column_name: str, group_by: tuple[str, ...], extra_labels: bool = False) -> tuple[str, ...]:
+    """Values of group_by labels from series name, see group_by_values."""
+    return group_by_values(dict(parse_labels(column_name)), group_by, extra_labels=extra_labels)
+
+
+def labels_multi_index(columns: pd.Index, group_by: list[str], names: list[str]) -> pd.MultiIndex:
+    """MultiIndex of group_by label values from series names, names are level names."""
+    keys = tuple(group_by)
+    return pd.MultiIndex.from_tuples([label_values(str(c), keys) for c in columns], names=names)
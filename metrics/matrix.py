@@ -0,0 +1,247 @@
+"""Decoders of Prometheus range query (matrix) and instant query (vector) responses."""
+
+from __future__ import annotations
+
+import json
+import re
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from metrics import TIMESTAMP_COLUMN
+from metrics.labels import group_by_values
+
+
+RESULT_START = re.compile(r'"result"\s*:\s*\[')
+MATRIX_TYPE = re.compile(r'"resultType"\s*:\s*"matrix"')
+NS_PER_SEC = 1_000_000_000
+
+
+class RangeMatrix:
+    """
+    Samples of range query(ies) in flat arrays: timestamp [ns], value, series code.
+    Series are identified by values of groupBy labels, label table has one row per series code.
+
+    Responses are decoded series by series - only one series exists as Python objects at a time,
+    samples are written to arrays preallocated for the whole response.
+    """
+
+    def __init__(self, group_by: list[str]):
+        # duplicated from SlaTable.prepare_group_keys, Prometheus returns labels in alphabetical order
+        self.groupBy: list[str] = sorted({key.strip() for key in group_by})
+        self.tableColumns: list[str] = [g.upper() for g in self.groupBy]
+        self.seriesCodes: dict[tuple[str, ...], int] = {}
+        self.timestamps: np.ndarray = np.empty(0, dtype=np.int64)
+        self.values: np.ndarray = np.empty(0, dtype=np.float64)
+        self.series: np.ndarray = np.empty(0, dtype=np.int32)
+        self.size: int = 0
+
+    @property
+    def empty(self) -> bool:
+        return self.size == 0
+
+    def reserve(self, samples: int):
+        """Make room for additional samples."""
+        required = self.size + samples
+        if required <= len(self.values):
+            return
+        capacity = max(required, 2 * len(self.values))
+        for name in ("timestamps", "values", "series"):
+            old: np.ndarray = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, name, new)
+
+    def series_code(self, metric: dict[str, str]) -> int:
+        """Code of series given by groupBy label values."""
+        key: tuple[str, ...] = group_by_values(metric, self.groupBy)
+        return self.seriesCodes.setdefault(key, len(self.seriesCodes))
+
+    def decode(
+        self, content: bytes, from_time: Optional[pd.Timestamp] = None, to_time: Optional[pd.Timestamp] = None
+    ) -> RangeMatrix:
+        """
+        Append samples of single range query response
+        :param content: raw response of /api/v1/query_range
+        :param from_time: optional lower bound of samples
+        :param to_time: optional upper bound of samples
+        """
+        text: str = content.decode("utf-8")
+        result_start = RESULT_START.search(text)
+        if result_start is None or MATRIX_TYPE.search(text, 0, result_start.start()) is None:
+            raise ValueError(f"Not a range query response: {text[:200]}")
+        pos = result_start.end()
+        # samples of a series are separated by `],` plus the first sample of each series,
+        # exact unless label values contain these strings, arrays grow if needed
+        self.reserve(samples=text.count("],", pos) + text.count('"metric"', pos))
+        decoder = json.JSONDecoder()
+        while True:
+            while text[pos] in " \t\r\n,":
+                pos += 1
+            if text[pos] == "]":
+                break
+            item, pos = decoder.raw_decode(text, pos)
+            self.append(code=self.series_code(item["metric"]), values=item["values"])
+        if from_time is not None or to_time is not None:
+            self.slice(from_time=from_time, to_time=to_time)
+        return self
+
+    def append(self, code: int, values: list[list]):
+        n = len(values)
+        self.reserve(samples=n)
+        end = self.size + n
+        # timestamps are float seconds (step may be fraction of second), store as int ns
+        seconds = np.fromiter((v[0] for v in values), dtype=np.float64, count=n)
+        self.timestamps[self.size : end] = np.rint(seconds * NS_PER_SEC).astype(np.int64)
+        # values are strings incl. "NaN", "+Inf"
+        self.values[self.size : end] = np.array([v[1] for v in values], dtype=np.float64)
+        self.series[self.size : end] = code
+        self.size = end
+
+    def slice(self, from_time: Optional[pd.Timestamp], to_time: Optional[pd.Timestamp]):
+        """Keep samples in [from_time, to_time]."""
+        timestamps = self.timestamps[: self.size]
+        mask = np.ones(self.size, dtype=bool)
+        if from_time is not None:
+            mask &= timestamps >= from_time.value
+        if to_time is not None:
+            mask &= timestamps <= to_time.value
+        if mask.all():
+            return
+        self.timestamps = self.timestamps[: self.size][mask]
+        self.values = self.values[: self.size][mask]
+        self.series = self.series[: self.size][mask]
+        self.size = len(self.values)
+
+    def select(self, labels: dict[str, str]) -> RangeMatrix:
+        """
+        Samples of series with given label values as new matrix, the labels are removed from groupBy.
+        Splits result of query grouped by additional labels back to columns, see QueryPlanner.
+        """
+        positions: dict[str, int] = {k: self.groupBy.index(k) for k in labels}
+        rest: list[int] = [i for i in range(len(self.groupBy)) if i not in positions.values()]
+        ret = RangeMatrix(group_by=[self.groupBy[i] for i in rest])
+        # old series code -> new series code, -1 = not selected
+        code_map = np.full(len(self.seriesCodes), -1, dtype=np.int32)
+        for key, code in self.seriesCodes.items():
+            if all(key[p] == labels[k] for k, p in positions.items()):
+                code_map[code] = ret.seriesCodes.setdefault(tuple(key[i] for i in rest), len(ret.seriesCodes))
+        codes = code_map[self.series[: self.size]]
+        mask = codes >= 0
+        ret.timestamps = self.timestamps[: self.size][mask]
+        ret.values = self.values[: self.size][mask]
+        ret.series = codes[mask]
+        ret.size = len(ret.values)
+        return ret
+
+    def labels_df(self) -> pd.DataFrame:
+        """Label table, row i = labels of series code i."""
+        return pd.DataFrame(list(self.seriesCodes.keys()), columns=self.tableColumns)
+
+    def column_df(self, column_name: str) -> pd.DataFrame:
+        """
+        Single column DataFrame with multi index = timestamp and groupBy in upper case.
+        Same layout as PrometheusRDSColumn.column_df without rows for missing samples.
+        Timestamp is UTC without timezone.
+        """
+        labels: pd.DataFrame = self.labels_df()
+        codes = self.series[: self.size]
+        # label values are taken by series code, no per sample strings are created
+        index_arrays = [self.timestamps[: self.size].view("datetime64[ns]")] + [
+            labels[c].to_numpy()[codes] for c in self.tableColumns
+        ]
+        index = pd.MultiIndex.from_arrays(index_arrays, names=[TIMESTAMP_COLUMN] + self.tableColumns)
+        return pd.DataFrame({column_name: self.values[: self.size]}, index=index)
+
+
+def decode_vector(content: bytes, group_by: list[str]) -> pd.Series:
+    """Instant query response to Series with multi index = groupBy in upper case."""
+    data: dict = json.loads(content)["data"]
+    if data["resultType"] != "vector":
+        raise ValueError(f"Not an instant vector: {data['resultType']}")
+    keys: list[str] = sorted({key.strip() for key in group_by})
+    labels: list[tuple[str, ...]] = [group_by_values(r["metric"], keys) for r in data["result"]]
+    values = np.array([r["value"][1] for r in data["result"]], dtype=np.float64)
+    names: list[str] = [k.upper() for k in keys]
+    index = (
+        pd.MultiIndex.from_tuples(labels, names=names)
+        if labels
+        else pd.MultiIndex.from_arrays([[] for _ in keys], names=names)
+    )
+    return pd.Series(values, index=index)
+
+
+class TableBuilder:
+    """
+    Columns of one table from RangeMatrix per column merged on integer keys (timestamp, series).
+    Replaces outer join of single column DataFrames with (timestamp, groupBy) multi index,
+    label strings are materialized only once in the final table.
+    """
+
+    def __init__(self, group_by: list[str]):
+        self.groupBy: list[str] = sorted({key.strip() for key in group_by})
+        self.tableColumns: list[str] = [g.upper() for g in self.groupBy]
+        # groupBy label values -> table series code, shared by all columns
+        self.seriesCodes: dict[tuple[str, ...], int] = {}
+        # column name -> timestamps [ns], table series codes, values
+        self.columns: dict[str, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    @property
+    def empty(self) -> bool:
+        return not self.columns
+
+    def add(self, column_name: str, matrix: RangeMatrix):
+        """Add samples of the column, arrays of the matrix are shared not copied."""
+        if matrix.groupBy != self.groupBy:
+            raise ValueError(f"Column {column_name} groupBy {matrix.groupBy} differs from table {self.groupBy}")
+        if matrix.empty:
+            return
+        # matrix series codes are in insertion order of seriesCodes
+        code_map = np.array(
+            [self.seriesCodes.setdefault(key, len(self.seriesCodes)) for key in matrix.seriesCodes], dtype=np.int32
+        )
+        self.columns[column_name] = (
+            matrix.timestamps[: matrix.size],
+            code_map[matrix.series[: matrix.size]],
+            matrix.values[: matrix.size],
+        )
+
+    def df(self) -> pd.DataFrame:
+        """
+        Table with TIMESTAMP (UTC), groupBy columns in upper case and value columns in order of add.
+        Row for each (timestamp, series) with at least one non NaN value.
+        """
+        n_series = len(self.seriesCodes)
+        timestamps = np.unique(np.concatenate([c[0] for c in self.columns.values()]))
+
+        def row_keys(ts: np.ndarray, codes: np.ndarray) -> np.ndarray:
+            # row key = timestamp index * number of series + series code
+            return np.searchsorted(timestamps, ts) * n_series + codes.astype(np.int64)
+
+        # NaN samples do not create rows, missing values are NaN anyway
+        non_nan: list[np.ndarray] = [~np.isnan(values) for _, _, values in self.columns.values()]
+        key_space = len(timestamps) * n_series
+        if key_space <= 4 * sum(len(c[2]) for c in self.columns.values()):
+            # dense table (the usual case) - presence bitmap instead of sort
+            present = np.zeros(key_space, dtype=bool)
+            for (ts, codes, _), mask in zip(self.columns.values(), non_nan):
+                present[row_keys(ts[mask], codes[mask])] = True
+            keys = np.flatnonzero(present)
+            del present
+        else:
+            keys = np.unique(
+                np.concatenate([row_keys(ts[m], codes[m]) for (ts, codes, _), m in zip(self.columns.values(), non_nan)])
+            )
+        data: dict[str, object] = {TIMESTAMP_COLUMN: pd.to_datetime(timestamps[keys // n_series], utc=True)}
+        codes = keys % n_series
+        for i, table_column in enumerate(self.tableColumns):
+            labels = np.array([key[i] for key in self.seriesCodes], dtype=object)
+            data[table_column] = labels[codes]
+        del codes
+        for (column_name, (ts, column_codes, values)), mask in zip(self.columns.items(), non_nan):
+            column = np.full(len(keys), np.nan)
+            column[np.searchsorted(keys, row_keys(ts[mask], column_codes[mask]))] = values[mask]
+            data[column_name] = column
+        return pd.DataFrame(data, copy=False)
@@ -0,0 +1,110 @@
+"""Pooled keep-alive HTTP session for Prometheus API with retries and per query statistics."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from loguru import logger
+from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from settings import settings
+
+
+# overloaded or restarting Prometheus (or proxy in front of it)
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class QueryStats(BaseModel):
+    """Latency and size of single Prometheus API response."""
+
+    query: str
+    status: int
+    elapsedSec: float
+    bytes: int
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with default timeout for every request."""
+
+    def __init__(self, timeout_sec: float, **kwargs):
+        self.timeoutSec: float = timeout_sec
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeoutSec
+        return super().send(request, **kwargs)
+
+
+class PrometheusSession(requests.Session):
+    """
+    Connection pool sized to the per target concurrency. Connections (and TLS sessions) are kept alive
+    and reused by all queries of the collector.
+    Connection errors and RETRY_STATUSES are retried with exponential backoff and random jitter.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = settings.prom_max_concurrency,
+        retries: int = settings.prom_retries,
+        backoff_sec: float = settings.prom_backoff_sec,
+        backoff_jitter_sec: float = settings.prom_backoff_jitter_sec,
+        timeout_sec: float = settings.prom_timeout_sec,
+    ):
+        super().__init__()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_sec,
+            backoff_jitter=backoff_jitter_sec,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET"}),
+            respect_retry_after_header=True,
+            # return last response, Prometheus error body is reported by the caller
+            raise_on_status=False,
+        )
+        adapter = TimeoutHTTPAdapter(
+            timeout_sec=timeout_sec,
+            pool_connections=1,
+            pool_maxsize=max(1, pool_size),
+            pool_block=True,
+            max_retries=retry,
+        )
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self.stats: list[QueryStats] = []
+        self.statsLock = threading.Lock()
+        self.hooks["response"].append(self.record_stats)
+
+    def record_stats(self, response: requests.Response, *args, **kwargs) -> requests.Response:
+        """Response hook: time to headers + body download and bytes received."""
+        start = time.perf_counter()
+        # read the body here to measure download time, requests keeps it for the caller
+        received = len(response.content)
+        elapsed_sec = response.elapsed.total_seconds() + time.perf_counter() - start
+        query = parse_qs(urlparse(response.request.url).query).get("query", [""])[0]
+        stats = QueryStats(query=query, status=response.status_code, elapsedSec=elapsed_sec, bytes=received)
+        with self.statsLock:
+            self.stats.append(stats)
+        logger.debug(f"{stats.status} {stats.elapsedSec:.3f}s {stats.bytes}B")
+        return response
+
+    def slowest(self, n: int = 5) -> list[QueryStats]:
+        """Queries with the longest latency."""
+        with self.statsLock:
+            return sorted(self.stats, key=lambda s: s.elapsedSec, reverse=True)[:n]
+
+    def log_stats(self, n: int = 5):
+        with self.statsLock:
+            count = len(self.stats)
+            total_sec = sum(s.elapsedSec for s in self.stats)
+            total_bytes = sum(s.bytes for s in self.stats)
+        logger.info(f"Prometheus requests: {count}, time: {total_sec:.1f}s, received: {total_bytes / 1024**2:.1f} MiB")
+        for s in self.slowest(n=n):
+            logger.info(f"\t{s.elapsedSec:.2f}s {s.bytes / 1024:.0f} KiB: {s.query}")
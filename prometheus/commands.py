@@ -7,13 +7,16 @@ import urllib3
 
 from loguru import logger
 
-import metrics
-
-from metrics import NON_EMPTY_CONTAINER, TIMESTAMP_COLUMN
+from metrics import NAMESPACE_COLUMN, NON_EMPTY_CONTAINER, TIMESTAMP_COLUMN
+from metrics.collector import TimeRange
 from prometheus import NON_LINKERD_CONTAINER
 from prometheus.sla_model import SlaTable
 from storage.snowflake import dataframe
-from storage.snowflake.engine import SnowflakeEngine
+from storage.snowflake.dataframe import utc_timestamps
+from storage.snowflake.engine import SnowflakeSession
+from storage.snowflake.queries import last_update_query
+from storage.table_cache import TableCache
+from storage.table_factory import table_store
 
 
 METRICS = "metrics"
@@ -24,55 +27,69 @@ urllib3.disable_warnings()
 
 
 def prom_save(dfs: list[pd.DataFrame], portal_table: SlaTable):
-    sf = SnowflakeEngine(schema=portal_table.dbSchema)
-    try:
-        # Snowflake table
-        # use lower case for SF table name - even if it appears in upper case in Database view
-        # UserWarning: The provided table name ... is not found exactly as such in the database after writing
-        # the table, possibly due to case sensitivity issues. Consider using lower case table names
-        table = portal_table.tableName
-        logger.info(f"Saving {len(dfs)} DataFrames to {table}.")
+    table_cache = TableCache()
+    with table_store() as store:
+        logger.info(f"Saving {len(dfs)} DataFrames to {portal_table.tableName}.")
         for df in dfs:
-            sf.write_df(df=df, table=table)
-    finally:
-        sf.sf_engine.dispose()
+            store.write_df(df=df, sla_table=portal_table)
+            # cached hours of DataLoader reads are stale
+            table_cache.invalidate_df(sla_table=portal_table, df=df)
 
 
-def last_update_query(
-    table_name: str,
-    column_name: str,
-    namespace: Optional[str],
-    timestamp_field: str = TIMESTAMP_COLUMN,
-):
+def last_timestamps(sla_table: SlaTable, namespace: Optional[str]) -> dict[Optional[str], pd.Timestamp]:
+    """
+    Last stored timestamp of sla table for each namespace (watermark).
+    Tables without namespace have single watermark with key None.
+    Empty dict when the table does not exist yet or is empty.
     """
-    Select max timestamp from table with table_name as column_name
-    :param table_name: table to search for max timestamp
-    :param column_name: name of the column to return
-    :param timestamp_field: name of the timestamp field
-    :param namespace:  optional namespace filter
-    :return: SQL query
+    with table_store() as store:
+        return store.last_timestamps(sla_table=sla_table, namespace=namespace)
+
+
+def incremental_time_range(
+    time_range: TimeRange,
+    watermarks: dict[Optional[str], pd.Timestamp],
+    step_sec: float,
+    namespace: Optional[str] = None,
+) -> Optional[TimeRange]:
     """
-    q = f"SELECT max({timestamp_field}) as {column_name} FROM {table_name}"
-    if namespace is not None:
-        q = q + f" WHERE {metrics.NAMESPACE_COLUMN}='{namespace}'"
-    return q
+    Time range starting one step after the watermark of loaded namespace, never before time_range.from_time.
+    Table without namespace has single watermark (key None) used for any namespace.
+    Namespace without stored rows starts at time_range.from_time. So does query of all namespaces (namespace None),
+    it includes namespaces not stored yet, rows stored already are removed by drop_stored.
+    None when up-to-date.
+    """
+    watermark: Optional[pd.Timestamp] = watermarks.get(None if None in watermarks else namespace)
+    if watermark is None:
+        return time_range
+    from_time = max(time_range.from_time, watermark + pd.Timedelta(seconds=step_sec))
+    if from_time > time_range.to_time:
+        return None
+    return TimeRange.from_timestamps(from_time=from_time, to_time=time_range.to_time)
+
+
+def drop_stored(df: pd.DataFrame, watermarks: dict[Optional[str], pd.Timestamp]) -> pd.DataFrame:
+    """Remove rows with timestamp not newer than the watermark of their namespace."""
+    if not watermarks:
+        return df
+    if None in watermarks:
+        stored_until = pd.Series(watermarks[None], index=df.index)
+    else:
+        # new namespaces have no watermark (NaT)
+        stored_until = df[NAMESPACE_COLUMN].map(watermarks)
+    keep = stored_until.isna() | (df[TIMESTAMP_COLUMN] > stored_until)
+    return df[keep]
 
 
 def last_timestamp(table_names: list[str], namespace: Optional[str]):
-    sf = SnowflakeEngine()
     # column name is used to get values
     column_name = "MAX_TIMESTAMP"
-    try:
+    with SnowflakeSession.engine() as sf:
         for table_name in table_names:
             q = last_update_query(table_name=table_name, column_name=column_name, namespace=namespace)
             logger.debug(f"Query: {q}")
             df: pd.DataFrame = dataframe.get_df(query=q, con=sf.connection)
-            try:
-                max_timestamps = df[column_name].dt.tz_convert(tz="UTC")
-            except TypeError as e:
-                # Older version of snowflake pandas
-                # TypeError: Cannot convert tz-naive timestamps, use tz_localize to localize
-                max_timestamps = df[column_name].dt.tz_localize(tz="UTC")
+            max_timestamps = utc_timestamps(df[column_name])
             assert len(max_timestamps) == 1
             msg = (
                 f"Last update: {table_name}[{namespace}]: {max_timestamps[0]}"
@@ -80,5 +97,3 @@ def last_timestamp(table_names: list[str], namespace: Optional[str]):
                 else f"Last update: {table_name}: {max_timestamps[0]}"
             )
             logger.info(msg)
-    finally:
-        sf.sf_engine.dispose()
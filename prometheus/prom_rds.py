@@ -6,6 +6,8 @@ import pandas as pd
 
 import metrics
 
+from metrics.labels import label_values, labels_multi_index
+
 
 class PrometheusRDSColumn:
     """Coverts result of Prometheus query to columns in RDS."""
@@ -23,40 +25,24 @@ class PrometheusRDSColumn:
     def col_dict(self, column_name: str) -> dict:
         """Convert columns names returned by range query with groupBy keys to dict.
         {groupBy[0]: "value0", ...}
-        We need only values because keys are checked against groupBy and ValueError is raised if not consistent
+        ValueError is raised if groupBy keys and column names are not consistent
         """
-        column_name = column_name.replace("=", ":")
-        for key in self.groupBy:
-            column_name = column_name.replace(key, f'"{key}"')
-        parts = column_name.split(",")
-        filtered_parts = [p for p in parts if any([gk in p for gk in self.groupBy])]
-        column_name = ",".join(filtered_parts)
-        # add ending } in case when there is more grp keys
-        column_name = column_name if column_name.endswith("}") else "{" + column_name + "}"
-        ret = eval(column_name)
-        assert isinstance(ret, dict)
-        # check consistency of SLA groupBy and column names returned by Prometheus
-        if self.groupBy != sorted(ret.keys()):
-            raise ValueError(f"SLA groupBy {self.groupBy} and column names {ret.keys()} are not consistent")
-        return ret
+        return dict(zip(self.groupBy, self.col_values(column_name)))
 
     def col_values(self, column_name: str) -> tuple[str, ...]:
         """Returns values of groupBy keys as tuple."""
-        d: dict = self.col_dict(column_name)
-        return tuple([v for v in d.values()])
+        return label_values(column_name, tuple(self.groupBy))
 
     def columns_to_tuples(self) -> list[tuple[str, ...]]:
         """covert string column names to tuples of self.groupBy values.
 
         [{namespace: "one", pod: "two"} -> ("one", "two"), ...]
         """
-        column_values: list[tuple[str, ...]] = [self.col_values(str(c)) for c in self.originalColumns]
-        return column_values
+        return [self.col_values(str(c)) for c in self.originalColumns]
 
     def multi_index(self) -> pd.MultiIndex:
         """MultiIndex from columns."""
-        tuple_columns: list[tuple[str, ...]] = self.columns_to_tuples()
-        return pd.MultiIndex.from_tuples(tuple_columns, names=self.tableColumns)
+        return labels_multi_index(self.originalColumns, group_by=self.groupBy, names=self.tableColumns)
 
     def column_df(self) -> pd.DataFrame:
         """Single column DataFrame with multi index = self.groupBy and timestamp.
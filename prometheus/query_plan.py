@@ -0,0 +1,200 @@
+"""
+Plan of range queries for SLA tables - columns sharing a metric are fetched by one query.
+
+Columns which differ only in equality static labels e.g. `resource="memory",unit="byte"` and
+`resource="cpu",unit="core"` of `kube_pod_container_resource_limits` are merged to one query
+with regex matchers `resource=~"cpu|memory",unit=~"byte|core"` grouped additionally by the split labels.
+The result is split back to columns by the label values (RangeMatrix.select).
+Identical expressions (incl. the same groupBy and step) are fetched once per run.
+"""
+
+from __future__ import annotations
+
+import re
+
+from collections import Counter
+from string import Formatter
+from typing import Optional
+
+import pandas as pd
+
+from loguru import logger
+from pydantic import BaseModel
+
+from metrics.collector import PrometheusCollector, map_concurrently
+from metrics.matrix import RangeMatrix
+from prometheus.prompt_model import ColumnPromExpression
+from prometheus.sla_model import SlaTable
+from settings import settings
+
+
+# only simple values, regex matcher of merged query must select exactly the values
+EQUAL_LABEL = re.compile(r'^\s*([a-zA-Z_]\w*)\s*=\s*"([\w\-]*)"\s*$')
+
+# aggregation by SLA table groupBy (template placeholder)
+BY_GROUP_BY = re.compile(r"\bby\s*\(\s*groupBy\s*\)")
+LABELS_PLACEHOLDER = "labels"
+
+# (query, groupBy, step)
+QueryKey = tuple[str, tuple[str, ...], float]
+
+
+class PlannedQuery(BaseModel):
+    """Range query of one or more columns, column -> split label values (empty = whole result)."""
+
+    query: str
+    groupBy: list[str]
+    stepSec: float
+    columns: dict[str, dict[str, str]] = {}
+
+    def key(self) -> QueryKey:
+        return self.query, tuple(self.groupBy), self.stepSec
+
+
+def static_labels_dict(prom_query: ColumnPromExpression) -> Optional[dict[str, str]]:
+    """Static labels as name -> value if all of them are equality matchers else None."""
+    ret: dict[str, str] = {}
+    for static_label in prom_query.staticLabels:
+        match = EQUAL_LABEL.match(static_label)
+        if match is None:
+            return None
+        ret[match.group(1)] = match.group(2)
+    return ret
+
+
+def is_mergeable(sla_table: SlaTable, prom_query: ColumnPromExpression) -> bool:
+    """
+    Query can be grouped by additional labels - every selector is inside an aggregation by groupBy
+    e.g. not NODE_CPU_BASIC where count of all series is used as scalar
+    """
+    static_labels = static_labels_dict(prom_query)
+    if not static_labels:
+        return False
+    if set(static_labels) & set(sla_table.prepare_group_keys()):
+        return False
+    try:
+        parts = list(Formatter().parse(prom_query.query))
+    except ValueError:
+        # unbalanced braces, not a template
+        return False
+    # `{labels}` of each selector is a format field, other fields are selectors without static labels
+    selectors = [field for _, field, _, _ in parts if field is not None]
+    if not selectors or any(field != LABELS_PLACEHOLDER for field in selectors):
+        return False
+    # `groupBy` only in aggregations (not e.g. in `on (groupBy)`), one aggregation of each selector
+    literal = "".join(text for text, _, _, _ in parts)
+    aggregations = len(BY_GROUP_BY.findall(literal))
+    return aggregations == literal.count("groupBy") and aggregations == len(selectors)
+
+
+def split_label_values(prom_queries: list[ColumnPromExpression]) -> dict[str, list[str]]:
+    """Static label name -> sorted distinct values of merged queries."""
+    values: dict[str, set[str]] = {}
+    for prom_query in prom_queries:
+        for name, value in static_labels_dict(prom_query).items():
+            values.setdefault(name, set()).add(value)
+    return {name: sorted(v) for name, v in values.items()}
+
+
+def plan_table(sla_table: SlaTable, namespace: Optional[str]) -> list[PlannedQuery]:
+    """Queries of SLA table (templates not replaced yet), merged where possible, in order of first column."""
+    merge_groups: dict[tuple, list[ColumnPromExpression]] = {}
+    singles: list[ColumnPromExpression] = []
+    for prom_query in sla_table.queries:
+        if is_mergeable(sla_table, prom_query):
+            static_labels = static_labels_dict(prom_query)
+            key = (prom_query.query, prom_query.rateInterval, tuple(prom_query.labels), tuple(sorted(static_labels)))
+            merge_groups.setdefault(key, []).append(prom_query)
+        else:
+            singles.append(prom_query)
+    # first column of planned query -> planned query
+    planned: dict[str, PlannedQuery] = {}
+    by_query: dict[str, PlannedQuery] = {}
+    group_by: list[str] = sla_table.prepare_group_keys()
+
+    def add(column_name: str, query: str, query_group_by: list[str], labels: dict[str, str]):
+        planned_query = by_query.get(query)
+        if planned_query is None:
+            planned_query = PlannedQuery(query=query, groupBy=query_group_by, stepSec=sla_table.stepSec)
+            by_query[query] = planned_query
+            planned[column_name] = planned_query
+        planned_query.columns[column_name] = labels
+
+    for prom_queries in merge_groups.values():
+        if len({tuple(sorted(static_labels_dict(q).items())) for q in prom_queries}) < 2:
+            singles.extend(prom_queries)
+            continue
+        split_labels = split_label_values(prom_queries)
+        query = sla_table.expand_query(prom_query=prom_queries[0], namespace=namespace, split_labels=split_labels)
+        for prom_query in prom_queries:
+            add(prom_query.columnName, query, group_by + sorted(split_labels), static_labels_dict(prom_query))
+    for prom_query in singles:
+        add(prom_query.columnName, sla_table.expand_query(prom_query=prom_query, namespace=namespace), group_by, {})
+    column_order = [prom_query.columnName for prom_query in sla_table.queries]
+    return [planned[c] for c in column_order if c in planned]
+
+
+class QueryPlanner:
+    """
+    Planned queries of all SLA tables of one run. Results of queries shared by more tables
+    are kept until their last use.
+    """
+
+    def __init__(self, sla_tables: list[SlaTable], namespace: Optional[str]):
+        self.plans: dict[str, list[PlannedQuery]] = {
+            sla_table.tableName: plan_table(sla_table, namespace=namespace) for sla_table in sla_tables
+        }
+        self.uses: Counter[QueryKey] = Counter(pq.key() for plan in self.plans.values() for pq in plan)
+        # query key -> (from, to) of the time range, result
+        self.fetched: dict[QueryKey, tuple[tuple[pd.Timestamp, pd.Timestamp], RangeMatrix]] = {}
+        queries = sum(len(t.queries) for t in sla_tables)
+        logger.info(f"{queries} columns of {len(sla_tables)} tables planned as {len(self.uses)} queries")
+
+    def fetch(self, plan: list[PlannedQuery], collector: PrometheusCollector, workers: int):
+        time_range = (collector.timeRange.from_time, collector.timeRange.to_time)
+        missing: dict[QueryKey, PlannedQuery] = {
+            pq.key(): pq for pq in plan if pq.key() not in self.fetched or self.fetched[pq.key()][0] != time_range
+        }
+        matrices: list[RangeMatrix] = map_concurrently(
+            lambda pq: collector.range_matrix(
+                p_query=pq.query, group_by=pq.groupBy, step_sec=pq.stepSec, workers=workers
+            ),
+            list(missing.values()),
+            workers,
+        )
+        for key, matrix in zip(missing.keys(), matrices):
+            self.fetched[key] = (time_range, matrix)
+
+    def skip(self, sla_table: SlaTable):
+        """Table is not loaded, release results used by other tables only."""
+        for planned_query in self.plans[sla_table.tableName]:
+            self.release(planned_query.key())
+
+    def release(self, key: QueryKey):
+        self.uses[key] -= 1
+        if self.uses[key] <= 0:
+            self.fetched.pop(key, None)
+
+    def column_matrices(
+        self, sla_table: SlaTable, collector: PrometheusCollector, workers: int = settings.prom_workers
+    ) -> dict[str, RangeMatrix]:
+        """
+        Column name -> samples of non-empty columns in order of SLA table queries
+        :param sla_table: table from `sla_tables` of the planner
+        :param collector: collector with time range of the table
+        :param workers: number of queries running concurrently and of chunks of each query, 1 = sequential
+        """
+        plan: list[PlannedQuery] = self.plans[sla_table.tableName]
+        self.fetch(plan, collector=collector, workers=workers)
+        columns: dict[str, RangeMatrix] = {}
+        for planned_query in plan:
+            key = planned_query.key()
+            matrix: RangeMatrix = self.fetched[key][1]
+            self.release(key)
+            for column_name, labels in planned_query.columns.items():
+                column_matrix = matrix.select(labels) if labels else matrix
+                if column_matrix.empty:
+                    logger.info(f"{column_name}: query returns empty data. Continue")
+                    continue
+                columns[column_name] = column_matrix
+        return {q.columnName: columns[q.columnName] for q in sla_table.queries if q.columnName in columns}
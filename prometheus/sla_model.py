@@ -69,21 +69,40 @@ class SlaTable(BaseModel):
         labels are passed as argument or from PromQuery
         """
         for prom_query in self.queries:
-            grp_by_list: list[str] = self.prepare_group_keys()
-            use_group_by: str = f'{",".join(grp_by_list)}'
-            prom_query.query = prom_query.query.replace("groupBy", use_group_by)
-            # set for queries with rate, increase - presence indicates usage
-            if prom_query.rateInterval:
-                prom_query.query = prom_query.query.replace("rateInterval", prom_query.rateInterval)
-            ns_label = f'namespace="{namespace}"' if namespace is not None else None
-            use_labels_list = prom_query.labels if prom_query.labels else self.defaultLabels
-            all_labels_list = [ns_label] + use_labels_list if ns_label is not None else use_labels_list
-            use_labels = ",".join(all_labels_list)
-            # staticLabels is by default empty list no need to check for None
-            static_labels = ",".join(prom_query.staticLabels)
-            if static_labels:
-                use_labels = use_labels + "," + static_labels if use_labels else static_labels
-            prom_query.query = prom_query.query.replace("labels", use_labels)
+            prom_query.query = self.expand_query(prom_query=prom_query, namespace=namespace)
             if debug:
                 logger.info(f"{prom_query.columnName}")
                 logger.info(f"query          : {prom_query.query}")
+
+    def expand_query(
+        self,
+        prom_query: ColumnPromExpression,
+        namespace: Optional[str],
+        split_labels: Optional[dict[str, list[str]]] = None,
+    ) -> str:
+        """
+        Query with replaced placeholders, see replace_labels
+        :param prom_query: query template
+        :param namespace: optional namespace label
+        :param split_labels: replaces staticLabels by regex matchers of all values, label names are added to groupBy
+        """
+        grp_by_list: list[str] = self.prepare_group_keys() + (sorted(split_labels) if split_labels else [])
+        use_group_by: str = f'{",".join(grp_by_list)}'
+        query = prom_query.query.replace("groupBy", use_group_by)
+        # set for queries with rate, increase - presence indicates usage
+        if prom_query.rateInterval:
+            query = query.replace("rateInterval", prom_query.rateInterval)
+        ns_label = f'namespace="{namespace}"' if namespace is not None else None
+        use_labels_list = prom_query.labels if prom_query.labels else self.defaultLabels
+        all_labels_list = [ns_label] + use_labels_list if ns_label is not None else use_labels_list
+        use_labels = ",".join(all_labels_list)
+        # staticLabels is by default empty list no need to check for None
+        static_labels_list: list[str] = (
+            [f'{k}=~"{"|".join(values)}"' for k, values in sorted(split_labels.items())]
+            if split_labels
+            else prom_query.staticLabels
+        )
+        static_labels = ",".join(static_labels_list)
+        if static_labels:
+            use_labels = use_labels + "," + static_labels if use_labels else static_labels
+        return query.replace("labels", use_labels)
@@ -34,6 +34,36 @@ class Settings(BaseSettings):
     # Prometheus
     time_delta_hours: float = 1  # time delta from now in hours for timeseries queries
     step_sec: float = 30  # prometheus sample step in sec
+    prom_workers: int = 4  # number of range queries of one SLA table running concurrently
+    prom_max_concurrency: int = 4  # max in-flight requests per Prometheus url (shared by all collectors)
+    prom_max_points: int = 10_000  # max samples per series in one range query, Prometheus limit is 11000
+    prom_timeout_sec: float = 120  # connect and read timeout of single request
+    prom_retries: int = 3  # retries of connection errors and 429, 502, 503, 504 responses
+    prom_backoff_sec: float = 0.5  # exponential backoff factor i.e. 0.5, 1, 2, ... seconds
+    prom_backoff_jitter_sec: float = 0.5  # max random jitter added to backoff
+    prom_cache: bool = False  # cache range queries on disk (load_metrics --cache)
+    prom_cache_folder: Path = Path(pycpt_artefacts, "prom_cache")
+    prom_cache_bucket_hours: float = 1  # cache bucket size, multiple of all used steps
+    prom_cache_max_mb: float = 2048  # least recently used buckets are evicted above this size
+    prom_cache_ingestion_lag_sec: float = 300  # buckets ending less than this ago are not cached (late samples)
+
+    sketch_relative_accuracy: float = 0.01  # relative error of percentiles of quantile sketches (sizing --sketches)
+
+    snapshot_compression: str = "zstd"  # DataLoader snapshots (Arrow IPC): zstd, lz4 or uncompressed (zero copy)
+
+    # Storage of SLA tables
+    storage_backend: str = "snowflake"  # snowflake or parquet (local, see storage.parquet)
+    parquet_folder: Path = Path(pycpt_artefacts, "parquet")  # <schema>/<table>/DAY=<date>/NAMESPACE=<namespace>
+    table_batch_rows: int = 100_000  # rows of one batch of streamed reads (parquet, Snowflake uses its result chunks)
+    sf_write_mode: str = "append"  # append or merge (upsert on TIMESTAMP and table keys, opt-in)
+    sf_stage_chunk_rows: int = 500_000  # rows of one staged Parquet file of merge
+    sf_stage_parallel: int = 4  # threads uploading staged files
+    table_cache: bool = False  # cache tables read by DataLoader by hour (sizing-reports, eval-slas --cache)
+    table_cache_folder: Path = Path(pycpt_artefacts, "table_cache")
+    table_cache_max_mb: float = 4096  # least recently used hours are evicted above this size
+    sizing_workers: int = 1  # processes sizing tests of test summary or namespaces in parallel, 1 = sequential
+    summary_superset_max_hours: float = 24  # tests of summary within this span are loaded by single query, 0 disables
+    table_client_dedup: bool = False  # drop duplicates again in pandas after read, stores already return unique rows
 
 
 # singleton instance of the Settings class. Use this instead of creating your own instance.
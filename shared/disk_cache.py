@@ -0,0 +1,97 @@
+"""Size limited folder of cache files with least recently used eviction."""
+
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import uuid
+
+from pathlib import Path
+from typing import Callable, Optional
+
+from loguru import logger
+
+
+class DiskCache:
+    """
+    Cache entries are files addressed by relative names (may contain sub folders).
+    File modification time is used as last access time, it is updated on every read.
+    When total size exceeds max_bytes the least recently used files are removed.
+    """
+
+    def __init__(self, folder: Path, max_bytes: int):
+        self.folder: Path = folder
+        self.maxBytes: int = max_bytes
+        self.lock = threading.Lock()
+
+    def path(self, name: str) -> Path:
+        return Path(self.folder, name)
+
+    def get_path(self, name: str) -> Optional[Path]:
+        """Path of existing entry (marked as recently used) or None."""
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_bytes(self, name: str) -> Optional[bytes]:
+        path = self.get_path(name)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            # evicted by another thread in the meantime
+            return None
+
+    def store(self, name: str, writer: Callable[[Path], None]):
+        """Write entry with writer(tmp_path) and atomically move it in place."""
+        path = self.path(name)
+        os.makedirs(path.parent, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            writer(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        self.evict()
+
+    def put_bytes(self, name: str, content: bytes):
+        self.store(name=name, writer=lambda p: p.write_bytes(content))
+
+    def invalidate(self, prefix: str = ""):
+        """Remove all entries in sub folder prefix, whole cache by default."""
+        path = self.path(prefix)
+        if path.is_dir():
+            logger.info(f"Invalidate cache {path}")
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.is_file():
+            path.unlink(missing_ok=True)
+
+    def evict(self):
+        """Remove least recently used entries until total size is within the limit."""
+        with self.lock:
+            entries: list[tuple[float, int, Path]] = []
+            for root, _, files in os.walk(self.folder):
+                for file in files:
+                    if file.endswith(".tmp"):
+                        continue
+                    try:
+                        stat = Path(root, file).stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, Path(root, file)))
+            total = sum(e[1] for e in entries)
+            if total <= self.maxBytes:
+                return
+            removed = 0
+            for _, size, path in sorted(entries, key=lambda e: e[0]):
+                if total <= self.maxBytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+            logger.info(f"Evicted {removed} entries from {self.folder}")
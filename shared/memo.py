@@ -0,0 +1,47 @@
+"""Per instance memoization of methods computing derived data frames."""
+
+from __future__ import annotations
+
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+MEMO_ATTRIBUTE = "_memo"
+
+
+def memo_key(value: Any) -> Hashable:
+    """Lists (e.g. column names) are keyed as tuples."""
+    return tuple(value) if isinstance(value, list) else value
+
+
+def memoized(method: Callable) -> Callable:
+    """
+    Cache result of method for each instance and arguments, the instance must be Memoized.
+    Results are shared by callers and must not be modified in place.
+    """
+
+    @wraps(method)
+    def wrapper(self: Memoized, *args, **kwargs):
+        memo: Dict[Tuple, Any] = self.__dict__.setdefault(MEMO_ATTRIBUTE, {})
+        key = (
+            method.__name__,
+            tuple(memo_key(a) for a in args),
+            tuple(sorted((k, memo_key(v)) for k, v in kwargs.items())),
+        )
+        if key not in memo:
+            memo[key] = method(self, *args, **kwargs)
+        return memo[key]
+
+    return wrapper
+
+
+class Memoized:
+    """Base class of instances with memoized methods, results are dropped whenever an attribute is set."""
+
+    def __setattr__(self, name: str, value: Any):
+        self.invalidate()
+        super().__setattr__(name, value)
+
+    def invalidate(self):
+        """Drop memoized results."""
+        self.__dict__.pop(MEMO_ATTRIBUTE, None)
@@ -0,0 +1,54 @@
+"""DataFrames as Arrow IPC files (read memory mapped) and IPC streams (bytes)."""
+
+from __future__ import annotations
+
+import os
+
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+
+
+def save_snapshot(df: pd.DataFrame, path: Path, compression: str = "zstd"):
+    """Save df as Arrow IPC file, pandas schema is stored with data (timezones, categories, ... are kept)."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    options = pa.ipc.IpcWriteOptions(compression=None if compression == "uncompressed" else compression)
+    os.makedirs(path.parent, exist_ok=True)
+    with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+
+
+def load_snapshot(path: Path, columns: Optional[list[str]] = None) -> pd.DataFrame:
+    """
+    Load df (all columns or only `columns`) from Arrow IPC file.
+    Buffers of other columns are skipped: not decompressed, and for uncompressed files their pages are not read.
+    Loaded columns are copied to writable pandas arrays, df does not reference the file.
+    """
+    with pa.memory_map(str(path), "r") as source:
+        options = None
+        if columns is not None:
+            names = pa.ipc.open_file(source).schema.names
+            missing = [c for c in columns if c not in names]
+            if missing:
+                raise KeyError(f"Columns {missing} not in {path}")
+            options = pa.ipc.IpcReadOptions(included_fields=[names.index(c) for c in columns])
+        # buffers are valid only while the file is mapped
+        table = pa.ipc.open_file(source, options=options).read_all()
+        return table.select(columns).to_pandas() if columns is not None else table.to_pandas()
+
+
+def to_ipc_bytes(df: pd.DataFrame, compression: str = "lz4") -> bytes:
+    """Serialize df as Arrow IPC stream e.g. compact columnar payload sent to other process."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    options = pa.ipc.IpcWriteOptions(compression=None if compression == "uncompressed" else compression)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def from_ipc_bytes(data: bytes) -> pd.DataFrame:
+    """Deserialize df from Arrow IPC stream (to_ipc_bytes)."""
+    return pa.ipc.open_stream(data).read_all().to_pandas()
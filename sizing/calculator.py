@@ -2,9 +2,11 @@ from __future__ import annotations
 
 import os
 
+from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
 from loguru import logger
@@ -15,6 +17,7 @@ from metrics.model.tables import SlaTablesHelper
 from prometheus.sla_model import SlaTable
 from reports.html import sizing_calc_report, sizing_calc_summary_header
 from settings import settings
+from shared.memo import Memoized, memoized
 from sizing import (
     CPU_LIMIT_MILLIS_COLUMNS,
     CPU_LIMIT_NAME,
@@ -51,6 +54,10 @@ class Resource:
     def __str__(self):
         return f"{self.name} : {self.measured}[{self.unit}]"
 
+    def columns(self) -> list[str]:
+        """SLA table columns of the resource."""
+        return [c for c in (self.limit, self.request, self.measured) if c]
+
 
 MEMORY_RESOURCE: Resource = Resource(
     name="memory",
@@ -83,7 +90,40 @@ JVM_PROCESS_NON_HEAP_RESOURCE: Resource = Resource(
 )
 
 
-class LimitsRequests:
+def resource_columns(sla_table: SlaTable, resources: list[Resource]) -> list[str]:
+    """TIMESTAMP, table keys and columns of resources, the projection of sla table needed by LimitsRequests."""
+    columns = [TIMESTAMP_COLUMN] + sla_table.tableKeys
+    for resource in resources:
+        columns = columns + [c for c in resource.columns() if c not in columns]
+    return columns
+
+
+class BaseLimitsRequests(Memoized, ABC):
+    """Limits, requests and measured percentiles of one resource consumed by SizingCalculator."""
+
+    def __init__(self, resource: Resource, limit_value: pd.Series, request_value: pd.Series):
+        self.resource: Resource = resource
+        self.limit_value: pd.Series = limit_value
+        self.request_value: pd.Series = request_value
+
+    @memoized
+    def request_limit_df(self, columns: List[str]) -> pd.DataFrame:
+        """Return requests and limits values."""
+        df = pd.concat([self.request_value, self.limit_value], axis=1)
+        df.columns = columns
+        df.dropna(how="all", inplace=True)
+        return df
+
+    @abstractmethod
+    def measured_samples(self) -> Tuple[np.ndarray, pd.Index]:
+        """Measured values as 2-D array with a row of each series (NaN for missing samples) and series index."""
+
+    @abstractmethod
+    def measured_df_percentiles(self) -> pd.DataFrame:
+        """Return measured values percentiles."""
+
+
+class LimitsRequests(BaseLimitsRequests):
     def __init__(self, ns_df: pd.DataFrame, sla_table: SlaTable, resource: Resource):
         self.ns_df: pd.DataFrame = ns_df
         self.sla_table: SlaTable = sla_table
@@ -97,10 +137,11 @@ class LimitsRequests:
         self.request_field: pd.DataFrame = self.ns_df_unstacked[resource.request]
         self.measured_field: pd.DataFrame = self.ns_df_unstacked[resource.measured]
         self.verify_limits_requests()
-        self.limit_value: pd.Series = self.limit_field.max(axis=1)
-        self.request_value: pd.Series = self.request_field.max(axis=1)
-        self.limit_value.name = resource.limit
-        self.request_value.name = resource.request
+        super().__init__(
+            resource=resource,
+            limit_value=self.limit_field.max(axis=1).rename(resource.limit),
+            request_value=self.request_field.max(axis=1).rename(resource.request),
+        )
 
     @classmethod
     def dummy(cls, sla_table: SlaTable, resource: Resource, df: pd.DataFrame) -> LimitsRequests:
@@ -117,17 +158,16 @@ class LimitsRequests:
         assert self.limit_field.min(axis=1).equals(self.limit_field.max(axis=1))
         assert self.request_field.min(axis=1).equals(self.request_field.max(axis=1))
 
-    def request_limit_df(self, columns: List[str]) -> pd.DataFrame:
-        """Return requests and limits values."""
-        df = pd.concat([self.request_value, self.limit_value], axis=1)
-        df.columns = columns
-        df.dropna(how="all", inplace=True)
-        return df
+    def measured_samples(self) -> Tuple[np.ndarray, pd.Index]:
+        """Measured values as 2-D array with a row of each series (NaN for missing samples) and series index."""
+        measured = self.measured_field.dropna(how="all")
+        return measured.to_numpy(dtype=np.float64, na_value=np.nan), measured.index
 
+    @memoized
     def measured_df_percentiles(self) -> pd.DataFrame:
         """Return measured values percentiles."""
-        described_df = self.measured_field.dropna(how="all").T.describe(percentiles=PERCENTILES)
-        return described_df.T
+        values, index = self.measured_samples()
+        return percentiles_df(values, index=index)
 
 
 count_column = "count"
@@ -136,22 +176,47 @@ cpu_lower_limit_millis = 1
 memory_lower_limit_mib = 1
 
 
-class SizingCalculator:
+def percentiles_df(values: np.ndarray, index: pd.Index, percentiles: List[float] = PERCENTILES) -> pd.DataFrame:
+    """
+    Count, min, percentiles and max of each row of 2-D array ignoring NaN, columns `count` and `scaled_columns`.
+    Single sort of the rows, percentiles are linearly interpolated as in `describe` (numpy `nanquantile`).
+    Each row must have at least one value.
+    """
+    columns = [count_column] + scaled_columns
+    if len(values) == 0:
+        return pd.DataFrame(index=index, columns=columns, dtype=np.float64)
+    sorted_values = np.sort(values, axis=1)  # NaN last
+    counts = np.count_nonzero(~np.isnan(sorted_values), axis=1)
+    positions = np.outer(counts - 1, percentiles)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.ceil(positions).astype(np.intp)
+    below = np.take_along_axis(sorted_values, lower, axis=1)
+    above = np.take_along_axis(sorted_values, upper, axis=1)
+    # numpy lerp, exact at both ends
+    weights = positions - lower
+    diff = above - below
+    quantiles = np.where(weights >= 0.5, above - diff * (1 - weights), below + diff * weights)
+    maxima = sorted_values[np.arange(len(sorted_values)), counts - 1]
+    data = np.column_stack([counts.astype(np.float64), sorted_values[:, 0], quantiles, maxima])
+    return pd.DataFrame(data, index=index, columns=columns)
+
+
+class SizingCalculator(Memoized):
     def __init__(
         self,
-        cpu: LimitsRequests,
-        memory: LimitsRequests,
+        cpu: BaseLimitsRequests,
+        memory: BaseLimitsRequests,
         time_range: Optional[TimeRange] = None,
         test_details: Optional[TestDetails] = None,
     ):
-        self.cpu: LimitsRequests = cpu
-        self.memory: LimitsRequests = memory
+        self.cpu: BaseLimitsRequests = cpu
+        self.memory: BaseLimitsRequests = memory
         self.time_range: Optional[TimeRange] = time_range
         self.test_details: Optional[TestDetails] = test_details
 
     @classmethod
     def from_test_details(
-        cls, cpu: LimitsRequests, memory: LimitsRequests, test_details: TestDetails
+        cls, cpu: BaseLimitsRequests, memory: BaseLimitsRequests, test_details: TestDetails
     ) -> SizingCalculator:
         return cls(
             cpu=cpu,
@@ -160,32 +225,39 @@ class SizingCalculator:
             test_details=test_details,
         )
 
+    @memoized
     def memory_mibs(self) -> pd.DataFrame:
         memory_request_limits = self.memory.request_limit_df(columns=MEMORY_LIMIT_MIBS_COLUMNS)
         return (memory_request_limits / MIBS).astype(int)
 
+    @memoized
     def cpu_millis(self) -> pd.DataFrame:
         """Convert cpu limits and requests from cores to milli cores."""
         cpu_request_limits = self.cpu.request_limit_df(columns=CPU_LIMIT_MILLIS_COLUMNS)
         return (cpu_request_limits * 1000).astype(int)
 
+    @memoized
     def request_limits(self) -> pd.DataFrame:
         """Return CPU and memory requests and limits values in milli cores and Mi"""
         cpu_request_limits_millis = self.cpu_millis()
         memory_request_limits_mib = self.memory_mibs()
         return pd.concat([cpu_request_limits_millis, memory_request_limits_mib], axis=1)
 
+    @memoized
     def mem_percentiles(self) -> pd.DataFrame:
         """Return memory percentiles joined with memory requests and limits in Mi."""
-        counts_ser: pd.Series = self.memory.measured_df_percentiles()[count_column].astype(int)
-        percentiles_df = (self.memory.measured_df_percentiles()[scaled_columns] / MIBS).astype(int)
+        measured_percentiles = self.memory.measured_df_percentiles()
+        counts_ser: pd.Series = measured_percentiles[count_column].astype(int)
+        percentiles_df = (measured_percentiles[scaled_columns] / MIBS).astype(int)
         percentiles_df[count_column] = counts_ser
         return pd.concat([percentiles_df, self.memory_mibs()], axis=1, join="inner")
 
+    @memoized
     def cpu_percentiles(self) -> pd.DataFrame:
         """Return cpu percentiles joined with cpu requests and limits in milli cores."""
-        counts_ser: pd.Series = self.cpu.measured_df_percentiles()[count_column].astype(int)
-        percentiles_df = (self.cpu.measured_df_percentiles()[scaled_columns] * 1000).round(1)
+        measured_percentiles = self.cpu.measured_df_percentiles()
+        counts_ser: pd.Series = measured_percentiles[count_column].astype(int)
+        percentiles_df = (measured_percentiles[scaled_columns] * 1000).round(1)
         percentiles_df[count_column] = counts_ser
         return pd.concat([percentiles_df, self.cpu_millis()], axis=1, join="inner")
 
@@ -219,10 +291,9 @@ class SizingCalculator:
         )
 
     def new_sizing(self) -> pd.DataFrame:
-        cpu_request: pd.Series = self.cpu_percentiles()[REQUEST_PERCENTILE]
-        cpu_request.name = CPU_REQUEST_NAME
-        cpu_limit: pd.Series = self.cpu_percentiles()[LIMIT_PERCENTILE]
-        cpu_limit.name = CPU_LIMIT_NAME
+        # percentiles are memoized, renamed copies do not modify them
+        cpu_request: pd.Series = self.cpu_percentiles()[REQUEST_PERCENTILE].rename(CPU_REQUEST_NAME)
+        cpu_limit: pd.Series = self.cpu_percentiles()[LIMIT_PERCENTILE].rename(CPU_LIMIT_NAME)
         cpu_sizing = pd.concat([cpu_request, cpu_limit], axis=1)
         # select max cpu sizing for each container
         cpu_sizing_container = cpu_sizing.groupby(CONTAINER_COLUMN).max()
@@ -232,10 +303,8 @@ class SizingCalculator:
         )
         # for memory we use limit = request but
         # DataFrame columns must be unique for orient='index'.
-        mem_request: pd.Series = self.mem_percentiles()[REQUEST_PERCENTILE]
-        mem_request.name = MEMORY_REQUEST_NAME
-        mem_limit: pd.Series = self.mem_percentiles()[LIMIT_PERCENTILE]
-        mem_limit.name = MEMORY_LIMIT_NAME
+        mem_request: pd.Series = self.mem_percentiles()[REQUEST_PERCENTILE].rename(MEMORY_REQUEST_NAME)
+        mem_limit: pd.Series = self.mem_percentiles()[LIMIT_PERCENTILE].rename(MEMORY_LIMIT_NAME)
         mem_sizing = pd.concat([mem_request, mem_limit], axis=1)
         mem_sizing_container = mem_sizing.groupby(CONTAINER_COLUMN).max()
         # remove rows with 0
@@ -257,6 +326,12 @@ class SizingCalculator:
         n_s.to_json(path, orient="index", indent=2)
 
 
+def namespace_dfs(all_ns_df: pd.DataFrame) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """Namespace and its data frame, data frame is partitioned by single groupby, namespaces are sorted."""
+    for namespace, ns_df in all_ns_df.groupby(NAMESPACE_COLUMN, sort=True):
+        yield str(namespace), ns_df
+
+
 def sizing_calculator(
     start_time: str,
     end_time: str,
@@ -270,7 +345,8 @@ def sizing_calculator(
     # value error if no table with name
     sla_table: SlaTable = sla_tables.get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
     prom_rules: PrometheusRules = PrometheusRules(time_range=time_range, sla_table=sla_table)
-    prom_rules.load_df()
+    # namespace filter and columns are pushed down to the table store
+    prom_rules.load_df(namespace=namespace, columns=resource_columns(sla_table, [CPU_RESOURCE, MEMORY_RESOURCE]))
     ns_df = prom_rules.ns_df(namespace=namespace)
     cpu: LimitsRequests = LimitsRequests(ns_df=ns_df, sla_table=sla_table, resource=CPU_RESOURCE)
     memory: LimitsRequests = LimitsRequests(ns_df=ns_df, sla_table=sla_table, resource=MEMORY_RESOURCE)
@@ -1,10 +1,9 @@
 from __future__ import annotations
 
-import os
-
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
+import numpy as np
 import pandas as pd
 
 from loguru import logger
@@ -13,11 +12,14 @@ from metrics import CONTAINER_COLUMN, MIBS, NAMESPACE_COLUMN, POD_COLUMN, TIMEST
 from metrics.collector import TimeRange
 from prometheus.sla_model import SlaTable
 from settings import settings
+from shared.snapshot import load_snapshot, save_snapshot
 from sizing.calculator import CPU_RESOURCE, MEMORY_RESOURCE
-from storage.snowflake import dataframe
-from storage.snowflake.engine import SnowflakeEngine
+from storage.snowflake.dataframe import utc_timestamps
+from storage.table_cache import TableCache
+from storage.table_factory import table_store
 
 
+SNAPSHOT_SUFFIX = ".arrow"
 time_delta = pd.Timedelta(seconds=1)
 cpu_data = {
     TIMESTAMP_COLUMN: [pd.Timestamp.now() - time_delta, pd.Timestamp.now()],
@@ -40,6 +42,35 @@ mem_data = {
 MEM_DF = pd.DataFrame(mem_data)
 
 
+def json_to_snapshot(json_path: Path, snapshot_path: Optional[Path] = None) -> Path:
+    """Convert df json file (former snapshot format) to Arrow IPC file, next to json file by default."""
+    snapshot_path = snapshot_path if snapshot_path else json_path.with_suffix(SNAPSHOT_SUFFIX)
+    df: pd.DataFrame = pd.read_json(json_path)
+    save_snapshot(df=df, path=snapshot_path, compression=settings.snapshot_compression)
+    logger.info(
+        f"Converted {json_path} ({json_path.stat().st_size} B) to {snapshot_path} ({snapshot_path.stat().st_size} B)"
+    )
+    return snapshot_path
+
+
+class TimeSlices:
+    """Data frame sorted by timestamp, time ranges (including bounds) are sliced by binary search."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df: pd.DataFrame = df.sort_values(TIMESTAMP_COLUMN, kind="stable", ignore_index=True)
+        self.timestamps: np.ndarray = utc_timestamps(self.df[TIMESTAMP_COLUMN]).dt.tz_convert(None).to_numpy()
+
+    @staticmethod
+    def utc_datetime64(timestamp: pd.Timestamp) -> np.datetime64:
+        return timestamp.tz_convert("UTC").tz_localize(None).to_datetime64()
+
+    def slice(self, time_range: TimeRange) -> pd.DataFrame:
+        """Rows of time range, a view of the sorted data frame."""
+        start = np.searchsorted(self.timestamps, self.utc_datetime64(time_range.from_time), side="left")
+        end = np.searchsorted(self.timestamps, self.utc_datetime64(time_range.to_time), side="right")
+        return self.df.iloc[start:end]
+
+
 class DataLoader:
     def __init__(
         self,
@@ -47,6 +78,7 @@ class DataLoader:
         end_time: Optional[str],
         delta_hours: Optional[float] = settings.time_delta_hours,
         time_range: Optional[TimeRange] = None,
+        cache: Optional[TableCache] = None,
     ):
         self.startTime = start_time
         self.endTime = end_time
@@ -54,78 +86,91 @@ class DataLoader:
         self.timeRange = (
             time_range if time_range else TimeRange(start_time=start_time, end_time=end_time, delta_hours=delta_hours)
         )
+        self.cache: Optional[TableCache] = cache
 
-    def time_range_query(self, table_name: str) -> str:
-        """Create query for time range."""
-        lower_bound = f""""{TIMESTAMP_COLUMN}" >= '{self.timeRange.from_time}'"""
-        upper_bound = f""""{TIMESTAMP_COLUMN}" <= '{self.timeRange.to_time}'"""
-        q = f"SELECT * FROM {table_name} WHERE {lower_bound} AND {upper_bound}"
-        return q
-
-    def load_range_table(self, sla_table: SlaTable) -> pd.DataFrame:
-        """Load df from Snowflake table for time range."""
-        sf = SnowflakeEngine(schema=sla_table.dbSchema)
-        try:
+    def load_range_table(
+        self, sla_table: SlaTable, namespace: Optional[str] = None, columns: Optional[list[str]] = None
+    ) -> pd.DataFrame:
+        """Load df from table store (settings.storage_backend) for time range, optionally namespace and columns."""
+        with table_store() as store:
             table_name = sla_table.tableName
             table_keys = [TIMESTAMP_COLUMN] + sla_table.tableKeys if sla_table.tableKeys else []
-            q = self.time_range_query(table_name=table_name)
-            msg = f"Snowflake table: {sf.schema}.{table_name}, {self.timeRange}"
-            logger.info(msg)
-            df: pd.DataFrame = dataframe.get_df(query=q, con=sf.connection)
+            logger.info(f"Table: {sla_table.dbSchema}.{table_name}, {self.timeRange}, {store}")
+            if self.cache is not None:
+                df: pd.DataFrame = self.cache.read_range(
+                    store=store, sla_table=sla_table, time_range=self.timeRange, namespace=namespace, columns=columns
+                )
+            else:
+                df = store.read_range(
+                    sla_table=sla_table, time_range=self.timeRange, namespace=namespace, columns=columns
+                )
+            if not settings.table_client_dedup:
+                return df
             dedup_df = df.drop_duplicates(subset=table_keys)
             removed = len(df) - len(dedup_df)
             if removed > 0:
                 msg = f"Removed {removed} duplicates from {table_name}"
                 logger.info(msg)
             return dedup_df
-        finally:
-            sf.sf_engine.dispose()
 
-    def load_df_db(self, sla_table: SlaTable, namespace: Optional[str]) -> tuple[pd.DataFrame, tuple[str, ...]]:
+    def read_batches(
+        self, sla_table: SlaTable, namespace: Optional[str] = None, columns: Optional[list[str]] = None
+    ) -> Iterator[pd.DataFrame]:
+        """Stream time range from table store in batches of settings.table_batch_rows rows."""
+        with table_store() as store:
+            logger.info(f"Table: {sla_table.dbSchema}.{sla_table.tableName}, {self.timeRange}, {store}, batches")
+            yield from store.read_batches(
+                sla_table=sla_table, time_range=self.timeRange, namespace=namespace, columns=columns
+            )
+
+    def load_df_db(
+        self, sla_table: SlaTable, namespace: Optional[str], columns: Optional[list[str]] = None
+    ) -> tuple[pd.DataFrame, tuple[str, ...]]:
         """Load data for given range from DB, optionally filter by namespace.
 
         Namespace has a role of higher level entity. Data is loaded only for given time range potentially
         containing more than one higher level entity (called namespace here).
         namespace = None returns the whole time range dataframe
         :param sla_table: SlaTable
-        :param namespace: optional namespace filter
+        :param namespace: optional namespace filter, pushed down to the table store, "" loads all namespaces
+        :param columns: optional columns, all by default
         :return: namespace df and list of namespaces, when namespace is None all namespaces are returned
         """
-        df: pd.DataFrame = self.load_range_table(sla_table=sla_table)
+        df: pd.DataFrame = self.load_range_table(sla_table=sla_table, namespace=namespace or None, columns=columns)
         if df.empty:
-            raise ValueError(f"No data for {sla_table.tableName} in {self.timeRange}")
+            ns_msg = f" and namespace {namespace}" if namespace else ""
+            raise ValueError(f"No data for {sla_table.tableName} in {self.timeRange}{ns_msg}")
         if namespace is None:
             return df, tuple()
-        all_ns: list[str] = sorted(set(df[NAMESPACE_COLUMN]))
-        if namespace is not None and namespace not in all_ns:
-            raise ValueError(f"Namespace {namespace} not found in {all_ns}")
         if namespace:
-            return df[df[NAMESPACE_COLUMN] == namespace], (namespace,)
-        else:
-            return df, tuple(all_ns)
+            return df, (namespace,)
+        return df, tuple(sorted(set(df[NAMESPACE_COLUMN])))
+
+    def snapshot_path(self, sla_table: SlaTable) -> Path:
+        filename = f"{sla_table.tableName}_{str(self.timeRange)}{SNAPSHOT_SUFFIX}"
+        return Path(settings.data, filename)
 
     def save_df(self, sla_table: SlaTable, namespace: Optional[str]):
-        """Save df to json file."""
+        """Save df to Arrow IPC file (snapshot)."""
         df: pd.DataFrame = self.load_df_db(sla_table=sla_table, namespace=namespace)[0]
-        filename = f"{sla_table.tableName}_{str(self.timeRange)}.json"
-        df_path = Path(settings.data, filename)
+        df_path = self.snapshot_path(sla_table)
         msg = f"Save df with shape {df.shape} to {df_path}"
         logger.info(msg)
-        os.makedirs(df_path.parent, exist_ok=True)
-        df.to_json(df_path)
+        save_snapshot(df=df, path=df_path, compression=settings.snapshot_compression)
 
     def load_df_file(self, sla_table: SlaTable, df_path: Path | None) -> pd.DataFrame:
-        """Load df from json file.
+        """Load df from snapshot file.
         :param sla_table: SlaTable, used for filename
-        :param df_path: optional path to df json file.
+        :param df_path: optional path to Arrow IPC file or json file (former format, see json_to_snapshot).
 
         If df_path is None the file in settings data folder named as tableName_timeRange is used.
         """
-        filename = f"{sla_table.tableName}_{str(self.timeRange)}.json"
-        df_path = df_path if df_path else Path(settings.data, filename)
+        df_path = df_path if df_path else self.snapshot_path(sla_table)
         if df_path.exists():
             msg = f"Load df from {df_path}"
             logger.info(msg)
-            return pd.read_json(df_path)
+            if df_path.suffix == ".json":
+                return pd.read_json(df_path)
+            return load_snapshot(df_path)
         else:
             raise FileNotFoundError(f"File {df_path} not found")
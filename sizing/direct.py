@@ -0,0 +1,103 @@
+"""Sizing percentiles evaluated by Prometheus over the whole time range instead of from stored time series."""
+
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from loguru import logger
+
+from metrics import NAMESPACE_COLUMN
+from metrics.collector import PrometheusCollector
+from prometheus.sla_model import SlaTable
+from settings import settings
+from sizing import PERCENTILES
+from sizing.calculator import BaseLimitsRequests, Resource, count_column, scaled_columns
+
+
+def over_time(function: str, expression: str, duration_sec: float, step_sec: float, param: Optional[float] = None):
+    """
+    <function>_over_time of subquery covering the time range, evaluated at its end
+    e.g. quantile_over_time(0.2, (sum(...) by (...))[3600000ms:30000ms])
+    """
+    subquery = f"({expression})[{int(duration_sec * 1000)}ms:{int(step_sec * 1000)}ms]"
+    args = f"{param}, {subquery}" if param is not None else subquery
+    return f"{function}_over_time({args})"
+
+
+class DirectLimitsRequests(BaseLimitsRequests):
+    """
+    Replacement of LimitsRequests for SizingCalculator without loading time series.
+
+    Measured resource percentiles, min, max and count and max of limits and requests are
+    instant queries of *_over_time functions over the time range built from the SLA table expressions.
+    Samples are evaluated at the SLA table step (subquery step), so results correspond to
+    `describe` of the stored data.
+    """
+
+    def __init__(
+        self,
+        collector: PrometheusCollector,
+        sla_table: SlaTable,
+        resource: Resource,
+        namespace: str,
+        workers: int = settings.prom_workers,
+    ):
+        # labels are replaced in copy, the sla table can be shared
+        self.sla_table: SlaTable = sla_table.model_copy(deep=True)
+        self.sla_table.replace_labels(namespace=namespace)
+        self.keys = self.sla_table.tableKeys
+        self.collector: PrometheusCollector = collector
+        time_range = collector.timeRange
+        self.durationSec: float = (time_range.to_time - time_range.from_time).total_seconds()
+        queries: dict[str, str] = self.queries(resource)
+        results: list[pd.Series] = collector.instant_queries(
+            p_queries=list(queries.values()), group_by=self.sla_table.groupBy, time=time_range.to_time, workers=workers
+        )
+        values: dict[str, pd.Series] = {name: self.drop_namespace(ser) for name, ser in zip(queries.keys(), results)}
+        percentiles = [values[name].rename(name) for name in [count_column] + scaled_columns]
+        # the same series in all columns
+        self.percentiles_df: pd.DataFrame = pd.concat(percentiles, axis=1, join="inner")
+        super().__init__(
+            resource=resource,
+            limit_value=values[resource.limit].rename(resource.limit),
+            request_value=values[resource.request].rename(resource.request),
+        )
+        logger.info(f"{resource}: {len(self.percentiles_df)} series from {len(queries)} instant queries")
+
+    def expression(self, column_name: Optional[str]) -> str:
+        for prom_query in self.sla_table.queries:
+            if prom_query.columnName == column_name:
+                return prom_query.query
+        raise ValueError(f"No column {column_name} in {self.sla_table.tableName}")
+
+    def queries(self, resource: Resource) -> dict[str, str]:
+        """PromQL for each percentiles column and for limit and request (max over time range) of resource."""
+        step_sec = self.sla_table.stepSec
+        measured = self.expression(resource.measured)
+        ret: dict[str, str] = {
+            count_column: over_time("count", measured, self.durationSec, step_sec),
+            "min": over_time("min", measured, self.durationSec, step_sec),
+            "max": over_time("max", measured, self.durationSec, step_sec),
+        }
+        for p in PERCENTILES:
+            ret[f"{int(p * 100)}%"] = over_time("quantile", measured, self.durationSec, step_sec, param=p)
+        for column in [resource.limit, resource.request]:
+            ret[column] = over_time("max", self.expression(column), self.durationSec, step_sec)
+        return ret
+
+    @staticmethod
+    def drop_namespace(ser: pd.Series) -> pd.Series:
+        """Single namespace, index is the same as LimitsRequests index."""
+        if NAMESPACE_COLUMN in ser.index.names:
+            return ser.droplevel(NAMESPACE_COLUMN)
+        return ser
+
+    def measured_samples(self) -> Tuple[np.ndarray, pd.Index]:
+        raise ValueError(f"{self.resource}: samples are not loaded by direct sizing")
+
+    def measured_df_percentiles(self) -> pd.DataFrame:
+        """Return measured values percentiles."""
+        return self.percentiles_df
@@ -0,0 +1,112 @@
+"""Sizing of independent units (tests of test summary, namespaces) in a process pool."""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+import pandas as pd
+
+from loguru import logger
+
+from metrics.collector import TimeRange
+from prometheus.sla_model import SlaTable
+from shared.snapshot import from_ipc_bytes, to_ipc_bytes
+from sizing.calculator import CPU_RESOURCE, MEMORY_RESOURCE, BaseLimitsRequests, LimitsRequests, SizingCalculator
+from sizing.sketch import ResourceSketch, save_sketches
+from test_summary.model import TestDetails, TestSummary
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class SizingResult:
+    """New sizing and optional cpu and memory sketches of one unit (namespace), reports are saved by the unit."""
+
+    def __init__(
+        self,
+        new_sizing: pd.DataFrame,
+        sketches: Optional[Tuple[ResourceSketch, ResourceSketch]] = None,
+        namespace: Optional[str] = None,
+    ):
+        self.newSizing: pd.DataFrame = new_sizing
+        self.sketches: Optional[Tuple[ResourceSketch, ResourceSketch]] = sketches
+        self.namespace: Optional[str] = namespace
+
+
+def sizing_result(
+    cpu: BaseLimitsRequests,
+    memory: BaseLimitsRequests,
+    folder: Path,
+    time_range: Optional[TimeRange] = None,
+    test_details: Optional[TestDetails] = None,
+    test_summary: Optional[TestSummary] = None,
+    sketches: bool = False,
+    namespace: Optional[str] = None,
+) -> SizingResult:
+    """Save sizing reports (and sketches) of unit to folder, return new sizing."""
+    if test_details is not None:
+        s_c = SizingCalculator.from_test_details(cpu=cpu, memory=memory, test_details=test_details)
+    else:
+        s_c = SizingCalculator(cpu=cpu, memory=memory, time_range=time_range)
+    s_c.sizing_calc_all_reports(folder=folder, test_summary=test_summary)
+    saved_sketches = save_sketches(cpu=cpu, memory=memory, folder=folder) if sketches else None
+    return SizingResult(new_sizing=s_c.new_sizing(), sketches=saved_sketches, namespace=namespace)
+
+
+class SizingUnit:
+    """
+    Payload of one unit sent to worker process.
+
+    Namespace table is a compressed Arrow IPC stream of the resource columns (not a pickled data frame),
+    LimitsRequests are built by the worker.
+    """
+
+    def __init__(
+        self,
+        ns_df: pd.DataFrame,
+        sla_table: SlaTable,
+        folder: Path,
+        time_range: Optional[TimeRange] = None,
+        test_details: Optional[TestDetails] = None,
+        test_summary: Optional[TestSummary] = None,
+        sketches: bool = False,
+        namespace: Optional[str] = None,
+    ):
+        self.table: bytes = to_ipc_bytes(ns_df)
+        self.slaTable: SlaTable = sla_table
+        self.folder: Path = folder
+        self.timeRange: Optional[TimeRange] = time_range
+        self.testDetails: Optional[TestDetails] = test_details
+        self.testSummary: Optional[TestSummary] = test_summary
+        self.sketches: bool = sketches
+        self.namespace: Optional[str] = namespace
+
+
+def size_unit(unit: SizingUnit) -> SizingResult:
+    """Worker of SizingUnit."""
+    ns_df = from_ipc_bytes(unit.table)
+    cpu = LimitsRequests(ns_df=ns_df, sla_table=unit.slaTable, resource=CPU_RESOURCE)
+    memory = LimitsRequests(ns_df=ns_df, sla_table=unit.slaTable, resource=MEMORY_RESOURCE)
+    return sizing_result(
+        cpu=cpu,
+        memory=memory,
+        folder=unit.folder,
+        time_range=unit.timeRange,
+        test_details=unit.testDetails,
+        test_summary=unit.testSummary,
+        sketches=unit.sketches,
+        namespace=unit.namespace,
+    )
+
+
+def map_in_processes(fn: Callable[[T], R], items: List[T], workers: int) -> List[R]:
+    """Apply fn to items in process pool, results keep the order of items (do not depend on workers)."""
+    if workers <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    workers = min(workers, len(items))
+    logger.info(f"Running {len(items)} units in {workers} processes")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fn, items))
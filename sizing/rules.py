@@ -10,8 +10,8 @@ from pandas import DataFrame
 from metrics import CONTAINER_COLUMN, NAMESPACE_COLUMN, POD_COLUMN, TIMESTAMP_COLUMN
 from metrics.collector import TimeRange
 from prometheus.sla_model import BasicSla, Compare, SlaTable
-from storage.snowflake import dataframe
-from storage.snowflake.engine import SnowflakeEngine
+from settings import settings
+from storage.table_factory import table_store
 
 
 CONTAINER_POD_COLUMNS = [CONTAINER_COLUMN, POD_COLUMN]
@@ -364,34 +364,29 @@ class PrometheusRules:
     def __format__(self, format_spec=""):
         return f"period: {self.timeRange.from_time.isoformat()} - {self.timeRange.to_time.isoformat()}"
 
-    def time_range_query(self, table_name: str, timestamp_field: str = TIMESTAMP_COLUMN):
-        lower_bound = f""""{timestamp_field}" >= '{self.timeRange.from_time}'"""
-        upper_bound = f""""{timestamp_field}" <= '{self.timeRange.to_time}'"""
-        q = f"SELECT * FROM {table_name} WHERE {lower_bound} AND {upper_bound}"
-        return q
-
-    def load_range_table(self) -> pd.DataFrame:
-        sf = SnowflakeEngine(schema=self.sla_table.dbSchema)
-        try:
+    def load_range_table(self, namespace: Optional[str] = None, columns: Optional[list[str]] = None) -> pd.DataFrame:
+        """Rows of time range, optionally of namespace and only columns (filtered by the table store)."""
+        with table_store() as store:
             table_name = self.sla_table.tableName
             table_keys = [TIMESTAMP_COLUMN] + self.sla_table.tableKeys if self.sla_table.tableKeys else []
-            q = self.time_range_query(table_name=table_name)
             logger.info(
-                f"Snowflake table: {sf.schema}.{table_name}, "
-                f"range: {self.timeRange.from_time} - {self.timeRange.to_time}"
+                f"Table: {self.sla_table.dbSchema}.{table_name}, "
+                f"range: {self.timeRange.from_time} - {self.timeRange.to_time}, {store}"
+            )
+            df: DataFrame = store.read_range(
+                sla_table=self.sla_table, time_range=self.timeRange, namespace=namespace, columns=columns
             )
-            df: DataFrame = dataframe.get_df(query=q, con=sf.connection)
+            if not settings.table_client_dedup:
+                return df
             dedup_df = df.drop_duplicates(subset=table_keys)
             removed = len(df) - len(dedup_df)
             if removed > 0:
                 logger.info(f"Removed {removed} duplicates by {table_keys}")
             return dedup_df
-        finally:
-            sf.sf_engine.dispose()
 
-    def load_df(self):
-        """Load data from Snowflake sla table and set self.df."""
-        self.df = self.load_range_table()
+    def load_df(self, namespace: Optional[str] = None, columns: Optional[list[str]] = None):
+        """Load data from sla table and set self.df, optionally only namespace and columns."""
+        self.df = self.load_range_table(namespace=namespace, columns=columns)
 
     def namespaces(self, namespace: str) -> list[str]:
         """All unique namespaces or filtered one."""
@@ -0,0 +1,237 @@
+"""
+Mergeable quantile sketches of measured resources (DDSketch with unbounded bucket index).
+
+Percentiles of sketches merged across tests, namespaces and days are percentiles of all merged samples
+with relative error `relativeAccuracy`, memory is bounded by the number of buckets (log of value range).
+"""
+
+from __future__ import annotations
+
+import json
+
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from loguru import logger
+
+from settings import settings
+from shared.memo import Memoized, memoized
+from shared.utils import list_files
+from sizing import PERCENTILES
+from sizing.calculator import (
+    CPU_RESOURCE,
+    MEMORY_RESOURCE,
+    BaseLimitsRequests,
+    Resource,
+    SizingCalculator,
+    count_column,
+    scaled_columns,
+)
+
+
+SKETCH_RESOURCES = {resource.name: resource for resource in [CPU_RESOURCE, MEMORY_RESOURCE]}
+SKETCH_FILE_PREFIX = "sketch_"
+# sketches merged from sub folders (tests), not merged again with them
+MERGED_SKETCHES_FOLDER = "sketches"
+BUCKET_LEVEL = "BUCKET"
+# values <= 0 i.e. idle containers
+ZERO_BUCKET = np.iinfo(np.int64).min
+SERIES_COLUMNS = ["min", "max", "limit", "request"]
+
+
+class ResourceSketch(Memoized):
+    """
+    Quantile sketch of each series of one resource, merged with max of limits and requests.
+
+    buckets: sample count of each series and bucket index i, bucket covers values (gamma^(i-1), gamma^i]
+    series: min, max, limit and request of each series
+    """
+
+    def __init__(self, resource: Resource, relative_accuracy: float, buckets: pd.Series, series: pd.DataFrame):
+        self.resource: Resource = resource
+        self.relativeAccuracy: float = relative_accuracy
+        self.gamma: float = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.buckets: pd.Series = buckets.sort_index()
+        self.series: pd.DataFrame = series.sort_index()
+
+    @classmethod
+    def from_limits_requests(
+        cls, limits_requests: BaseLimitsRequests, relative_accuracy: float = settings.sketch_relative_accuracy
+    ) -> ResourceSketch:
+        """Sketch of stored (or streamed) samples, not available for DirectLimitsRequests."""
+        values, index = limits_requests.measured_samples()
+        rows, columns = np.nonzero(~np.isnan(values))
+        samples = values[rows, columns]
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bucket = np.where(samples > 0, np.ceil(np.log(samples) / np.log(gamma)), 0).astype(np.int64)
+        bucket[samples <= 0] = ZERO_BUCKET
+        counts = pd.Series(np.ones(len(samples), dtype=np.int64)).groupby([rows, bucket]).sum()
+        series_rows = counts.index.get_level_values(0)
+        buckets = pd.Series(
+            counts.to_numpy(),
+            index=cls.bucket_index(index[series_rows], counts.index.get_level_values(1)),
+            name=count_column,
+        )
+        present = ~np.isnan(values).all(axis=1)
+        series = pd.DataFrame(
+            {
+                "min": np.nanmin(values[present], axis=1),
+                "max": np.nanmax(values[present], axis=1),
+            },
+            index=index[present],
+        )
+        series["limit"] = limits_requests.limit_value.reindex(series.index)
+        series["request"] = limits_requests.request_value.reindex(series.index)
+        resource = limits_requests.resource
+        return cls(resource=resource, relative_accuracy=relative_accuracy, buckets=buckets, series=series)
+
+    @staticmethod
+    def bucket_index(series_index: pd.Index, bucket: Iterable[int]) -> pd.MultiIndex:
+        """Series keys and bucket index."""
+        frame = series_index.to_frame(index=False)
+        frame[BUCKET_LEVEL] = np.asarray(bucket, dtype=np.int64)
+        return pd.MultiIndex.from_frame(frame)
+
+    def series_levels(self) -> List[str]:
+        return [n for n in self.buckets.index.names if n != BUCKET_LEVEL]
+
+    def bucket_values(self, bucket: np.ndarray) -> np.ndarray:
+        """Representative value of bucket, relative error to any value of bucket is at most relativeAccuracy."""
+        values = 2 * np.power(self.gamma, bucket.astype(np.float64)) / (self.gamma + 1)
+        return np.where(bucket == ZERO_BUCKET, 0.0, values)
+
+    @memoized
+    def percentiles_df(self, percentiles: Optional[List[float]] = None) -> pd.DataFrame:
+        """The same columns as `percentiles_df` of samples, percentiles have relative error relativeAccuracy."""
+        percentiles = PERCENTILES if percentiles is None else percentiles
+        levels = self.series_levels()
+        counts = self.buckets.to_numpy()
+        cumulative = np.cumsum(counts)
+        totals = self.buckets.groupby(level=levels, sort=False).sum()
+        # buckets are sorted by series, start is count of samples of previous series
+        starts = np.cumsum(totals.to_numpy()) - totals.to_numpy()
+        ranks = np.outer(totals.to_numpy() - 1, percentiles)
+        bucket = self.buckets.index.get_level_values(BUCKET_LEVEL).to_numpy()
+        series = self.series.reindex(totals.index)
+        minima, maxima = series["min"].to_numpy()[:, None], series["max"].to_numpy()[:, None]
+        # values of samples below and above rank, linearly interpolated as `describe`
+        below, above = [
+            np.clip(
+                self.bucket_values(bucket[np.searchsorted(cumulative, starts[:, None] + r, side="right")]),
+                minima,
+                maxima,
+            )
+            for r in [np.floor(ranks), np.ceil(ranks)]
+        ]
+        weights = ranks - np.floor(ranks)
+        quantiles = below + (above - below) * weights
+        # exact at both ends
+        quantiles = np.where(ranks == 0, minima, quantiles)
+        quantiles = np.where(ranks == (totals.to_numpy() - 1)[:, None], maxima, quantiles)
+        data = np.column_stack([totals.to_numpy().astype(np.float64), minima, quantiles, maxima])
+        return pd.DataFrame(data, index=totals.index, columns=[count_column] + scaled_columns)
+
+    def to_json(self, path: Path):
+        data = {
+            "resource": self.resource.name,
+            "relativeAccuracy": self.relativeAccuracy,
+            "buckets": json.loads(self.buckets.reset_index().to_json(orient="split", index=False)),
+            "series": json.loads(self.series.reset_index().to_json(orient="split", index=False)),
+        }
+        logger.info(f"Saving {self.resource.name} sketch of {len(self.series)} series to {path}")
+        path.write_text(json.dumps(data))
+
+    @classmethod
+    def from_json(cls, path: Path) -> ResourceSketch:
+        data = json.loads(path.read_text())
+        buckets = pd.DataFrame(**data["buckets"])
+        levels = [c for c in buckets.columns if c != count_column]
+        series = pd.DataFrame(**data["series"])
+        return cls(
+            resource=SKETCH_RESOURCES[data["resource"]],
+            relative_accuracy=data["relativeAccuracy"],
+            buckets=buckets.set_index(levels)[count_column].astype(np.int64),
+            series=series.set_index([c for c in series.columns if c not in SERIES_COLUMNS]),
+        )
+
+
+def merge_sketches(sketches: List[ResourceSketch]) -> ResourceSketch:
+    """Sketch of union of samples, limits and requests are max of merged series."""
+    if len(sketches) == 0:
+        raise ValueError("No sketches to merge")
+    first = sketches[0]
+    for sketch in sketches[1:]:
+        if sketch.resource.name != first.resource.name or sketch.relativeAccuracy != first.relativeAccuracy:
+            raise ValueError(
+                f"Cannot merge {sketch.resource.name} sketch with relative accuracy {sketch.relativeAccuracy} "
+                f"into {first.resource.name} sketch with relative accuracy {first.relativeAccuracy}"
+            )
+    buckets = pd.concat([s.buckets for s in sketches])
+    series = pd.concat([s.series for s in sketches])
+    levels = list(series.index.names)
+    return ResourceSketch(
+        resource=first.resource,
+        relative_accuracy=first.relativeAccuracy,
+        buckets=buckets.groupby(level=list(buckets.index.names)).sum(),
+        series=series.groupby(level=levels).agg({"min": "min", "max": "max", "limit": "max", "request": "max"}),
+    )
+
+
+class SketchLimitsRequests(BaseLimitsRequests):
+    """Replacement of LimitsRequests for SizingCalculator with percentiles and limits of a (merged) sketch."""
+
+    def __init__(self, sketch: ResourceSketch):
+        super().__init__(
+            resource=sketch.resource,
+            limit_value=sketch.series["limit"].rename(sketch.resource.limit),
+            request_value=sketch.series["request"].rename(sketch.resource.request),
+        )
+        self.sketch: ResourceSketch = sketch
+
+    def measured_samples(self) -> Tuple[np.ndarray, pd.Index]:
+        raise ValueError(f"{self.resource}: samples are not kept in sketch")
+
+    def measured_df_percentiles(self) -> pd.DataFrame:
+        """Return measured values percentiles."""
+        return self.sketch.percentiles_df()
+
+
+def sketch_path(folder: Path, resource: Resource) -> Path:
+    return Path(folder, f"{SKETCH_FILE_PREFIX}{resource.name}.json")
+
+
+def save_sketches(
+    cpu: BaseLimitsRequests, memory: BaseLimitsRequests, folder: Path
+) -> Tuple[ResourceSketch, ResourceSketch]:
+    """Save cpu and memory sketches to folder next to sizing reports."""
+    folder.mkdir(parents=True, exist_ok=True)
+    sketches = ResourceSketch.from_limits_requests(cpu), ResourceSketch.from_limits_requests(memory)
+    for sketch in sketches:
+        sketch.to_json(sketch_path(folder, sketch.resource))
+    return sketches
+
+
+def load_sketches(folders: List[Path]) -> Tuple[ResourceSketch, ResourceSketch]:
+    """Merge all cpu and memory sketches found in folders (recursively)."""
+    merged: List[ResourceSketch] = []
+    for resource in [CPU_RESOURCE, MEMORY_RESOURCE]:
+        file_name = sketch_path(Path(), resource).name
+        paths = [
+            p
+            for folder in folders
+            for p in list_files(folder, ends_with=file_name)
+            if MERGED_SKETCHES_FOLDER not in p.relative_to(folder).parts[:-1]
+        ]
+        logger.info(f"Merging {len(paths)} {resource.name} sketches")
+        merged.append(merge_sketches([ResourceSketch.from_json(p) for p in paths]))
+    cpu, memory = merged
+    return cpu, memory
+
+
+def sketch_calculator(cpu: ResourceSketch, memory: ResourceSketch) -> SizingCalculator:
+    """Sizing calculator of merged sketches."""
+    return SizingCalculator(cpu=SketchLimitsRequests(cpu), memory=SketchLimitsRequests(memory))
@@ -0,0 +1,129 @@
+"""Sizing from a stream of table batches instead of a data frame of the whole time range."""
+
+from __future__ import annotations
+
+from typing import Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from loguru import logger
+
+from metrics import NAMESPACE_COLUMN
+from prometheus.sla_model import SlaTable
+from sizing.calculator import BaseLimitsRequests, Resource, percentiles_df
+
+
+def padded(codes: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Unique codes and 2-D array with values of each code in a row padded with NaN."""
+    order = np.argsort(codes, kind="stable")
+    unique_codes, starts, counts = np.unique(codes[order], return_index=True, return_counts=True)
+    rows = np.repeat(np.arange(len(unique_codes)), counts)
+    columns = np.arange(len(codes)) - np.repeat(starts, counts)
+    array = np.full((len(unique_codes), counts.max(initial=0)), np.nan)
+    array[rows, columns] = values[order]
+    return unique_codes, array
+
+
+class StreamedLimitsRequests(BaseLimitsRequests):
+    """
+    Replacement of LimitsRequests for SizingCalculator consuming table batches one by one.
+
+    Limits and requests of each batch are reduced to min and max of each series. Measured samples are kept
+    only as series code and value (no key strings, no other columns); percentiles are computed by `finish`
+    with the same percentiles engine as LimitsRequests.
+    """
+
+    def __init__(self, sla_table: SlaTable, resource: Resource):
+        # finish() must be called to set limits and requests to non-empty
+        super().__init__(
+            resource=resource,
+            limit_value=pd.Series(dtype=float, name=resource.limit),
+            request_value=pd.Series(dtype=float, name=resource.request),
+        )
+        self.sla_table: SlaTable = sla_table
+        self.keys: List[str] = self.sla_table.tableKeys
+        # single namespace, the same index as LimitsRequests
+        self.seriesKeys: List[str] = [k for k in self.keys if k != NAMESPACE_COLUMN]
+        self.seriesCodes: dict[tuple, int] = {}
+        self.minima: List[pd.DataFrame] = []
+        self.maxima: List[pd.DataFrame] = []
+        self.measuredCodes: List[np.ndarray] = []
+        self.measuredValues: List[np.ndarray] = []
+        self.percentiles_df: pd.DataFrame = pd.DataFrame()
+        self.measuredArray: np.ndarray = np.empty((0, 0))
+        self.measuredIndex: pd.Index = pd.Index([])
+
+    def codes(self, batch: pd.DataFrame) -> np.ndarray:
+        """Code of series of each row, codes are stable across batches."""
+        codes, uniques = pd.MultiIndex.from_frame(batch[self.seriesKeys]).factorize(use_na_sentinel=False)
+        lookup = [self.seriesCodes.setdefault(key, len(self.seriesCodes)) for key in uniques]
+        return np.asarray(lookup, dtype=np.int32)[codes]
+
+    def add(self, batch: pd.DataFrame):
+        if batch.empty:
+            return
+        codes = self.codes(batch)
+        limits_requests = batch[[self.resource.limit, self.resource.request]].groupby(codes)
+        self.minima.append(limits_requests.min())
+        self.maxima.append(limits_requests.max())
+        values = batch[self.resource.measured].to_numpy(dtype=np.float64, na_value=np.nan)
+        present = ~np.isnan(values)
+        self.measuredCodes.append(codes[present])
+        self.measuredValues.append(values[present])
+
+    def series_index(self, codes: pd.Index) -> pd.Index:
+        keys = list(self.seriesCodes)
+        if len(self.seriesKeys) == 1:
+            return pd.Index([keys[c][0] for c in codes], name=self.seriesKeys[0])
+        return pd.MultiIndex.from_tuples([keys[c] for c in codes], names=self.seriesKeys)
+
+    def by_series(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Series codes replaced by keys, sorted as unstacked LimitsRequests."""
+        return df.set_axis(self.series_index(df.index), axis=0).sort_index()
+
+    def finish(self):
+        """Merge batches, verify limits and requests and compute percentiles."""
+        if not self.minima:
+            logger.info(f"{self.resource}: no rows")
+            return
+        minima = self.by_series(pd.concat(self.minima).groupby(level=0).min())
+        maxima = self.by_series(pd.concat(self.maxima).groupby(level=0).max())
+        for column in [self.resource.limit, self.resource.request]:
+            # positive numbers with min == max, do not mix different sizings
+            assert minima[column].equals(maxima[column])
+        self.limit_value = maxima[self.resource.limit]
+        self.request_value = maxima[self.resource.request]
+        measured = np.concatenate(self.measuredValues)
+        codes, values = padded(np.concatenate(self.measuredCodes), measured)
+        # rows in the order of series keys
+        index = self.series_index(pd.Index(codes))
+        order = index.argsort()
+        self.measuredArray, self.measuredIndex = values[order], index[order]
+        self.percentiles_df = percentiles_df(self.measuredArray, index=self.measuredIndex)
+        logger.info(f"{self.resource}: {len(self.seriesCodes)} series, {len(measured)} samples")
+        self.minima, self.maxima, self.measuredCodes, self.measuredValues = [], [], [], []
+
+    def measured_samples(self) -> Tuple[np.ndarray, pd.Index]:
+        return self.measuredArray, self.measuredIndex
+
+    def measured_df_percentiles(self) -> pd.DataFrame:
+        """Return measured values percentiles."""
+        return self.percentiles_df
+
+
+def streamed_limits_requests(
+    batches: Iterable[pd.DataFrame], sla_table: SlaTable, resources: List[Resource]
+) -> List[StreamedLimitsRequests]:
+    """LimitsRequests of each resource from a single pass over the batches."""
+    limits_requests = [StreamedLimitsRequests(sla_table=sla_table, resource=resource) for resource in resources]
+    rows = 0
+    for batch in batches:
+        rows = rows + len(batch)
+        for limits_request in limits_requests:
+            limits_request.add(batch)
+    if rows == 0:
+        raise ValueError(f"No data for {sla_table.tableName}")
+    for limits_request in limits_requests:
+        limits_request.finish()
+    return limits_requests
@@ -0,0 +1,218 @@
+"""
+SLA tables as local Parquet datasets.
+
+Table `<folder>/<dbSchema>/<tableName>` is hive partitioned by UTC date of TIMESTAMP (DAY=2024-01-31)
+and by NAMESPACE when it is a table key (NAMESPACE=ns). Every write adds new files, reads prune partitions
+and filter row groups by the time range and namespace (predicate pushdown).
+"""
+
+from __future__ import annotations
+
+import uuid
+
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from loguru import logger
+
+from metrics import NAMESPACE_COLUMN, TIMESTAMP_COLUMN
+from metrics.collector import TimeRange
+from prometheus.sla_model import SlaTable
+from settings import settings
+from storage.snowflake.dataframe import utc_timestamps
+from storage.table_store import TableStore
+
+
+DAY_PARTITION = "DAY"
+DAY_FORMAT = "%Y-%m-%d"
+
+
+class SeenRows:
+    """
+    Hashes of unique keys of rows already streamed (8 bytes per row), drops repeated rows of later batches.
+
+    Hashes are kept in sorted levels of decreasing size, a new level is merged with smaller ones only
+    (like a binary counter), the history is not sorted again for each batch.
+    """
+
+    def __init__(self, keys: list[str]):
+        self.keys: list[str] = keys
+        self.levels: list[np.ndarray] = []
+
+    def seen(self, hashes: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(hashes), dtype=bool)
+        for level in self.levels:
+            position = np.minimum(np.searchsorted(level, hashes), len(level) - 1)
+            found |= level[position] == hashes
+        return found
+
+    def add(self, hashes: np.ndarray):
+        """Add sorted unique hashes not seen yet."""
+        while self.levels and len(self.levels[-1]) <= 2 * len(hashes):
+            hashes = np.sort(np.concatenate([self.levels.pop(), hashes]))
+        self.levels.append(hashes)
+
+    def new_rows(self, df: pd.DataFrame) -> pd.DataFrame:
+        hashes = pd.util.hash_pandas_object(df[self.keys] if self.keys else df, index=False).to_numpy()
+        # first occurrence in the batch, not seen in previous batches
+        unique, first = np.unique(hashes, return_index=True)
+        new = ~self.seen(unique)
+        if new.any():
+            self.add(unique[new])
+        return df.iloc[np.sort(first[new])].reset_index(drop=True)
+
+
+class ParquetTableStore(TableStore):
+    def __init__(self, folder: Path):
+        self.folder: Path = folder
+
+    def __str__(self):
+        return f"parquet {self.folder}"
+
+    def table_path(self, sla_table: SlaTable) -> Path:
+        return Path(self.folder, sla_table.dbSchema, sla_table.tableName)
+
+    @staticmethod
+    def partitioning(sla_table: SlaTable) -> ds.Partitioning:
+        """DAY and NAMESPACE as strings, no type inference (e.g. numeric namespace)."""
+        keys = [DAY_PARTITION] + ([NAMESPACE_COLUMN] if NAMESPACE_COLUMN in sla_table.tableKeys else [])
+        return ds.partitioning(pa.schema([(k, pa.string()) for k in keys]), flavor="hive")
+
+    def write_df(self, df: pd.DataFrame, sla_table: SlaTable):
+        if df.empty:
+            return
+        df = df.assign(**{TIMESTAMP_COLUMN: utc_timestamps(df[TIMESTAMP_COLUMN])})
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # naive cast keeps UTC wall time
+        day = pc.strftime(table[TIMESTAMP_COLUMN].cast(pa.timestamp("ns")), format=DAY_FORMAT)
+        path = self.table_path(sla_table)
+        logger.info(f"Writing {df.shape} to {path}")
+        ds.write_dataset(
+            table.append_column(DAY_PARTITION, day),
+            base_dir=path,
+            format="parquet",
+            partitioning=self.partitioning(sla_table),
+            # files are only added, unique name for each write
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        )
+
+    def dataset(self, sla_table: SlaTable) -> Optional[ds.Dataset]:
+        path = self.table_path(sla_table)
+        if not path.is_dir():
+            return None
+        return ds.dataset(path, format="parquet", partitioning=self.partitioning(sla_table))
+
+    @staticmethod
+    def namespace_filter(sla_table: SlaTable, namespace: Optional[str]) -> Optional[ds.Expression]:
+        if namespace is None or NAMESPACE_COLUMN not in sla_table.tableKeys:
+            return None
+        return ds.field(NAMESPACE_COLUMN) == namespace
+
+    @staticmethod
+    def empty_df(sla_table: SlaTable, columns: Optional[list[str]] = None) -> pd.DataFrame:
+        all_columns = [TIMESTAMP_COLUMN] + sla_table.tableKeys + [q.columnName for q in sla_table.queries]
+        return pd.DataFrame(columns=columns if columns else all_columns)
+
+    def range_dataset(
+        self, sla_table: SlaTable, time_range: TimeRange, namespace: Optional[str]
+    ) -> tuple[Optional[ds.Dataset], Optional[ds.Expression]]:
+        """Dataset of files in time range with schema of all files and row filter, None when no file matches."""
+        dataset = self.dataset(sla_table)
+        if dataset is None:
+            logger.info(f"No table {self.table_path(sla_table)}")
+            return None, None
+        from_time, to_time = time_range.from_time.tz_convert("UTC"), time_range.to_time.tz_convert("UTC")
+        expression: ds.Expression = (
+            (ds.field(DAY_PARTITION) >= from_time.strftime(DAY_FORMAT))
+            & (ds.field(DAY_PARTITION) <= to_time.strftime(DAY_FORMAT))
+            & (ds.field(TIMESTAMP_COLUMN) >= pa.scalar(from_time))
+            & (ds.field(TIMESTAMP_COLUMN) <= pa.scalar(to_time))
+        )
+        namespace_filter = self.namespace_filter(sla_table, namespace)
+        if namespace_filter is not None:
+            expression = expression & namespace_filter
+        fragments = list(dataset.get_fragments(filter=expression))
+        logger.info(f"Parquet table: {self.table_path(sla_table)}, {time_range}, {len(fragments)} files")
+        if not fragments:
+            return None, expression
+        # columns may be added to SLA table over time, dataset schema is taken from the first file only
+        schema = pa.unify_schemas([dataset.schema] + [f.physical_schema for f in fragments])
+        return dataset.replace_schema(schema), expression
+
+    def read_columns(self, sla_table: SlaTable, columns: Optional[list[str]]) -> Optional[list[str]]:
+        """Unique keys are needed for deduplication even when not projected."""
+        return columns + [k for k in self.unique_keys(sla_table) if k not in columns] if columns else None
+
+    @staticmethod
+    def ordered_df(data: pa.Table | pa.RecordBatch, sla_table: SlaTable) -> pd.DataFrame:
+        df: pd.DataFrame = data.to_pandas()
+        # partition columns are last, restore TIMESTAMP, table keys, metrics order
+        keys = [TIMESTAMP_COLUMN] + [k for k in sla_table.tableKeys if k in df.columns]
+        return df[keys + [c for c in df.columns if c not in keys and c != DAY_PARTITION]]
+
+    def read_range(
+        self,
+        sla_table: SlaTable,
+        time_range: TimeRange,
+        namespace: Optional[str] = None,
+        columns: Optional[list[str]] = None,
+    ) -> pd.DataFrame:
+        dataset, expression = self.range_dataset(sla_table=sla_table, time_range=time_range, namespace=namespace)
+        if dataset is None:
+            return self.empty_df(sla_table, columns=columns)
+        table = dataset.to_table(columns=self.read_columns(sla_table, columns), filter=expression)
+        unique_keys = self.unique_keys(sla_table)
+        df: pd.DataFrame = self.ordered_df(table, sla_table=sla_table)
+        # failed incremental loads may write the same rows again
+        df = df.drop_duplicates(subset=unique_keys if unique_keys else None, ignore_index=True)
+        return df[columns] if columns else df
+
+    def read_batches(
+        self,
+        sla_table: SlaTable,
+        time_range: TimeRange,
+        namespace: Optional[str] = None,
+        columns: Optional[list[str]] = None,
+        batch_rows: int = settings.table_batch_rows,
+    ) -> Iterator[pd.DataFrame]:
+        dataset, expression = self.range_dataset(sla_table=sla_table, time_range=time_range, namespace=namespace)
+        if dataset is None:
+            return
+        unique_keys = self.unique_keys(sla_table)
+        seen_rows = SeenRows(keys=unique_keys) if unique_keys else None
+        batches = dataset.to_batches(
+            columns=self.read_columns(sla_table, columns), filter=expression, batch_size=batch_rows
+        )
+        for batch in batches:
+            if batch.num_rows == 0:
+                continue
+            df: pd.DataFrame = self.ordered_df(batch, sla_table=sla_table)
+            if seen_rows is not None:
+                df = seen_rows.new_rows(df)
+            if df.empty:
+                continue
+            yield df[columns] if columns else df
+
+    def last_timestamps(self, sla_table: SlaTable, namespace: Optional[str]) -> dict[Optional[str], pd.Timestamp]:
+        dataset = self.dataset(sla_table)
+        if dataset is None:
+            logger.info(f"No last update of {sla_table.tableName}: {self.table_path(sla_table)} does not exist")
+            return {}
+        by_namespace = NAMESPACE_COLUMN in sla_table.tableKeys
+        columns = [TIMESTAMP_COLUMN] + ([NAMESPACE_COLUMN] if by_namespace else [])
+        table = dataset.to_table(columns=columns, filter=self.namespace_filter(sla_table, namespace))
+        if table.num_rows == 0:
+            return {}
+        if not by_namespace:
+            return {None: pd.Timestamp(pc.max(table[TIMESTAMP_COLUMN]).as_py()).tz_convert("UTC")}
+        max_df = table.group_by(NAMESPACE_COLUMN).aggregate([(TIMESTAMP_COLUMN, "max")]).to_pandas()
+        max_timestamps = utc_timestamps(max_df[f"{TIMESTAMP_COLUMN}_max"])
+        return dict(zip(max_df[NAMESPACE_COLUMN], max_timestamps))
@@ -39,11 +39,22 @@ def get_df(query: str, con: SnowflakeConnection, dedup: bool = True) -> pd.DataF
 
 
 def add_tz(series: pd.Series, tz: str = GMT_TZ) -> pd.Series:
-    return series.apply(lambda x: pd.Timestamp(x, tz=tz))
+    """Naive timestamps (or strings) in tz, TypeError for timestamps with tz."""
+    return pd.to_datetime(series).dt.tz_localize(tz=tz)
 
 
 def localize_series_timezone(series: pd.Series, tz: pytz.tzinfo = pytz.UTC) -> pd.Series:
-    return series.apply(lambda x: x.tz_localize(tz=tz))
+    """Naive timestamps in tz, TypeError for timestamps with tz."""
+    return pd.to_datetime(series).dt.tz_localize(tz=tz)
+
+
+def utc_timestamps(series: pd.Series) -> pd.Series:
+    try:
+        return series.dt.tz_convert(tz="UTC")
+    except TypeError:
+        # Older version of snowflake pandas
+        # TypeError: Cannot convert tz-naive timestamps, use tz_localize to localize
+        return series.dt.tz_localize(tz="UTC")
 
 
 def get_jobs_df(query: str, con: SnowflakeConnection) -> pd.DataFrame:
@@ -51,8 +62,7 @@ def get_jobs_df(query: str, con: SnowflakeConnection) -> pd.DataFrame:
     (maybe changed behaviour of pandas connector in v 3.0.1)
     """
     job_df = get_df(query=query, con=con)
-    time_stamp_ser = localize_series_timezone(job_df[TIMESTAMP_KEY])
-    job_df[TIMESTAMP_KEY] = time_stamp_ser
+    job_df[TIMESTAMP_KEY] = localize_series_timezone(job_df[TIMESTAMP_KEY])
     return job_df
 
 
@@ -78,8 +88,8 @@ def localize_to_gmt(df: DataFrame) -> DataFrame:
 
 
 def round_from_to_times(df: DataFrame) -> DataFrame:
-    df[FROM_TIME_ALIAS] = df[FROM_TIME_ALIAS].apply(lambda x: x.floor("S"))
-    df[TO_TIME_ALIAS] = df[TO_TIME_ALIAS].apply(lambda x: x.ceil("S"))
+    df[FROM_TIME_ALIAS] = pd.to_datetime(df[FROM_TIME_ALIAS]).dt.floor("s")
+    df[TO_TIME_ALIAS] = pd.to_datetime(df[TO_TIME_ALIAS]).dt.ceil("s")
     return df
 
 
@@ -1,6 +1,11 @@
 from __future__ import annotations
 
 import os
+import threading
+import uuid
+
+from contextlib import contextmanager
+from typing import ClassVar, Iterator, Optional
 
 import snowflake.connector
 
@@ -13,8 +18,9 @@ from snowflake.sqlalchemy import URL
 from sqlalchemy import create_engine
 from sqlalchemy.engine import Engine
 
+from settings import settings
 from storage.snowflake import DEFAULT_SCHEMA
-from storage.snowflake.queries import q_from_to_by_uuid
+from storage.snowflake.queries import q_from_to_by_uuid, q_merge
 
 
 class SnowflakeEngine:
@@ -29,16 +35,33 @@ class SnowflakeEngine:
 
     def __init__(self, schema: str = DEFAULT_SCHEMA):
         self.schema = schema
-        self.sf_engine: Engine = self.create_sf_engine()
         self.connection: SnowflakeConnection = self.create_con()
+        # SQLAlchemy engines are bound to schema of their URL
+        self.sfEngines: dict[str, Engine] = {}
 
     def __str__(self):
         return f"account {self.ACCOUNT}, schema {self.DATABASE}.{self.schema}"
 
+    @property
+    def sf_engine(self) -> Engine:
+        """SQLAlchemy engine of the current schema (see use_schema) created on first use."""
+        if self.schema not in self.sfEngines:
+            self.sfEngines[self.schema] = self.create_sf_engine()
+        return self.sfEngines[self.schema]
+
     def close(self):
         logger.info("Closing sf engine")
         self.connection.close()
-        self.sf_engine.dispose()
+        for sf_engine in self.sfEngines.values():
+            sf_engine.dispose()
+        self.sfEngines = {}
+
+    def use_schema(self, schema: str):
+        """Switch schema of the connection (unqualified table names)."""
+        if schema == self.schema:
+            return
+        self.connection.cursor().execute(f"USE SCHEMA {self.DATABASE}.{schema}")
+        self.schema = schema
 
     # 'snowflake://<user_login_name>:<password>@<account_identifier>/<database_name>/<schema_name>?warehouse=<warehouse_name>&role=<role_name>'
     def create_sf_engine(self) -> Engine:
@@ -79,6 +102,45 @@ class SnowflakeEngine:
         )
         logger.info(f"Success: {success}, chunks: {n_chunks}, rows: {n_rows}")
 
+    def merge_df(
+        self,
+        df: DataFrame,
+        table: str,
+        keys: list[str],
+        chunk_rows: int = settings.sf_stage_chunk_rows,
+        parallel: int = settings.sf_stage_parallel,
+    ):
+        """
+        Idempotent write: rows of df replace the rows of table with the same keys, other rows are inserted.
+        df is staged to a temporary table (compressed Parquet files of chunk_rows rows uploaded by parallel
+        threads) and merged, the table is created like the staged one when it does not exist.
+        """
+        # source rows must be unique, MERGE of several source rows into one target row is nondeterministic
+        df = df.drop_duplicates(subset=keys, keep="last")
+        stage = f"{table}_STAGE_{uuid.uuid4().hex[:8]}".upper()
+        logger.info(f"Merging {len(df)} rows to table : {self.DATABASE}.{self.schema}.{table.upper()} on {keys}")
+        success, n_chunks, n_rows, _ = write_pandas(
+            conn=self.connection,
+            df=df,
+            table_name=stage,
+            database=self.DATABASE,
+            schema=self.schema,
+            chunk_size=chunk_rows,
+            compression="snappy",
+            parallel=parallel,
+            auto_create_table=True,
+            table_type="temporary",
+            use_logical_type=True,
+        )
+        logger.info(f"Staged to {stage}, success: {success}, chunks: {n_chunks}, rows: {n_rows}")
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} LIKE {stage}")
+            cursor.execute(q_merge(target_table=table, source_table=stage, keys=keys, columns=list(df.columns)))
+            logger.info(f"Merged rows: {cursor.rowcount}")
+        finally:
+            cursor.execute(f"DROP TABLE IF EXISTS {stage}")
+
     def fetch_df(self, query: str) -> DataFrame:
         cursor: SnowflakeCursor | None = self.connection.cursor().execute(query)
         if cursor:
@@ -87,6 +149,16 @@ class SnowflakeEngine:
         else:
             raise ValueError(f"Cursor is None for query: {query}")
 
+    def fetch_batches(self, query: str) -> Iterator[DataFrame]:
+        """
+        Query is executed now (in the current schema), result as data frames of the Arrow result chunks.
+        Chunks are downloaded on iteration by the own cursor, the session does not need to be borrowed.
+        """
+        cursor: SnowflakeCursor | None = self.connection.cursor().execute(query)
+        if cursor is None:
+            raise ValueError(f"Cursor is None for query: {query}")
+        return (table.to_pandas() for table in cursor.fetch_arrow_batches())
+
     def from_to_by_uuid_df(self, timestamp_field: str, table_name: str) -> DataFrame:
         """
         Generate list of tests from data table instead from list table.
@@ -99,3 +171,33 @@ class SnowflakeEngine:
     def all_df(self, table_name: str) -> DataFrame:
         q = f"SELECT * FROM {table_name}"
         return self.fetch_df(query=q)
+
+
+class SnowflakeSession:
+    """
+    Process wide SnowflakeEngine shared by all storage calls, login happens once per process.
+    Callers borrow the engine switched to their schema, calls are serialized (schema is session state).
+    The lock is held while the engine is borrowed: results must not be consumed lazily inside of `with`,
+    streamed results are taken from fetch_batches inside and iterated outside (see read_batches).
+    Commands close the session once at the end.
+    """
+
+    sfEngine: ClassVar[Optional[SnowflakeEngine]] = None
+    lock: ClassVar[threading.RLock] = threading.RLock()
+
+    @classmethod
+    @contextmanager
+    def engine(cls, schema: str = DEFAULT_SCHEMA) -> Iterator[SnowflakeEngine]:
+        with cls.lock:
+            if cls.sfEngine is None:
+                cls.sfEngine = SnowflakeEngine(schema=schema)
+            else:
+                cls.sfEngine.use_schema(schema)
+            yield cls.sfEngine
+
+    @classmethod
+    def close(cls):
+        with cls.lock:
+            if cls.sfEngine is not None:
+                cls.sfEngine.close()
+                cls.sfEngine = None
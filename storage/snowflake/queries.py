@@ -2,6 +2,9 @@ from __future__ import annotations
 
 from typing import Optional
 
+import pandas as pd
+
+from metrics import NAMESPACE_COLUMN, TIMESTAMP_COLUMN
 from storage.snowflake import EVENT_MMM_BUILD_VERSION_KEY, FROM_TIME_ALIAS, TEST_ENV_KEY, TO_TIME_ALIAS, UUID_COLUMN
 
 
@@ -34,6 +37,74 @@ def q_from_to(
     return q
 
 
+def last_update_query(
+    table_name: str,
+    column_name: str,
+    namespace: Optional[str],
+    timestamp_field: str = TIMESTAMP_COLUMN,
+    by_namespace: bool = False,
+):
+    """
+    Select max timestamp from table with table_name as column_name
+    :param table_name: table to search for max timestamp
+    :param column_name: name of the column to return
+    :param timestamp_field: name of the timestamp field
+    :param namespace:  optional namespace filter
+    :param by_namespace: max timestamp for each namespace
+    :return: SQL query
+    """
+    select = f"{NAMESPACE_COLUMN}, " if by_namespace else ""
+    q = f"SELECT {select}max({timestamp_field}) as {column_name} FROM {table_name}"
+    if namespace is not None:
+        q = q + f" WHERE {NAMESPACE_COLUMN}='{namespace}'"
+    if by_namespace:
+        q = q + f" GROUP BY {NAMESPACE_COLUMN}"
+    return q
+
+
+def q_time_range(
+    table_name: str,
+    from_time: pd.Timestamp,
+    to_time: pd.Timestamp,
+    timestamp_field: str = TIMESTAMP_COLUMN,
+    namespace: Optional[str] = None,
+    columns: Optional[list[str]] = None,
+    unique_keys: Optional[list[str]] = None,
+) -> str:
+    """
+    Query time range including bounds
+    :param namespace: optional namespace filter
+    :param columns: optional projection, all columns by default
+    :param unique_keys: optional deduplication, single (arbitrary) row for each combination of key values
+    """
+    select = ", ".join(f'"{c}"' for c in columns) if columns else "*"
+    lower_bound = f""""{timestamp_field}" >= '{from_time}'"""
+    upper_bound = f""""{timestamp_field}" <= '{to_time}'"""
+    q = f"SELECT {select} FROM {table_name} WHERE {lower_bound} AND {upper_bound}"
+    if namespace is not None:
+        q = q + f" AND {NAMESPACE_COLUMN}='{namespace}'"
+    if unique_keys:
+        partition = ", ".join(f'"{k}"' for k in unique_keys)
+        q = q + f' QUALIFY ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY "{timestamp_field}") = 1'
+    return q
+
+
+def q_merge(target_table: str, source_table: str, keys: list[str], columns: list[str]) -> str:
+    """
+    Upsert source rows into target table, rows are matched on keys, values of other columns are updated
+    Keys are compared by EQUAL_NULL, NULL keys (e.g. missing labels) match NULL
+    :param columns: all columns of source table including keys
+    """
+    on = " AND ".join(f'EQUAL_NULL(t."{k}", s."{k}")' for k in keys)
+    update = ", ".join(f't."{c}" = s."{c}"' for c in columns if c not in keys)
+    insert = ", ".join(f'"{c}"' for c in columns)
+    values = ", ".join(f's."{c}"' for c in columns)
+    q = f"MERGE INTO {target_table} t USING {source_table} s ON {on}"
+    if update:
+        q = q + f" WHEN MATCHED THEN UPDATE SET {update}"
+    return q + f" WHEN NOT MATCHED THEN INSERT ({insert}) VALUES ({values})"
+
+
 def q_uuid(uuid: str, table_name: str) -> str:
     q = f"SELECT * FROM {table_name} WHERE UUID='{uuid}'"
     return q
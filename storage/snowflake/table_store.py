@@ -0,0 +1,107 @@
+"""SLA tables in Snowflake."""
+
+from __future__ import annotations
+
+from enum import StrEnum
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from loguru import logger
+from snowflake.connector.errors import ProgrammingError
+
+from metrics import NAMESPACE_COLUMN
+from metrics.collector import TimeRange
+from prometheus.sla_model import SlaTable
+from settings import settings
+from storage.snowflake import dataframe
+from storage.snowflake.dataframe import utc_timestamps
+from storage.snowflake.engine import SnowflakeEngine, SnowflakeSession
+from storage.snowflake.queries import last_update_query, q_time_range
+from storage.table_store import TableStore
+
+
+class WriteMode(StrEnum):
+    MERGE: str = "merge"
+    APPEND: str = "append"
+
+
+class SnowflakeTableStore(TableStore):
+    """Table `tableName` in schema `dbSchema` of SnowflakeEngine.DATABASE, connection of SnowflakeSession."""
+
+    def __str__(self):
+        return f"snowflake {SnowflakeEngine.DATABASE}"
+
+    def write_df(self, df: pd.DataFrame, sla_table: SlaTable):
+        """Append, in merge mode tables with unique keys are merged on them (re-runs do not duplicate rows)."""
+        unique_keys = self.unique_keys(sla_table)
+        with SnowflakeSession.engine(schema=sla_table.dbSchema) as sf:
+            if unique_keys and WriteMode(settings.sf_write_mode) == WriteMode.MERGE:
+                sf.merge_df(df=df, table=sla_table.tableName, keys=unique_keys)
+                return
+            # use lower case for SF table name - even if it appears in upper case in Database view
+            # UserWarning: The provided table name ... is not found exactly as such in the database after writing
+            # the table, possibly due to case sensitivity issues. Consider using lower case table names
+            sf.write_df(df=df, table=sla_table.tableName)
+
+    def range_query(
+        self, sla_table: SlaTable, time_range: TimeRange, namespace: Optional[str], columns: Optional[list[str]]
+    ) -> str:
+        q = q_time_range(
+            table_name=sla_table.tableName,
+            from_time=time_range.from_time,
+            to_time=time_range.to_time,
+            namespace=namespace if NAMESPACE_COLUMN in sla_table.tableKeys else None,
+            columns=columns,
+            unique_keys=self.unique_keys(sla_table),
+        )
+        logger.info(f"Snowflake table: {sla_table.dbSchema}.{sla_table.tableName}, {time_range}")
+        logger.debug(f"Query: {q}")
+        return q
+
+    def read_range(
+        self,
+        sla_table: SlaTable,
+        time_range: TimeRange,
+        namespace: Optional[str] = None,
+        columns: Optional[list[str]] = None,
+    ) -> pd.DataFrame:
+        q = self.range_query(sla_table=sla_table, time_range=time_range, namespace=namespace, columns=columns)
+        with SnowflakeSession.engine(schema=sla_table.dbSchema) as sf:
+            # rows are unique by QUALIFY, whole row dedup in pandas only for tables without keys
+            return dataframe.get_df(query=q, con=sf.connection, dedup=not self.unique_keys(sla_table))
+
+    def read_batches(
+        self,
+        sla_table: SlaTable,
+        time_range: TimeRange,
+        namespace: Optional[str] = None,
+        columns: Optional[list[str]] = None,
+        batch_rows: int = settings.table_batch_rows,
+    ) -> Iterator[pd.DataFrame]:
+        q = self.range_query(sla_table=sla_table, time_range=time_range, namespace=namespace, columns=columns)
+        with SnowflakeSession.engine(schema=sla_table.dbSchema) as sf:
+            batches = sf.fetch_batches(query=q)
+        # chunks are downloaded without holding the session, other threads can query meanwhile
+        yield from batches
+
+    def last_timestamps(self, sla_table: SlaTable, namespace: Optional[str]) -> dict[Optional[str], pd.Timestamp]:
+        by_namespace = NAMESPACE_COLUMN in sla_table.tableKeys
+        column_name = "MAX_TIMESTAMP"
+        q = last_update_query(
+            table_name=sla_table.tableName,
+            column_name=column_name,
+            namespace=namespace if by_namespace else None,
+            by_namespace=by_namespace,
+        )
+        try:
+            with SnowflakeSession.engine(schema=sla_table.dbSchema) as sf:
+                logger.debug(f"Query: {q}")
+                df: pd.DataFrame = dataframe.get_df(query=q, con=sf.connection)
+        except ProgrammingError as e:
+            logger.info(f"No last update of {sla_table.tableName}: {e.msg}")
+            return {}
+        df = df.dropna(subset=[column_name])
+        max_timestamps: pd.Series = utc_timestamps(df[column_name])
+        keys = df[NAMESPACE_COLUMN] if by_namespace else [None] * len(df)
+        return dict(zip(keys, max_timestamps))
@@ -0,0 +1,192 @@
+"""Local cache of SLA tables partitioned by table, namespace and UTC hour."""
+
+from __future__ import annotations
+
+import hashlib
+
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pytz
+
+from loguru import logger
+
+from metrics import MIBS, TIMESTAMP_COLUMN
+from metrics.collector import TimeRange
+from prometheus.sla_model import SlaTable
+from settings import settings
+from shared.disk_cache import DiskCache
+from shared.snapshot import load_snapshot, save_snapshot
+from storage.snowflake.dataframe import utc_timestamps
+from storage.table_store import TableStore
+
+
+HOUR = pd.Timedelta(hours=1)
+ALL_NAMESPACES = "_all"
+ALL_COLUMNS = "all"
+
+
+class TableCache:
+    """
+    Rows of read_range of table store cached as Arrow files `<schema>/<table>/<namespace>/<hour>/<columns>.arrow`.
+
+    Time range is assembled from cached hours, each run of consecutive missing hours is read by a single query
+    and stored when the hour is in the past. Reads of all columns are stored as `all.arrow` and serve any
+    projection (only requested columns are loaded), projections are stored under the hash of their columns.
+    Writes of the table must invalidate the hours they change (see prom_save).
+    """
+
+    def __init__(self, folder: Path = settings.table_cache_folder, max_mb: float = settings.table_cache_max_mb):
+        self.diskCache: DiskCache = DiskCache(folder=folder, max_bytes=int(max_mb * MIBS))
+
+    def __format__(self, format_spec=""):
+        return f"table cache: {self.diskCache.folder}"
+
+    @staticmethod
+    def hours(time_range: TimeRange) -> list[pd.Timestamp]:
+        """UTC hours overlapping time range."""
+        from_hour = time_range.from_time.tz_convert(pytz.UTC).floor("h")
+        return list(pd.date_range(from_hour, time_range.to_time.tz_convert(pytz.UTC), freq="h"))
+
+    @staticmethod
+    def table_prefix(sla_table: SlaTable) -> str:
+        return f"{sla_table.dbSchema}/{sla_table.tableName}"
+
+    def name(self, sla_table: SlaTable, namespace: Optional[str], hour: pd.Timestamp) -> str:
+        """Folder of the hour, all cached projections of the hour are invalidated together."""
+        return f"{self.table_prefix(sla_table)}/{namespace or ALL_NAMESPACES}/{int(hour.timestamp())}"
+
+    @staticmethod
+    def read_columns(columns: Optional[list[str]]) -> Optional[list[str]]:
+        """TIMESTAMP is needed to split rows to hours."""
+        return [TIMESTAMP_COLUMN] + [c for c in columns if c != TIMESTAMP_COLUMN] if columns else None
+
+    @staticmethod
+    def file_name(columns: Optional[list[str]]) -> str:
+        if not columns:
+            return f"{ALL_COLUMNS}.arrow"
+        return f"{hashlib.sha256(','.join(sorted(columns)).encode('utf-8')).hexdigest()[:16]}.arrow"
+
+    def load(self, name: str, columns: Optional[list[str]]) -> Optional[pd.DataFrame]:
+        path = self.diskCache.get_path(name)
+        if path is None:
+            return None
+        try:
+            return load_snapshot(path, columns=columns)
+        except FileNotFoundError:
+            # evicted by another thread in the meantime
+            return None
+        except KeyError:
+            # columns added to the table after the hour was cached
+            return None
+
+    def get(
+        self, sla_table: SlaTable, namespace: Optional[str], hour: pd.Timestamp, columns: Optional[list[str]] = None
+    ) -> Optional[pd.DataFrame]:
+        """Rows of the hour from the file of all columns or of the same projection."""
+        name = self.name(sla_table=sla_table, namespace=namespace, hour=hour)
+        columns = self.read_columns(columns)
+        df = self.load(f"{name}/{self.file_name(None)}", columns=columns)
+        if df is None and columns:
+            df = self.load(f"{name}/{self.file_name(columns)}", columns=None)
+        return df
+
+    def put(
+        self,
+        sla_table: SlaTable,
+        namespace: Optional[str],
+        hour: pd.Timestamp,
+        df: pd.DataFrame,
+        columns: Optional[list[str]] = None,
+    ) -> bool:
+        """Store rows (all columns or projection) of the hour when the hour is over. Return True when stored."""
+        if hour + HOUR > pd.Timestamp.now(tz=pytz.UTC):
+            return False
+        name = f"{self.name(sla_table=sla_table, namespace=namespace, hour=hour)}/{self.file_name(columns)}"
+        self.diskCache.store(name=name, writer=lambda p: save_snapshot(df=df, path=p, compression="lz4"))
+        return True
+
+    def invalidate(self, sla_table: SlaTable, hours: Optional[list[pd.Timestamp]] = None):
+        """Remove hours (all namespaces) of table, whole table by default."""
+        if hours is None:
+            self.diskCache.invalidate(prefix=self.table_prefix(sla_table))
+            return
+        table_folder = self.diskCache.path(self.table_prefix(sla_table))
+        if not table_folder.is_dir():
+            return
+        for namespace_folder in table_folder.iterdir():
+            for hour in hours:
+                name = self.name(sla_table=sla_table, namespace=namespace_folder.name, hour=hour)
+                self.diskCache.invalidate(prefix=name)
+
+    def invalidate_df(self, sla_table: SlaTable, df: pd.DataFrame):
+        """Remove hours containing rows of df."""
+        if df.empty:
+            return
+        hours = utc_timestamps(df[TIMESTAMP_COLUMN]).dt.floor("h").unique()
+        self.invalidate(sla_table=sla_table, hours=list(hours))
+
+    @staticmethod
+    def runs(hours: list[pd.Timestamp]) -> list[list[pd.Timestamp]]:
+        """Sorted hours split to runs of consecutive hours."""
+        ret: list[list[pd.Timestamp]] = []
+        for hour in hours:
+            if ret and ret[-1][-1] + HOUR == hour:
+                ret[-1].append(hour)
+            else:
+                ret.append([hour])
+        return ret
+
+    def fetch(
+        self,
+        store: TableStore,
+        sla_table: SlaTable,
+        namespace: Optional[str],
+        hours: list[pd.Timestamp],
+        columns: Optional[list[str]] = None,
+    ) -> list[pd.DataFrame]:
+        """Single read of each run of consecutive hours (cached hours between runs are not read), hours are cached."""
+        columns = self.read_columns(columns)
+        ret: list[pd.DataFrame] = []
+        for run in self.runs(hours):
+            time_range = TimeRange.from_timestamps(from_time=run[0], to_time=run[-1] + HOUR - pd.Timedelta(1, "ns"))
+            df: pd.DataFrame = store.read_range(
+                sla_table=sla_table, time_range=time_range, namespace=namespace, columns=columns
+            )
+            df = df.assign(**{TIMESTAMP_COLUMN: utc_timestamps(df[TIMESTAMP_COLUMN])})
+            row_hours = df[TIMESTAMP_COLUMN].dt.floor("h")
+            for hour in run:
+                hour_df = df[row_hours == hour].reset_index(drop=True)
+                self.put(sla_table=sla_table, namespace=namespace, hour=hour, df=hour_df, columns=columns)
+                ret.append(hour_df)
+        return ret
+
+    def read_range(
+        self,
+        store: TableStore,
+        sla_table: SlaTable,
+        time_range: TimeRange,
+        namespace: Optional[str] = None,
+        columns: Optional[list[str]] = None,
+    ) -> pd.DataFrame:
+        """The same rows as store.read_range, only hours missing in the cache are read from store."""
+        hours = self.hours(time_range)
+        cached: dict[pd.Timestamp, pd.DataFrame] = {}
+        for hour in hours:
+            hour_df = self.get(sla_table=sla_table, namespace=namespace, hour=hour, columns=columns)
+            if hour_df is not None:
+                cached[hour] = hour_df
+        missing = [hour for hour in hours if hour not in cached]
+        logger.info(f"{self}: {sla_table.tableName} {len(cached)} cached, {len(missing)} missing hours")
+        if missing:
+            cached.update(
+                zip(
+                    missing,
+                    self.fetch(store=store, sla_table=sla_table, namespace=namespace, hours=missing, columns=columns),
+                )
+            )
+        df = pd.concat([cached[hour] for hour in hours], ignore_index=True)
+        in_range = (df[TIMESTAMP_COLUMN] >= time_range.from_time) & (df[TIMESTAMP_COLUMN] <= time_range.to_time)
+        df = df[in_range].reset_index(drop=True)
+        return df[columns] if columns else df
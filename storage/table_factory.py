@@ -0,0 +1,18 @@
+"""Table store of configured backend."""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from settings import settings
+from storage.parquet.table_store import ParquetTableStore
+from storage.snowflake.table_store import SnowflakeTableStore
+from storage.table_store import StorageBackend, TableStore
+
+
+def table_store(backend: Optional[str] = None) -> TableStore:
+    """New table store, settings.storage_backend by default."""
+    storage_backend = StorageBackend(backend if backend else settings.storage_backend)
+    if storage_backend == StorageBackend.PARQUET:
+        return ParquetTableStore(folder=settings.parquet_folder)
+    return SnowflakeTableStore()
@@ -0,0 +1,81 @@
+"""Storage of SLA tables independent of backend."""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from enum import StrEnum
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from metrics import TIMESTAMP_COLUMN
+from metrics.collector import TimeRange
+from prometheus.sla_model import SlaTable
+from settings import settings
+
+
+class StorageBackend(StrEnum):
+    SNOWFLAKE: str = "snowflake"
+    PARQUET: str = "parquet"
+
+
+class TableStore(ABC):
+    """
+    SLA tables (TIMESTAMP, tableKeys and column of each query) in schema `dbSchema` with name `tableName`.
+    Duplicates are not removed on write, read_range returns rows unique by `unique_keys`.
+    """
+
+    def __enter__(self) -> TableStore:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Release connections."""
+
+    @staticmethod
+    def unique_keys(sla_table: SlaTable) -> list[str]:
+        """TIMESTAMP and table keys identify row, empty for tables without keys (whole row is compared)."""
+        return [TIMESTAMP_COLUMN] + sla_table.tableKeys if sla_table.tableKeys else []
+
+    @abstractmethod
+    def write_df(self, df: pd.DataFrame, sla_table: SlaTable):
+        """Append rows, TIMESTAMP is in UTC."""
+
+    @abstractmethod
+    def read_range(
+        self,
+        sla_table: SlaTable,
+        time_range: TimeRange,
+        namespace: Optional[str] = None,
+        columns: Optional[list[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Rows with TIMESTAMP in time range (inclusive), duplicates of unique keys removed by the store
+        :param namespace: only rows of the namespace, ignored for tables without NAMESPACE key
+        :param columns: only these columns, all by default
+        """
+
+    @abstractmethod
+    def read_batches(
+        self,
+        sla_table: SlaTable,
+        time_range: TimeRange,
+        namespace: Optional[str] = None,
+        columns: Optional[list[str]] = None,
+        batch_rows: int = settings.table_batch_rows,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Rows of read_range as a stream of data frames, only one batch is in memory at a time.
+        Tables without keys are not deduplicated.
+        :param batch_rows: max rows of batch, backend may use its own chunks
+        """
+
+    @abstractmethod
+    def last_timestamps(self, sla_table: SlaTable, namespace: Optional[str]) -> dict[Optional[str], pd.Timestamp]:
+        """
+        Last stored timestamp (UTC) of sla table for each namespace (watermark).
+        Tables without namespace have single watermark with key None.
+        Empty dict when the table does not exist yet or is empty.
+        """
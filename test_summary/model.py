@@ -35,3 +35,11 @@ class TestSummary(BaseModel):
     namespace: str
     catalogItems: int
     tests: List[TestDetails] = []
+
+    def time_range(self) -> TimeRange:
+        """Time range covering all tests."""
+        if not self.tests:
+            raise ValueError(f"No tests in {self.name}")
+        start = min(t.testTimeRange.start for t in self.tests)
+        end = max(t.testTimeRange.end for t in self.tests)
+        return TimeRange.from_timestamps(from_time=start, to_time=end)
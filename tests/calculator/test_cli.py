@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import pytest
+
+from typer.testing import CliRunner
+
+
+@pytest.mark.unit
+class TestSizingReportsOptions:
+    def test_sketches_direct(self) -> None:
+        """Sketches of direct sizing are rejected before any query or report."""
+        from main import app
+
+        result = CliRunner().invoke(
+            app,
+            ["sizing-reports", "-s", "2024-01-06T00:00:00", "-e", "2024-01-06T01:00:00", "-n", "ns"]
+            + ["--direct", "--sketches"],
+        )
+        assert isinstance(result.exception, ValueError)
+        assert "Sketches require loaded samples" in str(result.exception)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import json
+
+import pandas as pd
+import pytest
+
+from metrics import POD_BASIC_RESOURCES_TABLE
+from metrics.collector import TimeRange
+from metrics.matrix import decode_vector
+from metrics.model.tables import SlaTablesHelper
+from sizing import PERCENTILES
+from sizing.calculator import CPU_RESOURCE, SizingCalculator, count_column, scaled_columns
+from sizing.direct import DirectLimitsRequests, over_time
+
+
+def vector(result: list[dict]) -> bytes:
+    data = {"status": "success", "data": {"resultType": "vector", "result": result}}
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+class StubCollector:
+    """Instant queries answered from value of each *_over_time function, the same series for all queries."""
+
+    def __init__(self, time_range: TimeRange, pods: list[str]):
+        self.timeRange: TimeRange = time_range
+        self.pods: list[str] = pods
+        self.queries: list[str] = []
+
+    @staticmethod
+    def value(p_query: str) -> str:
+        if p_query.startswith("quantile_over_time("):
+            return p_query[len("quantile_over_time(") :].split(",")[0]
+        if "kube_pod_container_resource_limits" in p_query:
+            return "2"
+        if "kube_pod_container_resource_requests" in p_query:
+            return "0.5"
+        return {"count": "120", "min": "0.01", "max": "1.5"}[p_query.split("_over_time")[0]]
+
+    def instant_queries(self, p_queries: list[str], group_by: list[str], time: pd.Timestamp, workers: int):
+        self.queries.extend(p_queries)
+        return [
+            decode_vector(
+                vector(
+                    [
+                        {"metric": {"namespace": "ns", "pod": pod, "container": "app"}, "value": [0, self.value(q)]}
+                        for pod in self.pods
+                    ]
+                ),
+                group_by=group_by,
+            )
+            for q in p_queries
+        ]
+
+
+def direct_cpu(collector: StubCollector) -> DirectLimitsRequests:
+    sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+    return DirectLimitsRequests(collector=collector, sla_table=sla_table, resource=CPU_RESOURCE, namespace="ns")
+
+
+@pytest.mark.unit
+class TestDirectLimitsRequests:
+    time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-01T01:00:00")
+
+    def test_over_time(self) -> None:
+        """Subquery covers duration with step in milliseconds, quantile parameter is the first argument."""
+        assert over_time("max", "up", duration_sec=3600, step_sec=30) == "max_over_time((up)[3600000ms:30000ms])"
+        assert (
+            over_time("quantile", "sum(up) by (pod)", duration_sec=90.5, step_sec=0.5, param=0.95)
+            == "quantile_over_time(0.95, (sum(up) by (pod))[90500ms:500ms])"
+        )
+
+    def test_queries(self) -> None:
+        """Query of each percentiles column and of limit and request, labels replaced by namespace."""
+        limits_requests = direct_cpu(StubCollector(time_range=self.time_range, pods=["pod-1"]))
+        queries = limits_requests.queries(CPU_RESOURCE)
+        assert set(queries) == set([count_column] + scaled_columns + [CPU_RESOURCE.limit, CPU_RESOURCE.request])
+        step_ms = int(limits_requests.sla_table.stepSec * 1000)
+        assert all(q.endswith(f"[3600000ms:{step_ms}ms])") for q in queries.values())
+        for p in PERCENTILES:
+            assert queries[f"{int(p * 100)}%"].startswith(f"quantile_over_time({p}, (sum(rate(")
+        assert queries["min"].startswith("min_over_time((sum(rate(container_cpu_usage_seconds_total{")
+        assert queries[CPU_RESOURCE.limit].startswith("max_over_time((sum(kube_pod_container_resource_limits{")
+        assert all('namespace="ns"' in q and "groupBy" not in q for q in queries.values())
+
+    def test_sizing(self) -> None:
+        """Percentiles, limits and requests of instant query results feed SizingCalculator."""
+        collector = StubCollector(time_range=self.time_range, pods=["pod-1", "pod-2"])
+        cpu = direct_cpu(collector)
+        assert len(collector.queries) == len(scaled_columns) + 3
+        percentiles = cpu.measured_df_percentiles()
+        assert percentiles.index.names == ["CONTAINER", "POD"]
+        assert list(percentiles.columns) == [count_column] + scaled_columns
+        assert percentiles.loc[("app", "pod-2"), count_column] == 120
+        for p in PERCENTILES:
+            assert percentiles.loc[("app", "pod-1"), f"{int(p * 100)}%"] == p
+        assert cpu.limit_value.name == CPU_RESOURCE.limit
+        assert cpu.limit_value.tolist() == [2.0, 2.0]
+        assert cpu.request_value.tolist() == [0.5, 0.5]
+        with pytest.raises(ValueError):
+            cpu.measured_samples()
+        s_c = SizingCalculator(cpu=cpu, memory=cpu, time_range=self.time_range)
+        assert s_c.cpu.request_limit_df(columns=["request", "limit"]).shape == (2, 2)
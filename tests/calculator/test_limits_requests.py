@@ -35,6 +35,30 @@ class TestLimitRequest:
         max_limit_memory_mib = memory.limit_value.max() / MIBS
         assert max_limit_memory_mib == max_request_memory_mib
 
+    def test_resource_columns(self) -> None:
+        """Projection to resource columns gives the same limits, requests and measured values."""
+        from metrics import POD_BASIC_RESOURCES_TABLE
+        from metrics.model.tables import SlaTablesHelper
+        from sizing.calculator import resource_columns
+        from sizing.data import DataLoader
+
+        data_loader: DataLoader = DataLoader(start_time=None, end_time=None)
+        sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+        df: pd.DataFrame = data_loader.load_df_file(
+            sla_table=sla_table, df_path=Path(settings.test_data, "POD_BASIC_RESOURCES.json")
+        )
+        columns = resource_columns(sla_table, [CPU_RESOURCE, MEMORY_RESOURCE])
+        # other metric columns of the table are not read
+        assert len(columns) == len(set(columns)) < 1 + len(sla_table.tableKeys) + len(sla_table.queries)
+        assert set(columns) == set(df.columns)
+        full_df = df.assign(OTHER_METRIC=1.0)
+        for resource in [CPU_RESOURCE, MEMORY_RESOURCE]:
+            full = LimitsRequests(sla_table=sla_table, resource=resource, ns_df=full_df)
+            projected = LimitsRequests(sla_table=sla_table, resource=resource, ns_df=full_df[columns])
+            assert projected.limit_value.equals(full.limit_value)
+            assert projected.request_value.equals(full.request_value)
+            assert projected.measured_field.equals(full.measured_field)
+
 
 @pytest.mark.unit
 @pytest.mark.parametrize(
@@ -68,3 +92,97 @@ class TestGrafanaDashboards:
         }
         tmp_df = pd.DataFrame(data=tmp_dict)
         assert len(tmp_df) == input_data[1]
+
+
+@pytest.mark.unit
+class TestMemoized:
+    def test_single_computation(self, monkeypatch) -> None:
+        """Percentiles are computed once per LimitsRequests, sizing is the same as without memoization."""
+        from metrics import POD_BASIC_RESOURCES_TABLE
+        from metrics.model.tables import SlaTablesHelper
+        from sizing import LIMIT_PERCENTILE, REQUEST_PERCENTILE, calculator
+        from sizing.calculator import SizingCalculator
+        from sizing.data import DataLoader
+
+        data_loader: DataLoader = DataLoader(start_time=None, end_time=None)
+        sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+        df: pd.DataFrame = data_loader.load_df_file(
+            sla_table=sla_table, df_path=Path(settings.test_data, "POD_BASIC_RESOURCES.json")
+        )
+        described: list[int] = []
+        percentiles_df = calculator.percentiles_df
+
+        def counted_percentiles_df(*args, **kwargs):
+            described.append(1)
+            return percentiles_df(*args, **kwargs)
+
+        monkeypatch.setattr(calculator, "percentiles_df", counted_percentiles_df)
+        cpu = LimitsRequests(sla_table=sla_table, resource=CPU_RESOURCE, ns_df=df)
+        memory = LimitsRequests(sla_table=sla_table, resource=MEMORY_RESOURCE, ns_df=df)
+        s_c = SizingCalculator(cpu=cpu, memory=memory)
+        new_sizing = s_c.new_sizing()
+        assert len(described) == 2
+        assert s_c.request_limits() is s_c.request_limits()
+        assert s_c.new_sizing().equals(new_sizing)
+        assert len(described) == 2
+        # results are not modified by new_sizing
+        assert s_c.cpu_percentiles()[REQUEST_PERCENTILE].name == REQUEST_PERCENTILE
+        assert s_c.mem_percentiles()[LIMIT_PERCENTILE].name == LIMIT_PERCENTILE
+        # setting an input drops memoized results
+        s_c.cpu = LimitsRequests(sla_table=sla_table, resource=CPU_RESOURCE, ns_df=df)
+        assert s_c.new_sizing().equals(new_sizing)
+        assert len(described) == 3
+
+
+@pytest.mark.unit
+class TestPercentiles:
+    def test_describe(self) -> None:
+        """The same values as transposed `describe` with NaN, single value and constant rows."""
+        import numpy as np
+
+        from sizing import PERCENTILES
+        from sizing.calculator import count_column, percentiles_df, scaled_columns
+
+        rng = np.random.default_rng(seed=1)
+        values = rng.random((50, 40)) * 1000
+        values[rng.random(values.shape) < 0.4] = np.nan
+        values[0, :] = np.nan
+        values[0, 7] = 3.0
+        values[1, :] = 2.5
+        df = pd.DataFrame(values, index=pd.Index([f"container-{i}" for i in range(len(values))], name="CONTAINER"))
+        percentiles = percentiles_df(values, index=df.index)
+        assert list(percentiles.columns) == [count_column] + scaled_columns
+        expected = df.T.describe(percentiles=PERCENTILES).T
+        pd.testing.assert_frame_equal(percentiles, expected[percentiles.columns])
+        assert percentiles_df(np.empty((0, 3)), index=pd.Index([])).empty
+
+
+@pytest.mark.unit
+class TestNamespaces:
+    def test_single_groupby(self) -> None:
+        """LimitsRequests of each namespace of shared data frame are the same as of single namespace data frame."""
+        from metrics import NAMESPACE_COLUMN, POD_BASIC_RESOURCES_TABLE
+        from metrics.model.tables import SlaTablesHelper
+        from sizing.calculator import namespace_dfs
+        from sizing.data import DataLoader
+
+        data_loader: DataLoader = DataLoader(start_time=None, end_time=None)
+        sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+        df: pd.DataFrame = data_loader.load_df_file(
+            sla_table=sla_table, df_path=Path(settings.test_data, "POD_BASIC_RESOURCES.json")
+        )
+        df = df.assign(**{NAMESPACE_COLUMN: df[NAMESPACE_COLUMN].astype(str)})
+        other_df = df.assign(**{NAMESPACE_COLUMN: "other", CPU_RESOURCE.measured: df[CPU_RESOURCE.measured] * 2})
+        ns_dfs = {ns: ns_df for ns, ns_df in [(str(df[NAMESPACE_COLUMN].iloc[0]), df), ("other", other_df)]}
+        all_ns_df = pd.concat(list(ns_dfs.values())).sample(frac=1, random_state=1)
+        namespaces = []
+        for namespace, ns_df in namespace_dfs(all_ns_df):
+            namespaces.append(namespace)
+            for resource in [CPU_RESOURCE, MEMORY_RESOURCE]:
+                limits_requests = LimitsRequests(sla_table=sla_table, resource=resource, ns_df=ns_df)
+                expected = LimitsRequests(sla_table=sla_table, resource=resource, ns_df=ns_dfs[namespace])
+                pd.testing.assert_series_equal(limits_requests.limit_value, expected.limit_value)
+                pd.testing.assert_frame_equal(
+                    limits_requests.measured_df_percentiles(), expected.measured_df_percentiles()
+                )
+        assert namespaces == sorted(ns_dfs)
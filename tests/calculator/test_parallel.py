@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from metrics import POD_BASIC_RESOURCES_TABLE, TIMESTAMP_COLUMN
+from metrics.model.tables import SlaTablesHelper
+from settings import settings
+from shared.snapshot import from_ipc_bytes, to_ipc_bytes
+from sizing.calculator import CPU_RESOURCE, MEMORY_RESOURCE, LimitsRequests, SizingCalculator
+from sizing.data import DataLoader
+from sizing.parallel import SizingUnit, map_in_processes, size_unit
+
+
+@pytest.mark.unit
+class TestParallelSizing:
+    def test_ipc_bytes(self) -> None:
+        df = pd.read_json(Path(settings.test_data, "POD_BASIC_RESOURCES.json"))
+        data = to_ipc_bytes(df)
+        assert len(data) < df.memory_usage(deep=True).sum()
+        pd.testing.assert_frame_equal(from_ipc_bytes(data), df)
+
+    def test_workers(self, tmp_path) -> None:
+        """New sizing of units in processes is in the order of units and the same as sequential sizing."""
+        data_loader: DataLoader = DataLoader(start_time=None, end_time=None)
+        sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+        df: pd.DataFrame = data_loader.load_df_file(
+            sla_table=sla_table, df_path=Path(settings.test_data, "POD_BASIC_RESOURCES.json")
+        )
+        timestamps = sorted(df[TIMESTAMP_COLUMN].unique())
+        parts = [df, df[df[TIMESTAMP_COLUMN] <= timestamps[3]], df[df[TIMESTAMP_COLUMN] > timestamps[3]]]
+        expected = [
+            SizingCalculator(
+                cpu=LimitsRequests(ns_df=part, sla_table=sla_table, resource=CPU_RESOURCE),
+                memory=LimitsRequests(ns_df=part, sla_table=sla_table, resource=MEMORY_RESOURCE),
+            ).new_sizing()
+            for part in parts
+        ]
+        for workers in [1, 2]:
+            units = [
+                SizingUnit(
+                    ns_df=part, sla_table=sla_table, folder=Path(tmp_path, f"{workers}_{i}"), namespace=f"ns-{i}"
+                )
+                for i, part in enumerate(parts)
+            ]
+            results = map_in_processes(size_unit, units, workers=workers)
+            assert [result.namespace for result in results] == ["ns-0", "ns-1", "ns-2"]
+            for result, new_sizing in zip(results, expected):
+                pd.testing.assert_frame_equal(result.newSizing, new_sizing)
+            assert all(len(list(Path(tmp_path, f"{workers}_{i}").glob("*.html"))) == 3 for i in range(3))
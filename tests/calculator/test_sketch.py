@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics import POD_BASIC_RESOURCES_TABLE, TIMESTAMP_COLUMN
+from metrics.model.tables import SlaTablesHelper
+from settings import settings
+from sizing.calculator import CPU_RESOURCE, MEMORY_RESOURCE, LimitsRequests
+from sizing.data import DataLoader
+from sizing.sketch import ResourceSketch, merge_sketches
+
+
+def resources_df() -> pd.DataFrame:
+    data_loader: DataLoader = DataLoader(start_time=None, end_time=None)
+    sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+    return data_loader.load_df_file(sla_table=sla_table, df_path=Path(settings.test_data, "POD_BASIC_RESOURCES.json"))
+
+
+def assert_relative_error(percentiles: pd.DataFrame, expected: pd.DataFrame, relative_accuracy: float):
+    assert percentiles.index.equals(expected.index)
+    assert list(percentiles.columns) == list(expected.columns)
+    error = (percentiles - expected).abs().to_numpy()
+    assert (error <= relative_accuracy * expected.abs().to_numpy() + 1e-12).all()
+
+
+@pytest.mark.unit
+class TestResourceSketch:
+    def test_percentiles(self) -> None:
+        """Percentiles of sketch are within relative accuracy, count, min and max are exact."""
+        sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+        df = resources_df()
+        for resource in [CPU_RESOURCE, MEMORY_RESOURCE]:
+            limits_requests = LimitsRequests(sla_table=sla_table, resource=resource, ns_df=df)
+            sketch = ResourceSketch.from_limits_requests(limits_requests, relative_accuracy=0.01)
+            expected = limits_requests.measured_df_percentiles()
+            percentiles = sketch.percentiles_df()
+            assert_relative_error(percentiles, expected, relative_accuracy=0.01)
+            for column in ["count", "min", "max"]:
+                pd.testing.assert_series_equal(percentiles[column], expected[column])
+
+    def test_merge(self, tmp_path) -> None:
+        """Sketches of two time ranges saved and merged give percentiles of the whole time range."""
+        sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+        df = resources_df()
+        timestamps = np.sort(df[TIMESTAMP_COLUMN].unique())
+        first = df[TIMESTAMP_COLUMN] < timestamps[len(timestamps) // 2]
+        for resource in [CPU_RESOURCE, MEMORY_RESOURCE]:
+            paths = []
+            for i, part in enumerate([df[first], df[~first]]):
+                limits_requests = LimitsRequests(sla_table=sla_table, resource=resource, ns_df=part)
+                paths.append(Path(tmp_path, f"{resource.name}_{i}.json"))
+                ResourceSketch.from_limits_requests(limits_requests, relative_accuracy=0.01).to_json(paths[-1])
+            merged = merge_sketches([ResourceSketch.from_json(path) for path in paths])
+            expected = LimitsRequests(sla_table=sla_table, resource=resource, ns_df=df)
+            assert_relative_error(merged.percentiles_df(), expected.measured_df_percentiles(), relative_accuracy=0.01)
+            limit_value = merged.series["limit"].rename(resource.limit)
+            pd.testing.assert_series_equal(limit_value, expected.limit_value.reindex(limit_value.index))
+
+    def test_merge_relative_accuracy(self) -> None:
+        sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+        limits_requests = LimitsRequests(sla_table=sla_table, resource=CPU_RESOURCE, ns_df=resources_df())
+        sketches = [ResourceSketch.from_limits_requests(limits_requests, relative_accuracy=a) for a in [0.01, 0.02]]
+        with pytest.raises(ValueError):
+            merge_sketches(sketches)
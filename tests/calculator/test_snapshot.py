@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from metrics import NAMESPACE_COLUMN, POD_BASIC_RESOURCES_TABLE, POD_COLUMN, TIMESTAMP_COLUMN
+from metrics.model.tables import SlaTablesHelper
+from settings import settings
+from shared.snapshot import load_snapshot, save_snapshot
+from sizing.data import DataLoader, json_to_snapshot
+
+
+@pytest.mark.unit
+class TestSnapshot:
+    def test_json_to_snapshot(self, tmp_path) -> None:
+        """Converted json gives the same df, smaller file."""
+        json_path = Path(settings.test_data, "POD_BASIC_RESOURCES.json")
+        snapshot_path = json_to_snapshot(json_path=json_path, snapshot_path=Path(tmp_path, "POD_BASIC_RESOURCES.arrow"))
+        assert snapshot_path.stat().st_size < json_path.stat().st_size
+        data_loader: DataLoader = DataLoader(start_time=None, end_time=None)
+        sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+        pd.testing.assert_frame_equal(
+            data_loader.load_df_file(sla_table=sla_table, df_path=snapshot_path),
+            data_loader.load_df_file(sla_table=sla_table, df_path=json_path),
+        )
+
+    @pytest.mark.parametrize("compression", ["zstd", "uncompressed"])
+    def test_dtypes(self, tmp_path, compression: str) -> None:
+        """Timezone and categories are kept, loaded df is writable."""
+        df = pd.DataFrame(
+            {
+                TIMESTAMP_COLUMN: pd.date_range("2024-01-01", periods=4, freq="30s", tz="UTC"),
+                NAMESPACE_COLUMN: pd.Categorical(["ns1", "ns1", "ns2", "ns2"]),
+                POD_COLUMN: ["p1", "p2", "p1", "p2"],
+                "CPU_CORE": [0.1, None, 0.3, 0.4],
+            }
+        )
+        path = Path(tmp_path, "df.arrow")
+        save_snapshot(df=df, path=path, compression=compression)
+        pd.testing.assert_frame_equal(load_snapshot(path), df)
+        columns = ["CPU_CORE", NAMESPACE_COLUMN]
+        pd.testing.assert_frame_equal(load_snapshot(path, columns=columns), df[columns])
+        loaded = load_snapshot(path)
+        loaded.loc[0, "CPU_CORE"] = 1.0
+        assert loaded.loc[0, "CPU_CORE"] == 1.0
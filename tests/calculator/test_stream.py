@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from metrics import POD_BASIC_RESOURCES_TABLE
+from metrics.model.tables import SlaTablesHelper
+from settings import settings
+from sizing.calculator import CPU_RESOURCE, MEMORY_RESOURCE, LimitsRequests
+from sizing.data import DataLoader
+from sizing.stream import streamed_limits_requests
+
+
+@pytest.mark.unit
+class TestStreamedLimitsRequests:
+    def test_batches(self) -> None:
+        """Batches give the same limits, requests and percentiles as the whole data frame."""
+        data_loader: DataLoader = DataLoader(start_time=None, end_time=None)
+        sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+        df: pd.DataFrame = data_loader.load_df_file(
+            sla_table=sla_table, df_path=Path(settings.test_data, "POD_BASIC_RESOURCES.json")
+        )
+        # series are split across batches
+        batches = (df.iloc[i : i + 50] for i in range(0, len(df), 50))
+        resources = [CPU_RESOURCE, MEMORY_RESOURCE]
+        streamed = streamed_limits_requests(batches=batches, sla_table=sla_table, resources=resources)
+        for resource, limits_requests in zip(resources, streamed):
+            expected = LimitsRequests(sla_table=sla_table, resource=resource, ns_df=df)
+            pd.testing.assert_series_equal(limits_requests.limit_value, expected.limit_value)
+            pd.testing.assert_series_equal(limits_requests.request_value, expected.request_value)
+            pd.testing.assert_frame_equal(
+                limits_requests.measured_df_percentiles(), expected.measured_df_percentiles(), check_names=False
+            )
+
+    def test_no_rows(self) -> None:
+        sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+        with pytest.raises(ValueError):
+            streamed_limits_requests(batches=iter([]), sla_table=sla_table, resources=[CPU_RESOURCE])
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from metrics import POD_BASIC_RESOURCES_TABLE, TIMESTAMP_COLUMN
+from metrics.collector import TimeRange
+from metrics.model.tables import SlaTablesHelper
+from settings import settings
+from sizing.data import DataLoader, TimeSlices
+
+
+@pytest.mark.unit
+class TestTimeSlices:
+    def test_slices(self) -> None:
+        """Slices of shuffled covering table are the rows of each test time range including bounds."""
+        from test_summary.model import TestSummary
+
+        data_loader: DataLoader = DataLoader(start_time=None, end_time=None)
+        sla_table = SlaTablesHelper().get_sla_table(table_name=POD_BASIC_RESOURCES_TABLE)
+        df: pd.DataFrame = data_loader.load_df_file(
+            sla_table=sla_table, df_path=Path(settings.test_data, "POD_BASIC_RESOURCES.json")
+        )
+        df = df.assign(**{TIMESTAMP_COLUMN: pd.to_datetime(df[TIMESTAMP_COLUMN], utc=True)})
+        test_summary = TestSummary.model_validate(
+            {
+                "name": "summary",
+                "namespace": "1111",
+                "catalogItems": 1,
+                "tests": [
+                    {"testTimeRange": {"start": start, "end": end}, "description": description}
+                    for start, end, description in [
+                        ("2024-01-06T20:00:00", "2024-01-06T20:02:30", "first"),
+                        ("2024-01-06T20:02:30", "2024-01-06T20:05:00", "second"),
+                        ("2024-01-06T20:01:10", "2024-01-06T20:01:20", "empty"),
+                    ]
+                ],
+            }
+        )
+        covering = test_summary.time_range()
+        assert covering.from_time == df[TIMESTAMP_COLUMN].min()
+        assert covering.to_time == df[TIMESTAMP_COLUMN].max()
+        slices = TimeSlices(df.sample(frac=1, random_state=1))
+        for test_details in test_summary.tests:
+            time_range: TimeRange = test_details.testTimeRange.to_time_range()
+            in_range = df[TIMESTAMP_COLUMN].between(time_range.from_time, time_range.to_time, inclusive="both")
+            sliced = slices.slice(time_range)
+            assert len(sliced) == in_range.sum()
+            columns = list(df.columns)
+            pd.testing.assert_frame_equal(
+                sliced.sort_values(columns, ignore_index=True),
+                df[in_range].sort_values(columns, ignore_index=True),
+            )
+        assert slices.slice(test_summary.tests[2].testTimeRange.to_time_range()).empty
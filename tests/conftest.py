@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+import pytest
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]) -> None:
+    """Performance tests run only when explicitly selected, e.g. `-m performance`."""
+    if "performance" in (config.option.markexpr or ""):
+        return
+    skip = pytest.mark.skip(reason="performance test, select with -m performance")
+    for item in items:
+        if "performance" in item.keywords:
+            item.add_marker(skip)
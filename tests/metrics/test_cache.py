@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import os
+
+import pandas as pd
+import pytest
+import pytz
+
+from metrics.cache import RangeQueryCache
+from metrics.collector import TimeRange
+
+
+URL = "http://prometheus-a:9090/api/v1"
+
+
+@pytest.mark.unit
+class TestRangeQueryCache:
+    def test_aligned_buckets(self, tmp_path) -> None:
+        """Buckets are aligned to bucket size and cover the time range."""
+        cache = RangeQueryCache(folder=tmp_path, bucket_hours=1, max_mb=1)
+        time_range = TimeRange(start_time="2024-01-01T00:10:00", end_time="2024-01-01T02:00:00")
+        buckets = cache.buckets(time_range=time_range, step_sec=30)
+        assert [b.from_time.hour for b in buckets] == [0, 1, 2]
+        assert all(b.from_time.minute == 0 for b in buckets)
+        assert buckets[0].to_time == pd.Timestamp("2024-01-01T00:59:30", tz=pytz.UTC)
+
+    def test_incomplete_bucket_not_stored(self, tmp_path) -> None:
+        """Bucket containing now is not stored, complete bucket is."""
+        cache = RangeQueryCache(folder=tmp_path, bucket_hours=1, max_mb=1, ingestion_lag_sec=0)
+        now = pd.Timestamp.now(tz=pytz.UTC)
+        time_range = TimeRange.from_timestamps(from_time=now - pd.Timedelta(hours=1), to_time=now)
+        past, current = cache.buckets(time_range=time_range, step_sec=30)
+        assert cache.put(url=URL, p_query="up", step_sec=30, bucket=past, content=b"past")
+        assert not cache.put(url=URL, p_query="up", step_sec=30, bucket=current, content=b"current")
+        assert cache.get(url=URL, p_query="up", step_sec=30, bucket=past) == b"past"
+        assert cache.get(url=URL, p_query="up", step_sec=30, bucket=current) is None
+        assert cache.get(url=URL, p_query="up", step_sec=60, bucket=past) is None
+
+    def test_size_eviction(self, tmp_path) -> None:
+        """Least recently used entries are removed above the size limit."""
+        cache = RangeQueryCache(folder=tmp_path, bucket_hours=1, max_mb=0.001)
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-01T09:00:00")
+        for bucket in cache.buckets(time_range=time_range, step_sec=30):
+            cache.put(url=URL, p_query="up", step_sec=30, bucket=bucket, content=os.urandom(300))
+        stored = list(tmp_path.rglob("*.json.gz"))
+        assert 0 < len(stored) < 10
+        assert sum(f.stat().st_size for f in stored) <= 0.001 * 1024**2
+
+    def test_ingestion_lag(self, tmp_path) -> None:
+        """Bucket ending within ingestion lag is not stored, late samples would be missing."""
+        cache = RangeQueryCache(folder=tmp_path, bucket_hours=1, max_mb=1, ingestion_lag_sec=3600)
+        now = pd.Timestamp.now(tz=pytz.UTC)
+        time_range = TimeRange.from_timestamps(from_time=now - pd.Timedelta(hours=3), to_time=now)
+        buckets = cache.buckets(time_range=time_range, step_sec=30)
+        # first bucket ended at least 2 hours ago, the one before current bucket within the last hour
+        old, recent = buckets[0], buckets[-2]
+        assert cache.put(url=URL, p_query="up", step_sec=30, bucket=old, content=b"old")
+        assert not cache.put(url=URL, p_query="up", step_sec=30, bucket=recent, content=b"recent")
+
+    def test_url_in_key(self, tmp_path) -> None:
+        """The same query and step of another Prometheus is not read from cache."""
+        cache = RangeQueryCache(folder=tmp_path, bucket_hours=1, max_mb=1)
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-01T00:30:00")
+        bucket = cache.buckets(time_range=time_range, step_sec=30)[0]
+        assert cache.put(url=URL, p_query="up", step_sec=30, bucket=bucket, content=b"a")
+        assert cache.get(url="http://prometheus-b:9090/api/v1", p_query="up", step_sec=30, bucket=bucket) is None
+        assert cache.get(url=URL, p_query="up", step_sec=30, bucket=bucket) == b"a"
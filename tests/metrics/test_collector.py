@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import json
+import threading
+
+import pandas as pd
+import pytest
+import requests
+
+from metrics.collector import PrometheusCollector, TimeRange, check_response, concat_chunks
+
+
+def http_response(status_code: int, content: bytes, reason: str = "Error") -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = reason
+    response._content = content
+    return response
+
+
+@pytest.mark.unit
+class TestTimeRangeChunks:
+    def test_no_split(self) -> None:
+        """Short time range is not split."""
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-01T01:00:00")
+        assert time_range.chunks(step_sec=30, max_points=1000) == [time_range]
+
+    def test_step_aligned_chunks(self) -> None:
+        """Chunks cover the same samples as the whole range without duplicated boundaries."""
+        step_sec = 30
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-03T00:00:00")
+        chunks = time_range.chunks(step_sec=step_sec, max_points=1000)
+        step = pd.Timedelta(seconds=step_sec)
+        samples = [t for c in chunks for t in pd.date_range(start=c.from_time, end=c.to_time, freq=step).tolist()]
+        assert all(int((c.to_time - c.from_time) / step) + 1 <= 1000 for c in chunks)
+        assert chunks[0].from_time == time_range.from_time
+        assert chunks[-1].to_time == time_range.to_time
+        assert samples == pd.date_range(start=time_range.from_time, end=time_range.to_time, freq=step).tolist()
+
+    def test_concat_chunks(self) -> None:
+        """Series missing in one chunk are filled with NaN, duplicated timestamps removed."""
+        idx_1 = pd.date_range(start="2024-01-01", periods=3, freq="30s")
+        idx_2 = pd.date_range(start=idx_1[-1], periods=3, freq="30s")
+        df_1 = pd.DataFrame({"a": [1.0, 2.0, 3.0]}, index=idx_1)
+        df_2 = pd.DataFrame({"a": [3.0, 4.0, 5.0], "b": [1.0, 1.0, 1.0]}, index=idx_2)
+        df = concat_chunks([df_2, pd.DataFrame(), df_1])
+        assert df.shape == (5, 2)
+        assert df.index.is_monotonic_increasing
+        assert df["b"].isna().sum() == 2
+
+
+@pytest.mark.unit
+class TestCheckResponse:
+    def test_ok(self) -> None:
+        check_response(http_response(200, b'{"status":"success"}', reason="OK"))
+
+    def test_prometheus_error(self) -> None:
+        """Prometheus error type and message are reported."""
+        content = b'{"status":"error","errorType":"bad_data","error":"parse error"}'
+        with pytest.raises(RuntimeError, match="bad_data: parse error"):
+            check_response(http_response(400, content))
+
+    def test_other_json(self) -> None:
+        """JSON body without Prometheus error fields (e.g. proxy) reports status and reason."""
+        with pytest.raises(RuntimeError, match="503: Service Unavailable"):
+            check_response(http_response(503, b'{"message":"no healthy upstream"}', reason="Service Unavailable"))
+        with pytest.raises(RuntimeError, match="502: Bad Gateway"):
+            check_response(http_response(502, b'["error"]', reason="Bad Gateway"))
+
+    def test_not_json(self) -> None:
+        with pytest.raises(requests.HTTPError):
+            check_response(http_response(504, b"<html>Gateway Timeout</html>"))
+
+
+def threads_collector(threads: set[int]) -> PrometheusCollector:
+    """Collector of 2 days split to chunks of 1000 samples, chunks are answered without Prometheus."""
+    time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-03T00:00:00")
+    collector = PrometheusCollector("http://prometheus:9090", time_range=time_range, max_points=1000)
+
+    def fetch_range(p_query: str, step_sec: float, time_range: TimeRange) -> bytes:
+        threads.add(threading.get_ident())
+        values = [[time_range.from_time.timestamp(), "1"]]
+        data = {"resultType": "matrix", "result": [{"metric": {"pod": "p"}, "values": values}]}
+        return json.dumps({"status": "success", "data": data}).encode("utf-8")
+
+    collector.fetch_range = fetch_range
+    return collector
+
+
+@pytest.mark.unit
+class TestWorkers:
+    @pytest.mark.parametrize("workers", [1, 4])
+    def test_range_matrices(self, workers: int) -> None:
+        """Queries and chunks of each query run in `workers` threads, 1 = sequential in the calling thread."""
+        threads: set[int] = set()
+        collector = threads_collector(threads)
+        matrices = collector.range_matrices(["up", "down"], group_by=["pod"], step_sec=30, workers=workers)
+        assert [m.size for m in matrices] == [6, 6]
+        if workers == 1:
+            assert threads == {threading.get_ident()}
+        else:
+            assert threading.get_ident() not in threads
+
+
+@pytest.mark.unit
+class TestTargetLimit:
+    def test_first_wins(self) -> None:
+        """The first collector of url sets the limit, later values are ignored."""
+        url = "http://prometheus-limit:9090"
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-01T01:00:00")
+        first = PrometheusCollector(url, time_range=time_range, max_concurrency=2)
+        second = PrometheusCollector(url, time_range=time_range, max_concurrency=8)
+        assert second.targetLimit is first.targetLimit
+        assert PrometheusCollector.targetLimits[url][1] == 2
+        assert PrometheusCollector(url + "/other", time_range=time_range).targetLimit is not first.targetLimit
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from prometheus_pandas.query import metric_name
+
+from metrics.collector import col_dict, col_tuple
+from metrics.labels import parse_labels
+from prometheus.prom_rds import PrometheusRDSColumn
+
+
+@pytest.mark.unit
+class TestSeriesLabels:
+    def test_parse_labels(self) -> None:
+        """Label values may contain commas, quotes and label names."""
+        column_name = metric_name(
+            {"__name__": "up", "container": "pod0", "namespace": 'n,s="1"', "pod": "p,od=container"}
+        )
+        assert parse_labels(column_name) == (
+            ("container", "pod0"),
+            ("namespace", 'n,s="1"'),
+            ("pod", "p,od=container"),
+        )
+        assert col_dict(column_name, grp_keys=["pod", "container"]) == {"container": "pod0", "pod": "p,od=container"}
+
+    def test_multi_index(self) -> None:
+        """MultiIndex levels in order of sorted groupBy, missing or extra labels are an error."""
+        columns = [metric_name({"container": f"c{i}", "namespace": "ns", "pod": f"pod-{i}"}) for i in range(3)]
+        df = pd.DataFrame([[1.0, 2.0, 3.0]], columns=columns)
+        rds_column = PrometheusRDSColumn(df.copy(), group_by=["pod", "container", "namespace "], column_name="CPU")
+        assert rds_column.multiIndex.names == ["CONTAINER", "NAMESPACE", "POD"]
+        assert rds_column.multiIndex.tolist() == [("c0", "ns", "pod-0"), ("c1", "ns", "pod-1"), ("c2", "ns", "pod-2")]
+        with pytest.raises(ValueError):
+            PrometheusRDSColumn(df.copy(), group_by=["pod", "container", "node"], column_name="CPU")
+        # query `by` has more labels than groupBy, rows of series would be mixed
+        with pytest.raises(ValueError):
+            PrometheusRDSColumn(df.copy(), group_by=["pod", "namespace"], column_name="CPU")
+        with pytest.raises(ValueError):
+            col_tuple(metric_name({"container": "c", "pod": "p"}), grp_keys=["pod", "node"])
+        assert col_tuple(metric_name({"container": "c", "pod": "p"}), grp_keys=["pod"]) == ("p",)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics import TIMESTAMP_COLUMN
+from metrics.matrix import RangeMatrix, TableBuilder, decode_vector
+
+
+def response(result: list[dict], result_type: str = "matrix") -> bytes:
+    data = {"status": "success", "data": {"resultType": result_type, "result": result}}
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+@pytest.mark.unit
+class TestRangeMatrix:
+    def test_long_format(self) -> None:
+        """Samples of all responses in long format with timestamp and groupBy index."""
+        chunk_1 = response(
+            [
+                {"metric": {"namespace": "ns", "pod": "pod-1"}, "values": [[1704067200, "1"], [1704067230, "NaN"]]},
+                {"metric": {"namespace": "ns", "pod": "pod-2"}, "values": [[1704067200, "2"]]},
+            ]
+        )
+        chunk_2 = response([{"metric": {"namespace": "ns", "pod": "pod-1"}, "values": [[1704067260, "+Inf"]]}])
+        matrix = RangeMatrix(group_by=["pod", " namespace"])
+        matrix.decode(chunk_1).decode(chunk_2)
+        df = matrix.column_df(column_name="CPU")
+        assert df.index.names == [TIMESTAMP_COLUMN, "NAMESPACE", "POD"]
+        assert len(matrix.labels_df()) == 2
+        assert df.shape == (4, 1)
+        assert df.loc[(pd.Timestamp(1704067200, unit="s"), "ns", "pod-2"), "CPU"] == 2
+        assert np.isnan(df.loc[(pd.Timestamp(1704067230, unit="s"), "ns", "pod-1"), "CPU"])
+        assert np.isinf(df.loc[(pd.Timestamp(1704067260, unit="s"), "ns", "pod-1"), "CPU"])
+
+    def test_time_bounds(self) -> None:
+        """Samples outside of time bounds are removed."""
+        content = response([{"metric": {"pod": "p"}, "values": [[1704067200 + 30 * i, str(i)] for i in range(10)]}])
+        from_time = pd.Timestamp(1704067200 + 60, unit="s", tz="UTC")
+        to_time = pd.Timestamp(1704067200 + 120, unit="s", tz="UTC")
+        matrix = RangeMatrix(group_by=["pod"]).decode(content, from_time=from_time, to_time=to_time)
+        assert matrix.values[: matrix.size].tolist() == [2.0, 3.0, 4.0]
+
+    def test_inconsistent_labels(self) -> None:
+        """Series without groupBy label is an error."""
+        content = response([{"metric": {"pod": "p"}, "values": [[1704067200, "1"]]}])
+        with pytest.raises(ValueError):
+            RangeMatrix(group_by=["pod", "container"]).decode(content)
+
+    def test_extra_labels(self) -> None:
+        """Series with labels not in groupBy is an error (series would be merged), metric name is not a label."""
+        content = response([{"metric": {"pod": "p", "container": "c"}, "values": [[1704067200, "1"]]}])
+        with pytest.raises(ValueError):
+            RangeMatrix(group_by=["pod"]).decode(content)
+        content = response([{"metric": {"__name__": "up", "pod": "p"}, "values": [[1704067200, "1"]]}])
+        assert RangeMatrix(group_by=["pod"]).decode(content).size == 1
+
+    def test_select(self) -> None:
+        """Series with given label values, the label is removed from groupBy."""
+        content = response(
+            [
+                {"metric": {"area": "heap", "pod": "p-1"}, "values": [[1704067200, "1"], [1704067230, "2"]]},
+                {"metric": {"area": "nonheap", "pod": "p-1"}, "values": [[1704067200, "3"]]},
+                {"metric": {"area": "heap", "pod": "p-2"}, "values": [[1704067200, "4"]]},
+            ]
+        )
+        matrix = RangeMatrix(group_by=["pod", "area"]).decode(content)
+        heap = matrix.select({"area": "heap"})
+        assert heap.groupBy == ["pod"]
+        assert heap.values[: heap.size].tolist() == [1.0, 2.0, 4.0]
+        assert heap.labels_df()["POD"].tolist() == ["p-1", "p-2"]
+        assert matrix.select({"area": "nonheap"}).column_df("NON_HEAP").index.names == [TIMESTAMP_COLUMN, "POD"]
+        assert matrix.select({"area": "other"}).empty
+
+
+@pytest.mark.unit
+class TestTableBuilder:
+    def test_merge_columns(self) -> None:
+        """Outer join of columns on timestamp and series, rows with all values NaN are dropped."""
+        cpu = RangeMatrix(group_by=["pod"]).decode(
+            response(
+                [
+                    {"metric": {"pod": "p-1"}, "values": [[1704067200, "1"], [1704067230, "NaN"]]},
+                    {"metric": {"pod": "p-2"}, "values": [[1704067200, "2"]]},
+                ]
+            )
+        )
+        memory = RangeMatrix(group_by=["pod"]).decode(
+            response(
+                [
+                    {"metric": {"pod": "p-3"}, "values": [[1704067230, "30"]]},
+                    {"metric": {"pod": "p-1"}, "values": [[1704067200, "10"], [1704067230, "NaN"]]},
+                ]
+            )
+        )
+        table_builder = TableBuilder(group_by=["pod"])
+        table_builder.add(column_name="CPU", matrix=cpu)
+        table_builder.add(column_name="MEMORY", matrix=memory)
+        df = table_builder.df()
+        assert list(df.columns) == [TIMESTAMP_COLUMN, "POD", "CPU", "MEMORY"]
+        assert str(df[TIMESTAMP_COLUMN].dt.tz) == "UTC"
+        rows = {(ts.timestamp(), pod): (c, m) for ts, pod, c, m in df.itertuples(index=False)}
+        assert len(rows) == 3
+        assert rows[(1704067200, "p-1")] == (1.0, 10.0)
+        assert rows[(1704067200, "p-2")][0] == 2.0 and np.isnan(rows[(1704067200, "p-2")][1])
+        assert np.isnan(rows[(1704067230, "p-3")][0]) and rows[(1704067230, "p-3")][1] == 30.0
+
+    def test_group_by(self) -> None:
+        """Columns of the table must have the same groupBy."""
+        with pytest.raises(ValueError):
+            TableBuilder(group_by=["pod"]).add(column_name="CPU", matrix=RangeMatrix(group_by=["pod", "area"]))
+
+
+@pytest.mark.unit
+class TestDecodeVector:
+    def test_vector(self) -> None:
+        """Instant vector to Series with sorted groupBy index in upper case."""
+        content = response(
+            [
+                {"metric": {"namespace": "ns", "pod": "p-1", "container": "c"}, "value": [1704067200, "1.5"]},
+                {"metric": {"namespace": "ns", "pod": "p-2", "container": "c"}, "value": [1704067200, "NaN"]},
+            ],
+            result_type="vector",
+        )
+        ser = decode_vector(content, group_by=["namespace", " pod", "container"])
+        assert ser.index.names == ["CONTAINER", "NAMESPACE", "POD"]
+        assert ser.dtype == np.float64
+        assert ser[("c", "ns", "p-1")] == 1.5
+        assert np.isnan(ser[("c", "ns", "p-2")])
+
+    def test_empty(self) -> None:
+        ser = decode_vector(response([], result_type="vector"), group_by=["pod"])
+        assert ser.empty and ser.index.names == ["POD"]
+
+    def test_errors(self) -> None:
+        """Range query response and series without groupBy label are errors."""
+        with pytest.raises(ValueError):
+            decode_vector(response([{"metric": {"pod": "p"}, "values": [[1704067200, "1"]]}]), group_by=["pod"])
+        content = response([{"metric": {"pod": "p"}, "value": [1704067200, "1"]}], result_type="vector")
+        with pytest.raises(ValueError):
+            decode_vector(content, group_by=["pod", "container"])
+        with pytest.raises(ValueError):
+            decode_vector(content, group_by=[])
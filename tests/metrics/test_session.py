@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from io import BytesIO
+from unittest import mock
+
+import pytest
+
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.response import HTTPResponse
+
+from metrics.session import PrometheusSession
+
+
+URL = "http://prometheus:9090/api/v1/query"
+
+
+class StubConnections:
+    """Responses of connection pool with given statuses, no network, timeout of each attempt is recorded."""
+
+    def __init__(self, statuses: list[int], body: bytes = b'{"status":"success"}'):
+        self.statuses: list[int] = statuses
+        self.body: bytes = body
+        self.timeouts: list = []
+
+    def make_request(self, pool, conn, method, url, *args, **kwargs) -> HTTPResponse:
+        self.timeouts.append(kwargs.get("timeout"))
+        status = self.statuses[min(len(self.timeouts), len(self.statuses)) - 1]
+        return HTTPResponse(
+            body=BytesIO(self.body),
+            status=status,
+            preload_content=False,
+            request_method=method,
+            request_url=url,
+            headers={"Content-Type": "application/json"},
+        )
+
+    def patch(self):
+        """Replace sending request over connection of pool."""
+        return mock.patch.object(
+            HTTPConnectionPool, "_make_request", lambda pool, *a, **k: self.make_request(pool, *a, **k)
+        )
+
+
+def session(**kwargs) -> PrometheusSession:
+    return PrometheusSession(**{"retries": 2, "backoff_sec": 0, "backoff_jitter_sec": 0, "timeout_sec": 7, **kwargs})
+
+
+@pytest.mark.unit
+class TestPrometheusSession:
+    def test_retry(self) -> None:
+        """5xx of overloaded Prometheus is retried, the last response is returned when retries are exhausted."""
+        connections = StubConnections(statuses=[503, 502, 200])
+        with connections.patch():
+            response = session().get(URL, params={"query": "up"})
+        assert response.status_code == 200
+        assert len(connections.timeouts) == 3
+
+        connections = StubConnections(statuses=[503])
+        with connections.patch():
+            response = session(retries=1).get(URL, params={"query": "up"})
+        assert response.status_code == 503
+        assert len(connections.timeouts) == 2
+
+    def test_no_retry(self) -> None:
+        """Bad query is not retried."""
+        connections = StubConnections(statuses=[400, 200])
+        with connections.patch():
+            assert session().get(URL, params={"query": "up{"}).status_code == 400
+        assert len(connections.timeouts) == 1
+
+    def test_timeout(self) -> None:
+        """Default timeout is applied to every attempt, explicit timeout is kept."""
+        connections = StubConnections(statuses=[503, 200])
+        with connections.patch():
+            session().get(URL, params={"query": "up"})
+            session().get(URL, params={"query": "up"}, timeout=3)
+        assert [(t.connect_timeout, t.read_timeout) for t in connections.timeouts] == [(7, 7), (7, 7), (3, 3)]
+
+    def test_stats(self) -> None:
+        """Query, status and bytes of each response (after retries) are recorded."""
+        connections = StubConnections(statuses=[503, 200], body=b"x" * 1000)
+        prom_session = session()
+        with connections.patch():
+            prom_session.get(URL, params={"query": "up"})
+            prom_session.get(URL, params={"query": "sum(up)"})
+        assert [(s.query, s.status, s.bytes) for s in prom_session.stats] == [("up", 200, 1000), ("sum(up)", 200, 1000)]
+        assert all(s.elapsedSec >= 0 for s in prom_session.stats)
+        assert len(prom_session.slowest(n=1)) == 1
+        prom_session.log_stats()
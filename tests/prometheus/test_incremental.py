@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+import pytz
+
+from metrics import NAMESPACE_COLUMN, TIMESTAMP_COLUMN
+from metrics.collector import TimeRange
+from prometheus.commands import drop_stored, incremental_time_range
+
+
+@pytest.mark.unit
+class TestIncrementalLoad:
+    time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-01T01:00:00")
+
+    watermarks = {
+        "ns1": pd.Timestamp("2024-01-01T00:30:00", tz=pytz.UTC),
+        "ns2": pd.Timestamp("2024-01-01T00:40:00", tz=pytz.UTC),
+    }
+
+    def test_time_range(self) -> None:
+        """Start one step after the namespace watermark but not before the time range."""
+        time_range = incremental_time_range(self.time_range, watermarks=self.watermarks, step_sec=30, namespace="ns2")
+        assert time_range.from_time == pd.Timestamp("2024-01-01T00:40:30", tz=pytz.UTC)
+        assert time_range.to_time == self.time_range.to_time
+        stale = {"ns": pd.Timestamp("2023-01-01T00:00:00", tz=pytz.UTC)}
+        assert incremental_time_range(self.time_range, watermarks=stale, step_sec=30, namespace="ns").from_time == (
+            self.time_range.from_time
+        )
+        assert incremental_time_range(self.time_range, watermarks={}, step_sec=30) is self.time_range
+        up_to_date = {None: self.time_range.to_time}
+        assert incremental_time_range(self.time_range, watermarks=up_to_date, step_sec=30) is None
+        assert incremental_time_range(self.time_range, watermarks=up_to_date, step_sec=30, namespace="ns") is None
+
+    def test_new_namespace(self) -> None:
+        """Namespace without stored rows, and query of all namespaces, start at the time range start."""
+        new = incremental_time_range(self.time_range, watermarks=self.watermarks, step_sec=30, namespace="new")
+        assert new is self.time_range
+        assert incremental_time_range(self.time_range, watermarks=self.watermarks, step_sec=30) is self.time_range
+
+    def test_drop_stored(self) -> None:
+        """Rows not newer than the namespace watermark are removed, new namespaces are kept."""
+        timestamps = pd.date_range(start="2024-01-01T00:00:00", periods=3, freq="30s", tz=pytz.UTC)
+        df = pd.DataFrame(
+            {
+                TIMESTAMP_COLUMN: list(timestamps) * 2,
+                NAMESPACE_COLUMN: ["ns1"] * 3 + ["new"] * 3,
+            }
+        )
+        kept = drop_stored(df, watermarks={"ns1": timestamps[1]})
+        assert len(kept) == 4
+        assert kept[kept[NAMESPACE_COLUMN] == "ns1"][TIMESTAMP_COLUMN].tolist() == [timestamps[2]]
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+import threading
+
+import pytest
+
+from metrics.collector import PrometheusCollector, TimeRange
+from prometheus.prompt_model import ColumnPromExpression
+from prometheus.query_plan import QueryPlanner, is_mergeable, plan_table
+from prometheus.sla_model import SlaTable
+
+
+def sla_table(name: str, queries: list[ColumnPromExpression]) -> SlaTable:
+    return SlaTable(name=name, tableName=name, groupBy=["namespace", "pod"], queries=queries)
+
+
+LIMITS = "sum(kube_pod_container_resource_limits{labels}) by (groupBy)"
+
+
+@pytest.mark.unit
+class TestQueryPlan:
+    def test_merge_static_labels(self) -> None:
+        """Columns differing in static labels only are one query grouped by the labels."""
+        table = sla_table(
+            "T",
+            [
+                ColumnPromExpression(columnName="MEM", query=LIMITS, staticLabels=['resource="memory"', 'unit="byte"']),
+                ColumnPromExpression(columnName="CPU_USAGE", query="sum(cpu{labels}) by (groupBy)"),
+                ColumnPromExpression(columnName="CPU", query=LIMITS, staticLabels=['resource="cpu"', 'unit="core"']),
+            ],
+        )
+        plan = plan_table(table, namespace="ns")
+        assert len(plan) == 2
+        merged = plan[0]
+        assert merged.query == (
+            'sum(kube_pod_container_resource_limits{namespace="ns",resource=~"cpu|memory",unit=~"byte|core"}) '
+            "by (namespace,pod,resource,unit)"
+        )
+        assert merged.groupBy == ["namespace", "pod", "resource", "unit"]
+        assert merged.columns == {
+            "MEM": {"resource": "memory", "unit": "byte"},
+            "CPU": {"resource": "cpu", "unit": "core"},
+        }
+        assert plan[1].columns == {"CPU_USAGE": {}}
+
+    def test_not_mergeable(self) -> None:
+        """Regex static labels and selectors outside of groupBy aggregation are not merged."""
+        scalar = "sum(irate(x{labels}[1m])) by (groupBy) / scalar(count(x{labels}))"
+        table = sla_table(
+            "T",
+            [
+                ColumnPromExpression(columnName="A", query=scalar, staticLabels=['mode="user"']),
+                ColumnPromExpression(columnName="B", query=scalar, staticLabels=['mode="system"']),
+                ColumnPromExpression(columnName="C", query=LIMITS, staticLabels=['resource=~"cpu"']),
+                ColumnPromExpression(columnName="D", query=LIMITS, staticLabels=['resource="memory"']),
+            ],
+        )
+        plan = plan_table(table, namespace=None)
+        assert [list(pq.columns) for pq in plan] == [["A"], ["B"], ["C"], ["D"]]
+        assert plan[3].query == 'sum(kube_pod_container_resource_limits{resource="memory"}) by (namespace,pod)'
+
+    @pytest.mark.parametrize(
+        "query,mergeable",
+        [
+            (LIMITS, True),
+            # metric name containing placeholder name
+            ("sum(kube_pod_labels{labels}) by (groupBy)", True),
+            ("sum(a{labels}) by (groupBy) / sum(b{labels}) by (groupBy)", True),
+            # the same number of placeholders, count(x{labels}) is not aggregated by groupBy
+            ("sum(x{labels}) by (groupBy) / on (groupBy) count(x{labels})", False),
+            # selector without static labels
+            ('sum(x{labels}) by (groupBy) / on (groupBy) sum(y{job="node"}) by (groupBy)', False),
+            ("sum(x{labels}) by (groupBy) / scalar(count(x{labels}))", False),
+            ("sum(x{labels) by (groupBy)", False),
+        ],
+    )
+    def test_is_mergeable(self, query: str, mergeable: bool) -> None:
+        prom_query = ColumnPromExpression(columnName="A", query=query, staticLabels=['mode="user"'])
+        assert is_mergeable(sla_table("T", [prom_query]), prom_query) == mergeable
+
+    def test_shared_queries(self) -> None:
+        """Identical expressions of more tables are one query."""
+        queries = [ColumnPromExpression(columnName="CPU", query="sum(cpu{labels}) by (groupBy)")]
+        planner = QueryPlanner([sla_table("T1", queries), sla_table("T2", queries)], namespace="ns")
+        assert len(planner.uses) == 1
+        assert list(planner.uses.values()) == [2]
+
+    def test_sequential(self, monkeypatch) -> None:
+        """With workers=1 queries and their chunks are fetched in the calling thread."""
+        threads: set[int] = set()
+
+        def fetch_range(collector, p_query: str, step_sec: float, time_range: TimeRange) -> bytes:
+            threads.add(threading.get_ident())
+            values = [[time_range.from_time.timestamp(), "1"]]
+            result = [{"metric": {"namespace": "ns", "pod": "p"}, "values": values}]
+            return json.dumps({"status": "success", "data": {"resultType": "matrix", "result": result}}).encode()
+
+        monkeypatch.setattr(PrometheusCollector, "fetch_range", fetch_range)
+        queries = [ColumnPromExpression(columnName=c, query=f"sum({c}{{labels}}) by (groupBy)") for c in ["A", "B"]]
+        table = sla_table("T", queries)
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-03T00:00:00")
+        collector = PrometheusCollector("http://prometheus:9090", time_range=time_range, max_points=1000)
+        columns = QueryPlanner([table], namespace="ns").column_matrices(table, collector=collector, workers=1)
+        assert list(columns) == ["A", "B"]
+        assert threads == {threading.get_ident()}
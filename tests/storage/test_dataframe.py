@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+import pytz
+
+from storage.snowflake import FROM_TIME_ALIAS, TO_TIME_ALIAS
+from storage.snowflake.dataframe import add_tz, localize_series_timezone, round_from_to_times, round_localize_gmt
+
+
+def timestamps(n: int) -> pd.Series:
+    rng = np.random.default_rng(0)
+    return pd.Series(pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 10**15, n), unit="ns"))
+
+
+def from_to_df(n: int) -> pd.DataFrame:
+    from_times = timestamps(n)
+    return pd.DataFrame({FROM_TIME_ALIAS: from_times, TO_TIME_ALIAS: from_times + pd.Timedelta(minutes=5)})
+
+
+def apply_round_from_to_times(df: pd.DataFrame) -> pd.DataFrame:
+    """Former row by row implementation."""
+    df[FROM_TIME_ALIAS] = df[FROM_TIME_ALIAS].apply(lambda x: x.floor("s"))
+    df[TO_TIME_ALIAS] = df[TO_TIME_ALIAS].apply(lambda x: x.ceil("s"))
+    return df
+
+
+@pytest.mark.unit
+class TestTimestampHelpers:
+    def test_localize(self) -> None:
+        """The same values as Timestamp by Timestamp localization, NaT is kept."""
+        series = pd.concat([timestamps(100), pd.Series([pd.NaT])], ignore_index=True)
+        expected = series.apply(lambda x: x.tz_localize(tz=pytz.UTC))
+        pd.testing.assert_series_equal(localize_series_timezone(series), expected)
+        assert str(add_tz(pd.Series(["2024-01-01 10:00:00"])).dt.tz) == "GMT"
+        with pytest.raises(TypeError):
+            localize_series_timezone(expected)
+
+    def test_round(self) -> None:
+        df = from_to_df(100)
+        pd.testing.assert_frame_equal(round_from_to_times(df.copy()), apply_round_from_to_times(df.copy()))
+        rounded = round_localize_gmt(df.copy())
+        assert (rounded[FROM_TIME_ALIAS].dt.nanosecond == 0).all()
+        assert str(rounded[TO_TIME_ALIAS].dt.tz) == "UTC"
+
+
+@pytest.mark.performance
+class TestTimestampHelpersBenchmark:
+    """Vectorized helpers on 1M rows, run only with `-m performance`, timings are reported by --durations."""
+
+    def test_localize_million_rows(self) -> None:
+        localize_series_timezone(timestamps(1_000_000))
+
+    def test_round_million_rows(self) -> None:
+        round_from_to_times(from_to_df(1_000_000))
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics import NAMESPACE_COLUMN, TIMESTAMP_COLUMN
+from metrics.collector import TimeRange
+from prometheus.prompt_model import ColumnPromExpression
+from prometheus.sla_model import SlaTable
+from storage.parquet.table_store import ParquetTableStore, SeenRows
+
+
+SLA_TABLE = SlaTable(
+    name="pods",
+    tableName="PODS",
+    groupBy=["namespace", "pod"],
+    queries=[ColumnPromExpression(columnName="CPU", query="sum(cpu{labels}) by (groupBy)")],
+)
+
+
+def table_df(start: str, periods: int, namespace: str) -> pd.DataFrame:
+    timestamps = pd.date_range(start, periods=periods, freq="6h", tz="UTC")
+    return pd.DataFrame(
+        {
+            TIMESTAMP_COLUMN: timestamps,
+            NAMESPACE_COLUMN: namespace,
+            "POD": [f"p-{i % 2}" for i in range(periods)],
+            "CPU": [float(i) for i in range(periods)],
+        }
+    )
+
+
+@pytest.mark.unit
+class TestParquetTableStore:
+    def test_read_range(self, tmp_path) -> None:
+        """Time range and namespace select partitions and rows, writes are appended."""
+        store = ParquetTableStore(folder=tmp_path)
+        store.write_df(table_df("2024-01-01", periods=8, namespace="ns1"), sla_table=SLA_TABLE)
+        store.write_df(table_df("2024-01-01", periods=8, namespace="123"), sla_table=SLA_TABLE)
+        assert {p.name for p in tmp_path.glob("PORTAL/PODS/*")} == {"DAY=2024-01-01", "DAY=2024-01-02"}
+        time_range = TimeRange(start_time="2024-01-01T06:00:00", end_time="2024-01-02T00:00:00")
+        df = store.read_range(sla_table=SLA_TABLE, time_range=time_range)
+        assert list(df.columns) == [TIMESTAMP_COLUMN, NAMESPACE_COLUMN, "POD", "CPU"]
+        assert len(df) == 8
+        assert str(df[TIMESTAMP_COLUMN].dt.tz) == "UTC"
+        ns_df = store.read_range(sla_table=SLA_TABLE, time_range=time_range, namespace="123")
+        assert ns_df[NAMESPACE_COLUMN].tolist() == ["123"] * 4
+        assert sorted(ns_df["CPU"]) == [1.0, 2.0, 3.0, 4.0]
+
+    def test_read_columns(self, tmp_path) -> None:
+        """Only requested columns are read, also for a missing table."""
+        store = ParquetTableStore(folder=tmp_path)
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-02T00:00:00")
+        columns = [TIMESTAMP_COLUMN, NAMESPACE_COLUMN, "CPU"]
+        assert list(store.read_range(sla_table=SLA_TABLE, time_range=time_range, columns=columns).columns) == columns
+        store.write_df(table_df("2024-01-01", periods=4, namespace="ns1"), sla_table=SLA_TABLE)
+        df = store.read_range(sla_table=SLA_TABLE, time_range=time_range, namespace="ns1", columns=columns)
+        assert list(df.columns) == columns
+        assert len(df) == 4
+
+    def test_unique_rows(self, tmp_path) -> None:
+        """Rows written twice are read once, also when keys are not projected."""
+        store = ParquetTableStore(folder=tmp_path)
+        df = table_df("2024-01-01", periods=4, namespace="ns1")
+        store.write_df(df, sla_table=SLA_TABLE)
+        store.write_df(df, sla_table=SLA_TABLE)
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-02T00:00:00")
+        assert len(store.read_range(sla_table=SLA_TABLE, time_range=time_range)) == 4
+        cpu_df = store.read_range(sla_table=SLA_TABLE, time_range=time_range, columns=["CPU"])
+        assert list(cpu_df.columns) == ["CPU"]
+        assert sorted(cpu_df["CPU"]) == [0.0, 1.0, 2.0, 3.0]
+
+    def test_read_batches(self, tmp_path) -> None:
+        """Batches contain the rows of read_range, rows repeated in later batches are dropped."""
+        store = ParquetTableStore(folder=tmp_path)
+        df = table_df("2024-01-01", periods=8, namespace="ns1")
+        store.write_df(df, sla_table=SLA_TABLE)
+        store.write_df(df, sla_table=SLA_TABLE)
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-03T00:00:00")
+        batches = list(
+            store.read_batches(sla_table=SLA_TABLE, time_range=time_range, columns=["POD", "CPU"], batch_rows=3)
+        )
+        assert max(len(batch) for batch in batches) <= 3
+        streamed_df = pd.concat(batches, ignore_index=True)
+        assert list(streamed_df.columns) == ["POD", "CPU"]
+        assert sorted(streamed_df["CPU"]) == sorted(store.read_range(sla_table=SLA_TABLE, time_range=time_range)["CPU"])
+        assert len(streamed_df) == 8
+
+    def test_last_timestamps(self, tmp_path) -> None:
+        """Last timestamp of each namespace, empty for missing table."""
+        store = ParquetTableStore(folder=tmp_path)
+        assert store.last_timestamps(sla_table=SLA_TABLE, namespace=None) == {}
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-02T00:00:00")
+        assert store.read_range(sla_table=SLA_TABLE, time_range=time_range).empty
+        store.write_df(table_df("2024-01-01", periods=4, namespace="ns1"), sla_table=SLA_TABLE)
+        store.write_df(table_df("2024-01-01", periods=2, namespace="ns2"), sla_table=SLA_TABLE)
+        assert store.last_timestamps(sla_table=SLA_TABLE, namespace=None) == {
+            "ns1": pd.Timestamp("2024-01-01T18:00:00", tz="UTC"),
+            "ns2": pd.Timestamp("2024-01-01T06:00:00", tz="UTC"),
+        }
+        assert list(store.last_timestamps(sla_table=SLA_TABLE, namespace="ns2")) == ["ns2"]
+
+
+@pytest.mark.unit
+class TestSeenRows:
+    def test_new_rows(self) -> None:
+        """Rows repeated within and across batches are kept once, in the order of first occurrence."""
+        seen_rows = SeenRows(keys=["K"])
+        kept = []
+        for start in range(0, 100, 7):
+            batch = pd.DataFrame({"K": [k % 37 for k in range(start, start + 10)] * 2, "V": 1.0})
+            kept.extend(seen_rows.new_rows(batch)["K"].tolist())
+        assert kept == list(dict.fromkeys(k % 37 for k in range(100)))
+        assert sum(len(level) for level in seen_rows.levels) == 37
+        assert len(seen_rows.levels) <= 6
+        assert all((np.diff(level.astype(np.float64)) >= 0).all() for level in seen_rows.levels)
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from storage.snowflake.queries import q_merge, q_time_range
+
+
+@pytest.mark.unit
+class TestTimeRangeQuery:
+    def test_select_all(self) -> None:
+        q = q_time_range(table_name="PODS", from_time=pd.Timestamp("2024-01-01"), to_time=pd.Timestamp("2024-01-02"))
+        assert q == (
+            """SELECT * FROM PODS WHERE "TIMESTAMP" >= '2024-01-01 00:00:00' AND "TIMESTAMP" <= '2024-01-02 00:00:00'"""
+        )
+
+    def test_columns_namespace(self) -> None:
+        """Projection of quoted columns and namespace predicate."""
+        q = q_time_range(
+            table_name="PODS",
+            from_time=pd.Timestamp("2024-01-01"),
+            to_time=pd.Timestamp("2024-01-02"),
+            namespace="ns1",
+            columns=["TIMESTAMP", "POD", "CPU_CORE"],
+        )
+        assert q.startswith('SELECT "TIMESTAMP", "POD", "CPU_CORE" FROM PODS WHERE ')
+        assert q.endswith(" AND NAMESPACE='ns1'")
+
+    def test_unique_keys(self) -> None:
+        """Deduplication by row number over unique keys."""
+        q = q_time_range(
+            table_name="PODS",
+            from_time=pd.Timestamp("2024-01-01"),
+            to_time=pd.Timestamp("2024-01-02"),
+            unique_keys=["TIMESTAMP", "NAMESPACE", "POD"],
+        )
+        assert q.endswith(
+            ' QUALIFY ROW_NUMBER() OVER (PARTITION BY "TIMESTAMP", "NAMESPACE", "POD" ORDER BY "TIMESTAMP") = 1'
+        )
+
+    def test_merge(self) -> None:
+        """Keys are matched (NULL matches NULL), other columns updated, all columns inserted."""
+        q = q_merge(
+            target_table="PODS",
+            source_table="PODS_STAGE",
+            keys=["TIMESTAMP", "POD"],
+            columns=["TIMESTAMP", "POD", "CPU"],
+        )
+        assert q == (
+            'MERGE INTO PODS t USING PODS_STAGE s ON EQUAL_NULL(t."TIMESTAMP", s."TIMESTAMP")'
+            ' AND EQUAL_NULL(t."POD", s."POD")'
+            ' WHEN MATCHED THEN UPDATE SET t."CPU" = s."CPU"'
+            ' WHEN NOT MATCHED THEN INSERT ("TIMESTAMP", "POD", "CPU") VALUES (s."TIMESTAMP", s."POD", s."CPU")'
+        )
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from metrics.collector import TimeRange
+from prometheus.prompt_model import ColumnPromExpression
+from prometheus.sla_model import SlaTable
+from storage.snowflake import engine
+from storage.snowflake.engine import SnowflakeSession
+from storage.snowflake.table_store import SnowflakeTableStore
+
+
+class FakeConnection:
+    def __init__(self, logins: list[str], **kwargs):
+        logins.append(kwargs["schema"])
+        self.statements: list[str] = []
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def execute(self, statement: str):
+        self.statements.append(statement)
+        self.rowcount = 0
+        return self
+
+    def fetch_arrow_batches(self):
+        for i in range(3):
+            yield pa.table({"CPU": [float(i)]})
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSqlEngine:
+    def __init__(self, url: str):
+        self.url: str = url
+        self.disposed = False
+
+    def dispose(self):
+        self.disposed = True
+
+
+@pytest.mark.unit
+class TestSnowflakeSession:
+    def test_single_login(self, monkeypatch) -> None:
+        """All storage calls share one connection, schema is switched only when it changes."""
+        logins: list[str] = []
+        monkeypatch.setattr(engine.snowflake.connector, "connect", lambda **kw: FakeConnection(logins, **kw))
+        try:
+            with SnowflakeSession.engine(schema="PORTAL") as sf:
+                connection = sf.connection
+            with SnowflakeSession.engine(schema="PORTAL") as sf:
+                assert sf.connection is connection
+            with SnowflakeSession.engine(schema="API_TESTS") as sf:
+                assert sf.schema == "API_TESTS"
+            assert logins == ["PORTAL"]
+            assert connection.statements == ["USE SCHEMA PERFORMANCE_TESTS.API_TESTS"]
+        finally:
+            SnowflakeSession.close()
+        assert connection.closed
+        assert SnowflakeSession.sfEngine is None
+
+    def test_merge_df(self, monkeypatch) -> None:
+        """Unique rows are staged to temporary table, merged and the stage is dropped."""
+        logins: list[str] = []
+        staged: list[pd.DataFrame] = []
+        monkeypatch.setattr(engine.snowflake.connector, "connect", lambda **kw: FakeConnection(logins, **kw))
+
+        def write_pandas(df: pd.DataFrame, table_name: str, table_type: str, **kwargs):
+            assert table_type == "temporary"
+            staged.append(df)
+            return True, 1, len(df), []
+
+        monkeypatch.setattr(engine, "write_pandas", write_pandas)
+        df = pd.DataFrame({"TIMESTAMP": [1, 1, 2], "POD": ["p", "p", "p"], "CPU": [0.1, 0.2, 0.3]})
+        try:
+            with SnowflakeSession.engine(schema="PORTAL") as sf:
+                sf.merge_df(df=df, table="PODS", keys=["TIMESTAMP", "POD"])
+                statements = sf.connection.statements
+        finally:
+            SnowflakeSession.close()
+        assert staged[0]["CPU"].tolist() == [0.2, 0.3]
+        create, merge, drop = statements
+        stage = drop.split()[-1]
+        assert stage.startswith("PODS_STAGE_")
+        assert create == f"CREATE TABLE IF NOT EXISTS PODS LIKE {stage}"
+        assert merge.startswith(f"MERGE INTO PODS t USING {stage} s ON ")
+
+    def test_read_batches(self, monkeypatch) -> None:
+        """Session is not borrowed while streamed result is consumed, other threads are not blocked."""
+        monkeypatch.setattr(engine.snowflake.connector, "connect", lambda **kw: FakeConnection([], **kw))
+        sla_table = SlaTable(
+            name="pods",
+            tableName="PODS",
+            dbSchema="PORTAL",
+            groupBy=["namespace", "pod"],
+            queries=[ColumnPromExpression(columnName="CPU", query="sum(cpu{labels}) by (groupBy)")],
+        )
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-01T01:00:00")
+        try:
+            batches = SnowflakeTableStore().read_batches(sla_table=sla_table, time_range=time_range, namespace="ns")
+            first = next(batches)
+
+            def other_query():
+                with SnowflakeSession.engine(schema="API_TESTS"):
+                    pass
+
+            thread = threading.Thread(target=other_query)
+            thread.start()
+            thread.join(timeout=5)
+            assert not thread.is_alive()
+            assert [first["CPU"].iloc[0]] + [b["CPU"].iloc[0] for b in batches] == [0.0, 1.0, 2.0]
+        finally:
+            SnowflakeSession.close()
+
+    def test_sf_engine_schema(self, monkeypatch) -> None:
+        """SQLAlchemy engine follows schema of the session, all engines are disposed on close."""
+        monkeypatch.setattr(engine.snowflake.connector, "connect", lambda **kw: FakeConnection([], **kw))
+        monkeypatch.setattr(engine, "create_engine", FakeSqlEngine)
+        for name in ["ACCOUNT", "USER", "PASSWORD"]:
+            monkeypatch.setattr(engine.SnowflakeEngine, name, name.lower())
+        try:
+            with SnowflakeSession.engine(schema="PORTAL") as sf:
+                portal = sf.sf_engine
+                assert sf.sf_engine is portal
+            with SnowflakeSession.engine(schema="API_TESTS") as sf:
+                api_tests = sf.sf_engine
+        finally:
+            SnowflakeSession.close()
+        assert "PORTAL" in str(portal.url) and "API_TESTS" in str(api_tests.url)
+        assert portal.disposed and api_tests.disposed
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import pandas as pd
+import pytest
+
+from metrics import NAMESPACE_COLUMN, TIMESTAMP_COLUMN
+from metrics.collector import TimeRange
+from prometheus.prompt_model import ColumnPromExpression
+from prometheus.sla_model import SlaTable
+from storage.parquet.table_store import ParquetTableStore
+from storage.table_cache import TableCache
+
+
+SLA_TABLE = SlaTable(
+    name="pods",
+    tableName="PODS",
+    groupBy=["namespace", "pod"],
+    queries=[ColumnPromExpression(columnName="CPU", query="sum(cpu{labels}) by (groupBy)")],
+)
+
+
+class CountingStore(ParquetTableStore):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads: list[TimeRange] = []
+        self.columns: list[Optional[list[str]]] = []
+
+    def read_range(self, sla_table, time_range, namespace=None, columns=None) -> pd.DataFrame:
+        self.reads.append(time_range)
+        self.columns.append(columns)
+        return super().read_range(sla_table, time_range, namespace=namespace, columns=columns)
+
+
+def hours_df(start: str, hours: int) -> pd.DataFrame:
+    timestamps = pd.date_range(start, periods=hours * 2, freq="30min", tz="UTC")
+    return pd.DataFrame(
+        {
+            TIMESTAMP_COLUMN: timestamps,
+            NAMESPACE_COLUMN: "ns1",
+            "POD": "p",
+            "CPU": [float(i) for i in range(len(timestamps))],
+        }
+    )
+
+
+@pytest.mark.unit
+class TestTableCache:
+    def test_missing_hours(self, tmp_path) -> None:
+        """Cached hours are not read again, missing hours are read by a single query."""
+        store = CountingStore(folder=tmp_path / "store")
+        store.write_df(hours_df("2024-01-01T00:00:00", hours=4), sla_table=SLA_TABLE)
+        cache = TableCache(folder=tmp_path / "cache", max_mb=1)
+        time_range = TimeRange(start_time="2024-01-01T00:15:00", end_time="2024-01-01T01:45:00")
+        df = cache.read_range(store=store, sla_table=SLA_TABLE, time_range=time_range, namespace="ns1")
+        expected = store.read_range(sla_table=SLA_TABLE, time_range=time_range, namespace="ns1")
+        pd.testing.assert_frame_equal(df, expected)
+        assert len(store.reads) == 2
+
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-01T03:30:00")
+        df = cache.read_range(store=store, sla_table=SLA_TABLE, time_range=time_range, namespace="ns1", columns=["CPU"])
+        assert df["CPU"].tolist() == [float(i) for i in range(8)]
+        # hours 2 and 3 in one read
+        assert store.reads[-1].from_time == pd.Timestamp("2024-01-01T02:00:00", tz="UTC")
+        assert len(store.reads) == 3
+        cache.read_range(store=store, sla_table=SLA_TABLE, time_range=time_range, namespace="ns1", columns=["CPU"])
+        assert len(store.reads) == 3
+        # hours 2 and 3 were cached with projection only
+        df = cache.read_range(store=store, sla_table=SLA_TABLE, time_range=time_range, namespace="ns1")
+        assert list(df.columns) == [TIMESTAMP_COLUMN, NAMESPACE_COLUMN, "POD", "CPU"]
+        assert len(store.reads) == 4
+        assert store.reads[-1].from_time == pd.Timestamp("2024-01-01T02:00:00", tz="UTC")
+
+    def test_runs(self, tmp_path) -> None:
+        """Runs of missing hours are read separately, cached hours between them are not read again."""
+        store = CountingStore(folder=tmp_path / "store")
+        store.write_df(hours_df("2024-01-01T00:00:00", hours=5), sla_table=SLA_TABLE)
+        cache = TableCache(folder=tmp_path / "cache", max_mb=1)
+        middle = TimeRange(start_time="2024-01-01T02:00:00", end_time="2024-01-01T02:59:00")
+        cache.read_range(store=store, sla_table=SLA_TABLE, time_range=middle, columns=["CPU"])
+        assert store.columns[-1] == [TIMESTAMP_COLUMN, "CPU"]
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-01T04:59:00")
+        df = cache.read_range(store=store, sla_table=SLA_TABLE, time_range=time_range, columns=["CPU"])
+        assert df["CPU"].tolist() == [float(i) for i in range(10)]
+        assert [(r.from_time.hour, r.to_time.hour) for r in store.reads[1:]] == [(0, 1), (3, 4)]
+
+    def test_invalidate(self, tmp_path) -> None:
+        """Hours with written rows are read again."""
+        store = CountingStore(folder=tmp_path / "store")
+        store.write_df(hours_df("2024-01-01T00:00:00", hours=2), sla_table=SLA_TABLE)
+        cache = TableCache(folder=tmp_path / "cache", max_mb=1)
+        time_range = TimeRange(start_time="2024-01-01T00:00:00", end_time="2024-01-01T02:59:00")
+        assert len(cache.read_range(store=store, sla_table=SLA_TABLE, time_range=time_range)) == 4
+        written = hours_df("2024-01-01T02:00:00", hours=1)
+        store.write_df(written, sla_table=SLA_TABLE)
+        cache.invalidate_df(sla_table=SLA_TABLE, df=written)
+        assert len(cache.read_range(store=store, sla_table=SLA_TABLE, time_range=time_range)) == 6
+        assert store.reads[-1].from_time == pd.Timestamp("2024-01-01T02:00:00", tz="UTC")
+        cache.invalidate(sla_table=SLA_TABLE)
+        assert not list((tmp_path / "cache").rglob("*.arrow"))